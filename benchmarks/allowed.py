@@ -0,0 +1,39 @@
+# World.allowed is the inner loop of pathfinding. This times it over a mix of
+# open air, solid ground and the surface in between.
+#
+#   $ bin/python benchmarks/allowed.py
+
+import time
+
+from pubbot.world import World
+from pubbot.vector import Vector
+from pubbot.block import Block
+from pubbot.tests.test_world import make_column
+
+
+def main(n=20000):
+    w = World()
+    primary, data = make_column({0: (1, 0), 1: (1, 0), 2: (3, 0)})
+    w.on_chunk(0, 0, True, primary, 0, data)
+
+    probes = [Vector(x % 16, y, (x * 7) % 16) for x in range(16) for y in (5, 40, 47, 48, 80)]
+
+    start = time.time()
+    for i in xrange(n // len(probes)):
+        for p in probes:
+            w.allowed(p, allow_fly=False)
+    elapsed = time.time() - start
+    print "World.allowed     %10d/s" % (n / elapsed)
+
+    b = Block(Vector(0, 0, 0), 3, 0)
+    start = time.time()
+    for i in xrange(n):
+        b.solid
+        b.liquid
+        b.ttl
+    elapsed = time.time() - start
+    print "Block properties  %10d/s" % (n / elapsed)
+
+
+if __name__ == "__main__":
+    main()
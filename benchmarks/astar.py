@@ -0,0 +1,126 @@
+# Times the A* search over a few loaded columns with a wall in the way,
+# against the original search that copied the whole path into every heap
+# entry and probed each neighbour with World.allowed, both as they were
+# before the search was rebuilt.
+#
+#   $ bin/python benchmarks/astar.py
+
+import time
+
+from twisted.python import log
+
+from pubbot import astar
+from pubbot.astar import Heap, Path
+from pubbot.world import World, NORTH, EAST, SOUTH, WEST, UP, DOWN
+from pubbot.vector import Vector, BlockPos
+from pubbot.tests.test_world import make_column
+
+
+def old_allowed(world, pos):
+    pos = pos.floor()
+
+    # The original raised KeyError at the edge of the loaded area, which would
+    # end the search; treat it as solid like the new search does
+    try:
+        block = world.get_block(pos)
+    except KeyError:
+        return False
+    if block.solid:
+        log.msg("%s is solid" % (pos, ))
+        return False
+
+    above_pos = pos.copy() + Vector(0, 1, 0)
+    if above_pos.y < 127:
+        try:
+            above = world.get_block(above_pos)
+        except KeyError:
+            return False
+        if above.solid:
+            log.msg("above %s is solid" % (pos, ))
+            return False
+
+    return True
+
+
+def old_available(world, pos):
+    transforms = (
+        (NORTH,), (EAST,), (SOUTH,), (WEST,),
+        (NORTH,DOWN), (EAST,DOWN), (SOUTH,DOWN), (WEST,DOWN),
+        (UP, NORTH), (UP, EAST), (UP, SOUTH), (UP, WEST),
+        )
+
+    for transform in transforms:
+        effect = reduce(lambda x, y: x+y, transform)
+        if old_allowed(world, pos.floor()+effect):
+            yield tuple(pos.floor()+t for t in transform)
+
+
+def old_path(world, start, goals):
+    visited = set()
+
+    heap = Heap(lambda x: x.cost())
+    heap.push(Path(start, goals, []))
+
+    while not heap.empty():
+        path = heap.pop()
+
+        if path.point in visited:
+            continue
+        visited.add(path.point)
+
+        if path.point in goals:
+            return (path.path + [path.point])[1:], len(visited)
+
+        for next_points in old_available(world, path.point):
+            if filter(lambda x: x in visited, next_points):
+                continue
+            heap.push(Path(next_points[-1], goals, path.path + [path.point] + list(next_points[:-1])))
+
+    return None, len(visited)
+
+
+def make_world():
+    w = World()
+    primary, data = make_column({0: (1, 0), 1: (1, 0), 2: (1, 0), 3: (1, 0)})
+    for x in range(-1, 3):
+        for z in range(-1, 3):
+            w.on_chunk(x, z, True, primary, 0, data)
+
+    # A wall three blocks high across the way
+    for z in range(-16, 48):
+        for y in range(64, 67):
+            w.on_block_change(16, y, z, 1, 0)
+    return w
+
+
+def main(n=5):
+    w = make_world()
+    start, goals = BlockPos(2, 64, 5), [BlockPos(30, 64, 20)]
+
+    # Count expansions for the report
+    expanded = [0]
+    successors = w.successors
+    def counting(key):
+        expanded[0] += 1
+        return successors(key)
+
+    log.msg = lambda *args, **kwargs: None
+
+    begin = time.time()
+    for i in xrange(n):
+        route, visited = old_path(w, start, goals)
+    old = time.time() - begin
+    print "Path copying A*   %8.1f routes/s %10d points/s" % (n / old, n * visited / old)
+
+    begin = time.time()
+    for i in xrange(n):
+        expanded[0] = 0
+        route = astar.search(astar.pack(*start), [astar.pack(*g) for g in goals], counting, astar.packed_heuristic(goals))
+    elapsed = time.time() - begin
+    print "Parent pointer A* %8.1f routes/s %10d points/s" % (n / elapsed, n * expanded[0] / elapsed)
+    print "                  %7.1fx          %10.1fx" % (old / elapsed, (old / visited) / (elapsed / expanded[0]))
+    print "Route of %d steps" % len(route)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Applying a WorldEdit sized burst of block changes: the old BitStruct records
+# fed through Chunk.change one Vector at a time, against unpacking the packed
+# records in one go and scattering them into sections.
+#
+#   $ bin/python benchmarks/block_changes.py
+
+import random, struct, time
+
+from construct import BitStruct, BitField, MetaArray
+
+from pubbot.world import World
+from pubbot.vector import Vector
+from pubbot.tests.test_world import make_column
+
+
+records_con = lambda count: MetaArray(lambda ctx: count, BitStruct("records",
+    BitField("x", 4),
+    BitField("z", 4),
+    BitField("y", 8),
+    BitField("block_id", 12),
+    BitField("meta", 4),
+    ))
+
+
+def make_world():
+    w = World()
+    primary, data = make_column(dict((sy, (1, 0)) for sy in range(8)))
+    w.on_chunk(0, 0, True, primary, 0, data)
+    return w
+
+
+def main(count=5000, repeat=5):
+    random.seed(0)
+    data = "".join(
+        struct.pack(">I", (random.randrange(16) << 28) | (random.randrange(16) << 24) |
+            (random.randrange(128) << 16) | (random.randrange(1, 100) << 4) | random.randrange(16))
+        for i in range(count))
+
+    w = make_world()
+    start = time.time()
+    for i in range(repeat):
+        records = records_con(count).parse(data)
+        c = w.chunks[(0, 0, 0)]
+        for r in records:
+            c.change(Vector(r.x, r.y, r.z), r.block_id, r.meta)
+    old = (time.time() - start) / repeat
+
+    w = make_world()
+    start = time.time()
+    for i in range(repeat):
+        w.on_block_batch(0, 0, count, data)
+    new = (time.time() - start) / repeat
+
+    print "%d records" % count
+    print "BitStruct + Chunk.change   %8.1f ms" % (old * 1000)
+    print "World.on_block_batch       %8.1f ms  %.0fx" % (new * 1000, old / new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Set and dict operations on block positions, as done by the pathfinder's
+# visited set: Vector (now hashed on its coordinates), BlockPos, and packed
+# int keys.
+#
+#   $ bin/python benchmarks/block_keys.py
+
+import time
+
+from pubbot.vector import Vector, BlockPos, pack
+
+
+def timed(label, n, fn):
+    start = time.time()
+    fn()
+    elapsed = time.time() - start
+    print "%-28s %10d/s" % (label, n / elapsed)
+
+
+def main(size=20):
+    coords = [(x, y, z) for x in range(size) for y in range(size) for z in range(size)]
+    n = len(coords)
+
+    vectors = [Vector(*c) for c in coords]
+    positions = [BlockPos(*c) for c in coords]
+    keys = [pack(*c) for c in coords]
+
+    for label, items in (("Vector", vectors), ("BlockPos", positions), ("packed int", keys)):
+        def build():
+            s = set()
+            for p in items:
+                if p not in s:
+                    s.add(p)
+            assert len(s) == n
+        timed("%s set insert" % label, n, build)
+
+        d = dict((p, 1) for p in items)
+        def lookup():
+            for p in items:
+                d[p]
+        timed("%s dict lookup" % label, n, lookup)
+
+    def neighbours():
+        for p in positions:
+            p.offset(1, 0, 0)
+            p.offset(0, 1, 0)
+    timed("BlockPos.offset x2", n, neighbours)
+
+    def vector_neighbours():
+        east, up = Vector(1, 0, 0), Vector(0, 1, 0)
+        for p in vectors:
+            p + east
+            p + up
+    timed("Vector + x2", n, vector_neighbours)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Compare the memory used by one loaded chunk column in section storage
+# against the old dict-of-Block representation.
+#
+#   $ bin/python benchmarks/chunk_memory.py
+
+import sys
+
+from pubbot.block import Block
+from pubbot.chunk import Chunk
+from pubbot.vector import Vector
+
+
+def terrain():
+    """ Yield (x, y, z, kind) for a typical overworld column: bedrock, stone, dirt, grass """
+    for x in range(16):
+        for z in range(16):
+            yield x, 0, z, 7
+            for y in range(1, 60):
+                yield x, y, z, 1
+            for y in range(60, 63):
+                yield x, y, z, 3
+            yield x, 63, z, 2
+
+
+def deep_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(v, seen) for v in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_size(getattr(obj, s, None), seen) for s in obj.__slots__)
+    return size
+
+
+def old_layout():
+    # What Chunk.load_chunk used to build: one Block (and Vector) per block,
+    # including air, for the 128 high world.
+    kinds = dict(((x, y, z), kind) for x, y, z, kind in terrain())
+    blocks = {}
+    for x in range(16):
+        for z in range(16):
+            for y in range(128):
+                blocks[(x, y, z)] = Block(Vector(x, y, z), kinds.get((x, y, z), 0), 0)
+    return blocks
+
+
+def new_layout():
+    c = Chunk(0, 0, 0)
+    for x, y, z, kind in terrain():
+        c.set_relative(x, y, z, kind, 0)
+    return c
+
+
+def main():
+    old = deep_size(old_layout())
+    new = deep_size(new_layout())
+    print "dict of Block: %10d bytes" % old
+    print "sections:      %10d bytes" % new
+    print "reduction:     %10.1fx" % (float(old) / new)
+
+
+if __name__ == "__main__":
+    main()
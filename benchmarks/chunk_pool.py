@@ -0,0 +1,34 @@
+# How long the reactor thread is busy with the ~400 columns a bot is sent at
+# login: decoding inline against only storing what the pool decoded.
+#
+#   $ bin/python benchmarks/chunk_pool.py
+
+import time, zlib
+
+from pubbot.chunk import Chunk, decode_payload
+from pubbot.tests.test_world import make_column
+
+
+def main(count=400):
+    primary, data = make_column(dict((sy, (1, 0)) for sy in range(5)))
+    payload = zlib.compress(data)
+    columns = [(primary, 0, True, True)]
+
+    start = time.time()
+    for i in range(count):
+        Chunk(i, 0, 0).set_sections(decode_payload(payload, columns)[0], True)
+    inline = time.time() - start
+
+    decoded = [decode_payload(payload, columns)[0] for i in range(count)]
+    start = time.time()
+    for i, sections in enumerate(decoded):
+        Chunk(i, 0, 0).set_sections(sections, True)
+    stored = time.time() - start
+
+    print "%d columns" % count
+    print "decode on reactor      %8.1f ms" % (inline * 1000)
+    print "store pool results     %8.1f ms" % (stored * 1000)
+
+
+if __name__ == "__main__":
+    main()
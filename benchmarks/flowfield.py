@@ -0,0 +1,55 @@
+# Compares bots following a player with a shared flow field against each of
+# them searching for the player every time it moves.
+#
+#   $ bin/python benchmarks/flowfield.py
+
+import time
+
+from twisted.python import log
+
+from pubbot import astar
+from pubbot.world import World
+from pubbot.vector import Vector
+from pubbot.tests.test_world import make_column
+
+
+def make_world():
+    w = World()
+    primary, data = make_column({0: (1, 0), 1: (1, 0), 2: (1, 0), 3: (1, 0)})
+    for x in range(-1, 3):
+        for z in range(-1, 3):
+            w.on_chunk(x, z, True, primary, 0, data)
+    return w
+
+
+def main(followers=10, ticks=40):
+    log.msg = lambda *args, **kwargs: None
+    w = make_world()
+    w.reach = None
+
+    bots = [Vector(1 + i, 64, 1) for i in range(followers)]
+
+    # The player walks a quarter of a block along z every tick
+    def player(tick):
+        return Vector(20, 64, 2 + tick * 0.25)
+
+    begin = time.time()
+    for tick in xrange(ticks):
+        target = player(tick)
+        for pos in bots:
+            astar.path(w, pos, [target])
+    searched = time.time() - begin
+    print "A* per follower  %8.2fms per tick" % (searched * 1000 / ticks)
+
+    begin = time.time()
+    for tick in xrange(ticks):
+        field = w.flow_field("player", player(tick))
+        field.step()
+        for pos in bots:
+            field.next(pos)
+    flowed = time.time() - begin
+    print "Flow field       %8.2fms per tick, %d builds" % (flowed * 1000 / ticks, field.builds)
+
+
+if __name__ == "__main__":
+    main()
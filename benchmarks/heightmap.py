@@ -0,0 +1,60 @@
+# Compares finding the ground with the heightmaps against probing blocks one
+# at a time down from the top of the world.
+#
+#   $ bin/python benchmarks/heightmap.py
+
+import random, time
+
+from pubbot.world import World
+from pubbot.heightmap import Heightmap
+from pubbot.vector import Vector
+from pubbot.tests.test_world import make_column
+
+
+def make_world():
+    w = World()
+    primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+    for x in range(4):
+        for z in range(4):
+            w.on_chunk(x, z, True, primary, 0, data)
+    return w
+
+
+def probe(w, x, z):
+    c = w.get_chunk(Vector(x, 0, z))
+    y = 255
+    while y >= 0 and not c.is_solid(x & 15, y, z & 15):
+        y -= 1
+    return y
+
+
+def main(n=2000):
+    w = make_world()
+    random.seed(0)
+    points = [(random.randrange(64), random.randrange(64)) for i in xrange(n)]
+
+    c = w.chunks[(0, 0, 0)]
+    begin = time.time()
+    for i in xrange(100):
+        Heightmap(c.sections)
+    print "Building         %8.3fms per column" % ((time.time() - begin) * 1000 / 100)
+
+    begin = time.time()
+    for x, z in points:
+        probe(w, x, z)
+    print "Probing down     %8.1fus" % ((time.time() - begin) * 1e6 / n)
+
+    begin = time.time()
+    for x, z in points:
+        w.surface(x, z)
+    print "surface()        %8.1fus" % ((time.time() - begin) * 1e6 / n)
+
+    begin = time.time()
+    for i in xrange(n):
+        x, z = points[i]
+        w.on_block_change(x, 64, z, 1 if i & 1 else 0, 0)
+    print "Block change     %8.1fus" % ((time.time() - begin) * 1e6 / n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Compares finding the nearest gold ore with the kind index against looking
+# at every block of every loaded column.
+#
+#   $ bin/python benchmarks/kinds.py
+
+import random, time
+
+from pubbot.world import World
+from pubbot.vector import BlockPos
+from pubbot.tests.test_world import make_column
+
+
+def make_world(size=8):
+    w = World()
+    primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+    for x in range(size):
+        for z in range(size):
+            w.on_chunk(x, z, True, primary, 0, data)
+
+    random.seed(0)
+    for i in range(50):
+        w.on_block_change(random.randrange(size * 16), random.randrange(64), random.randrange(size * 16), 0x0E, 0)
+    return w
+
+
+def scan(w, kind, origin):
+    best, best_pos = None, None
+    for (cx, _, cz), c in w.chunks.iteritems():
+        for sy, section in enumerate(c.sections):
+            if section is None:
+                continue
+            for i, k in enumerate(section.blocks):
+                if k == kind:
+                    pos = BlockPos(cx * 16 + (i & 15), sy * 16 + (i >> 8), cz * 16 + ((i >> 4) & 15))
+                    d = (pos - origin).length()
+                    if best is None or d < best:
+                        best, best_pos = d, pos
+    return best_pos
+
+
+def main(n=200):
+    w = make_world()
+    origin = BlockPos(64, 64, 64)
+
+    begin = time.time()
+    scan(w, 0x0E, origin)
+    print "Scanning blocks   %8.1fms" % ((time.time() - begin) * 1000)
+
+    begin = time.time()
+    w.kinds.refresh()
+    print "Indexing          %8.1fms, %d sections" % ((time.time() - begin) * 1000, w.kinds.indexed)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.find_nearest(0x0E, origin)
+    print "find_nearest      %8.3fms" % ((time.time() - begin) * 1000 / n)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.count(0x0E, (BlockPos(10, 0, 10), BlockPos(100, 60, 100)))
+    print "count             %8.3fms" % ((time.time() - begin) * 1000 / n)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.on_block_change(70, 30, 70, 0x0E if i & 1 else 1, 0)
+        w.find_nearest(0x0E, origin)
+    print "Change and find   %8.3fms" % ((time.time() - begin) * 1000 / n)
+
+
+if __name__ == "__main__":
+    main()
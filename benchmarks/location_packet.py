@@ -0,0 +1,36 @@
+# Cost of the once-per-tick location update: make_packet against the packed
+# fast path, and what an idle bot now sends compared to before.
+#
+#   $ bin/python benchmarks/location_packet.py
+
+import time
+
+from pubbot import packets
+
+
+def rate(fn, n):
+    start = time.time()
+    for i in xrange(n):
+        fn()
+    return n / (time.time() - start)
+
+
+def main(n=100000):
+    old = rate(lambda: packets.make_packet("location",
+        position=packets.Container(x=1.5, y=64.0, z=-7.25, stance=65.62),
+        orientation=packets.Container(rotation=90.0, pitch=-10.0),
+        grounded=packets.Container(grounded=1),
+        ), n)
+    new = rate(lambda: packets.make_location_packet(1.5, 64.0, 65.62, -7.25, 90.0, -10.0, 1), n)
+    idle = rate(lambda: packets.make_grounded_packet(1), n)
+
+    print "make_packet(location)   %10d/s" % old
+    print "make_location_packet    %10d/s  %.1fx" % (new, new / old)
+    print "make_grounded_packet    %10d/s  %.1fx" % (idle, idle / old)
+    print
+    print "bytes per idle tick: %d before, %d after" % (
+        len(packets.make_location_packet(0, 0, 0, 0, 0, 0, 1)), len(packets.make_grounded_packet(1)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Times planning a route across a field of columns with the entrance graph,
+# cold (borders and edges worked out as the plan needs them) and warm, and
+# the longest slice a cold plan takes when run a frame at a time like
+# NavigateTo does.
+#
+#   $ bin/python benchmarks/navgraph.py
+
+import time
+
+from pubbot.world import World
+from pubbot.vector import BlockPos
+from pubbot.tests.test_world import make_column
+
+
+def make_world(size):
+    w = World()
+    primary, data = make_column({0: (1, 0), 1: (1, 0), 2: (1, 0), 3: (1, 0)})
+    for x in range(size):
+        for z in range(size):
+            w.on_chunk(x, z, True, primary, 0, data)
+
+    # Hills every few columns
+    for x in range(8, size * 16, 40):
+        for z in range(size * 16):
+            w.on_block_change(x, 64, z, 1, 0)
+
+    return w
+
+
+def main(size=12, n=50):
+    w = make_world(size)
+    start, goal = BlockPos(1, 64, 1), BlockPos(size * 16 - 2, 64, size * 16 - 2)
+
+    begin = time.time()
+    route = w.graph.plan(start, goal)
+    elapsed = time.time() - begin
+    print "Cold plan         %8.3fs, %d waypoints, %d borders, %d columns linked" % (
+        elapsed, len(route), w.graph.scanned, w.graph.linked)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.graph.next_waypoint(start, goal)
+    elapsed = time.time() - begin
+    print "Warm plans        %8.1f/s" % (n / elapsed)
+
+    w = make_world(size)
+    plan = w.graph.begin(start, goal)
+    longest = 0
+    while True:
+        begin = time.time()
+        done = plan.step(2000, 0.01)
+        longest = max(longest, time.time() - begin)
+        if done:
+            break
+    print "Sliced cold plan  %8d frames, longest %.1fms" % (plan.slices, longest * 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Packet decode and encode throughput, construct interpreter against the
+# compiled codecs, for the traffic that dominates entity-heavy play.
+#
+#   $ bin/python benchmarks/packet_codec.py
+
+import time
+
+from construct import Container
+
+from pubbot.packets import packets, packets_by_name, decoders, encoders
+
+
+traffic = [
+    ("entity-position", dict(eid=1234, dx=1, dy=0, dz=-2)),
+    ("entity-location", dict(eid=1234, dx=1, dy=0, dz=-2, yaw=12, pitch=40)),
+    ("entity-orientation", dict(eid=1234, yaw=12, pitch=40)),
+    ("teleport", dict(eid=1234, x=100, y=2000, z=-300, yaw=1, pitch=2)),
+    ("entity-velocity", dict(eid=1234, dx=10, dy=-20, dz=30)),
+    ("entity-metadata", dict(eid=1234, metadata={0: ("byte", 0), 1: ("short", 300), 12: ("int", 5)})),
+    ("spawn-mob", dict(eid=1234, type=54, x=1, y=2, z=3, yaw=0, pitch=0, head_yaw=0,
+        velocity_z=0, velocity_x=0, velocity_y=0, metadata={0: ("byte", 0), 16: ("byte", 1)})),
+    ("location", dict(
+        position=Container(x=1.5, y=64.0, stance=65.62, z=-7.25),
+        orientation=Container(rotation=90.0, pitch=-10.0),
+        grounded=Container(grounded=1))),
+    ("chat", dict(message=u"<jc2k> hello pubbot")),
+]
+
+
+def rate(fn, n):
+    start = time.time()
+    for i in xrange(n):
+        fn()
+    return n / (time.time() - start)
+
+
+def main(n=20000):
+    print "%-20s %12s %12s %8s %12s %12s %8s" % ("packet", "parse/s", "compiled/s", "x", "build/s", "compiled/s", "x")
+    for name, fields in traffic:
+        header = packets_by_name[name]
+        con = packets[header]
+        container = Container(**fields)
+        data = con.build(container)
+
+        decode = decoders[header]
+        encode = encoders[header]
+
+        old_parse = rate(lambda: con.parse(data), n)
+        new_parse = rate(lambda: decode(data, 0, None), n)
+        old_build = rate(lambda: con.build(container), n)
+        new_build = rate(lambda: encode(container, container, []), n)
+
+        print "%-20s %12.0f %12.0f %7.1fx %12.0f %12.0f %7.1fx" % (name,
+            old_parse, new_parse, new_parse / old_parse,
+            old_build, new_build, new_build / old_build)
+
+
+if __name__ == "__main__":
+    main()
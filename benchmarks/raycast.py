@@ -0,0 +1,63 @@
+# Compares raycast() against looking up points a short way apart along the
+# ray with World.get_block, and raycast_many() against casting one at a time.
+#
+#   $ bin/python benchmarks/raycast.py
+
+import math, random, time
+
+from pubbot.world import World
+from pubbot.traversal import raycast, raycast_many
+from pubbot.vector import Vector
+from pubbot.tests.test_world import make_column
+
+
+def make_world():
+    w = World()
+    primary, data = make_column({0: (1, 0), 1: (1, 0), 2: (1, 0), 3: (1, 0)})
+    for x in range(-4, 4):
+        for z in range(-4, 4):
+            w.on_chunk(x, z, True, primary, 0, data)
+    return w
+
+
+def sample_trace(w, start, direction, max_distance=64, step=0.1):
+    direction = direction.normalize() * step
+    pos = start
+    for i in xrange(int(max_distance / step)):
+        try:
+            if w.get_block(pos).solid:
+                return pos.floor()
+        except KeyError:
+            return None
+        pos = pos + direction
+
+
+def main(n=2000):
+    w = make_world()
+    random.seed(0)
+
+    # Looking about from head height, mostly down at the ground
+    eye = Vector(0.5, 65.6, 0.5)
+    rays = []
+    for i in xrange(n):
+        yaw = random.uniform(0, 2 * math.pi)
+        pitch = random.uniform(-math.pi / 2, 0.1)
+        rays.append((eye, Vector(math.cos(yaw) * math.cos(pitch), math.sin(pitch), math.sin(yaw) * math.cos(pitch))))
+
+    begin = time.time()
+    for start, direction in rays:
+        sample_trace(w, start, direction)
+    print "sampled get_block %7.1fus per ray" % ((time.time() - begin) * 1e6 / n)
+
+    begin = time.time()
+    for start, direction in rays:
+        raycast(w, start, direction)
+    print "raycast          %8.1fus per ray" % ((time.time() - begin) * 1e6 / n)
+
+    begin = time.time()
+    raycast_many(w, rays)
+    print "raycast_many     %8.1fus per ray" % ((time.time() - begin) * 1e6 / n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Compares ruling out a walled off goal with the reachability index against
+# letting the A* search find out for itself.
+#
+#   $ bin/python benchmarks/reach.py
+
+import time
+
+from twisted.python import log
+
+from pubbot import astar
+from pubbot.world import World
+from pubbot.vector import Vector
+from pubbot.tests.test_world import make_column
+
+
+def make_world():
+    w = World()
+    primary, data = make_column({0: (1, 0), 1: (1, 0), 2: (1, 0), 3: (1, 0)})
+    for x in range(-1, 3):
+        for z in range(-1, 3):
+            w.on_chunk(x, z, True, primary, 0, data)
+
+    # A goal boxed in by stone
+    for y in (64, 65, 66):
+        for x, z in ((19, 5), (21, 5), (20, 4), (20, 6)):
+            w.on_block_change(x, y, z, 1, 0)
+    w.on_block_change(20, 66, 5, 1, 0)
+    return w
+
+
+def main(n=200):
+    log.msg = lambda *args, **kwargs: None
+    start, goal = Vector(1, 64, 1), Vector(20, 64, 5)
+
+    w = make_world()
+    begin = time.time()
+    w.reach.reachable(start, goal)
+    print "Cold index       %8.1fms, %d sections labelled" % ((time.time() - begin) * 1000, w.reach.labelled)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.reach.answers.clear()
+        w.reach.reachable(start, goal)
+    print "Warm index       %8.3fms" % ((time.time() - begin) * 1000 / n)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.reach.reachable(start, goal)
+    print "Remembered       %8.3fms" % ((time.time() - begin) * 1000 / n)
+
+    w.reach = None
+    begin = time.time()
+    astar.path(w, start, [goal])
+    print "A* giving up     %8.1fms" % ((time.time() - begin) * 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Feed a stream of server packets through the receive path in TCP sized
+# segments, comparing re-parsing the whole backlog on every segment (the old
+# dataReceived) against PacketBuffer.
+#
+#   $ bin/python benchmarks/receive_buffer.py [recorded-stream] [segment-size]
+#
+# A recorded stream is the raw, decrypted bytes the server sent. Without one a
+# login-like stream of chunk columns mixed with entity traffic is generated.
+
+import os, sys, time
+
+from pubbot.packets import PacketBuffer, parse_packets, make_packet
+
+
+def synthetic_stream():
+    data = []
+    for i in range(8):
+        # Columns compress to roughly 100KB when they are full of caves and ores
+        data.append(make_packet("chunk", x=i, z=0, continuous=True, primary=0xFF, secondary=0,
+            data=os.urandom(64 * 1024) + "\x00" * 200 * 1024))
+        for eid in range(50):
+            data.append(make_packet("entity-position", eid=eid, dx=1, dy=0, dz=-1))
+        data.append(make_packet("time", timestamp=i))
+    return "".join(data)
+
+
+def segments(stream, size):
+    for i in range(0, len(stream), size):
+        yield stream[i:i+size]
+
+
+def old_receive(stream, size):
+    count = 0
+    buffered = ""
+    for data in segments(stream, size):
+        packets, buffered = parse_packets(buffered + data)
+        count += len(packets)
+    return count
+
+
+def new_receive(stream, size):
+    count = 0
+    b = PacketBuffer()
+    for data in segments(stream, size):
+        b.feed(data)
+        for packet in b:
+            count += 1
+    return count
+
+
+def main():
+    if len(sys.argv) > 1:
+        stream = open(sys.argv[1], "rb").read()
+    else:
+        stream = synthetic_stream()
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1460
+
+    print "%d bytes in %d byte segments" % (len(stream), size)
+    for name, fn in (("reparse backlog", old_receive), ("PacketBuffer", new_receive)):
+        start = time.time()
+        count = fn(stream, size)
+        elapsed = time.time() - start
+        print "%-16s %6d packets %8.3fs %10.0f KB/s" % (name, count, elapsed, len(stream) / 1024.0 / elapsed)
+
+
+if __name__ == "__main__":
+    main()
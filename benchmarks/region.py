@@ -0,0 +1,54 @@
+# Compares reading a box of the world with get_region against calling
+# get_block for every block in it.
+#
+#   $ bin/python benchmarks/region.py
+
+import time
+
+from pubbot import blocks
+from pubbot.world import World
+from pubbot.vector import Vector, BlockPos
+from pubbot.tests.test_world import make_column
+
+
+def make_world():
+    w = World()
+    primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+    for x in range(-2, 2):
+        for z in range(-2, 2):
+            w.on_chunk(x, z, True, primary, 0, data)
+    return w
+
+
+def main(n=20):
+    w = make_world()
+    low, high = BlockPos(-20, 40, -20), BlockPos(19, 79, 19)
+    size = 40 * 40 * 40
+
+    begin = time.time()
+    found = 0
+    for x in xrange(low[0], high[0] + 1):
+        for y in xrange(low[1], high[1] + 1):
+            for z in xrange(low[2], high[2] + 1):
+                if w.get_block(Vector(x, y, z)).solid:
+                    found += 1
+    print "get_block        %8.1fms for %d blocks" % ((time.time() - begin) * 1000, size)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.get_region(low, high)
+    print "get_region       %8.2fms" % ((time.time() - begin) * 1000 / n)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.get_region(low, high, metadata=True)
+    print "  with metadata  %8.2fms" % ((time.time() - begin) * 1000 / n)
+
+    begin = time.time()
+    for i in xrange(n):
+        w.get_region(low, high).where(blocks.solid)
+    print "  and where()    %8.2fms" % ((time.time() - begin) * 1000 / n)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,8 +16,7 @@
 
 from twisted.python import log
 
-from pubbot.vector import Vector
-from pubbot import astar
+from pubbot import astar, blocks, dstar
 
 class Action(object):
 
@@ -97,37 +96,245 @@ class MoveTo(Action):
 
 class NavigateTo(Action):
 
-    """ I use a* to try to move to a coordinate """
+    """
+    I use D* Lite to try to move to a coordinate
+
+    The search is spread over as many frames as it needs, a slice of at most
+    NODES points or SECONDS seconds per frame, so the bot keeps talking to
+    the server while it thinks.
+
+    Once I've queued the moves, I watch the world until they are done. If a
+    block changes under the route, the search is repaired and the moves
+    still waiting in the bot's queue are swapped for the new route. A repair
+    gets the same budget; if it needs more, the bot stops where it is while
+    I finish it.
+
+    In "dig" mode I use A* with the cost of breaking blocks instead, and
+    queue a Dig for each block in the way before the move through it.
+    """
+
+    NODES = 2000
+    SECONDS = 0.01
 
     def __init__(self, bot, pos, mode="move"):
         super(NavigateTo, self).__init__(bot)
         self.pos = pos
         self.mode = mode
+        self.plan = None
+        self.search = None
+        self.origin = None
+        self.moves = []
+        self.world = None
+        self.repairing = False
 
     def do(self):
-        if self.bot.pos.floor() == self.pos.floor():
+        if self.repairing:
+            # A repair that didn't fit in the frame the change arrived in
+            if not self.search.step(self.NODES, self.SECONDS):
+                return self
+            self.repairing = False
+            moves = [MoveTo(self.bot, move) for move in self.search.route or []]
+            if moves:
+                self.moves.extend(moves)
+                return tuple(moves) + (self, )
+
+        if self.world is not None:
+            # Back here after walking the route
+            self.stop_watching()
+
+        if self.search is None:
+            if self.bot.pos.floor() == self.pos.floor():
+                return
+
+            target = self.pos
+            if self.plan is None:
+                log.msg("%s to %s, %s units" % (self.bot.pos.floor(), self.pos.floor(), (self.bot.pos-self.pos).manhattan_length()))
+                if (self.bot.pos.floor() - self.pos.floor()).manhattan_length() > astar.MAX_PATH_SIZE:
+                    # Too far to search directly, head for the next waypoint
+                    # of a plan over the whole map. Arriving there runs this
+                    # again.
+                    self.plan = self.bot.protocol.world.graph.begin(self.bot.pos, self.pos)
+
+            plan = self.plan
+            if plan is not None:
+                if not plan.step(self.NODES, self.SECONDS):
+                    return self
+                target = plan.waypoint(self.bot.pos)
+                self.plan = None
+                if target is None:
+                    log.msg("No route through the map I know about")
+                    return
+
+            if not self.begin(target):
+                log.msg("Cant seem to do that, no data or invalid dest")
+                return
+
+            if plan is not None:
+                # Planning had this frame, the search starts next frame
+                return self
+
+        try:
+            finished = self.search.step(self.NODES, self.SECONDS)
+        except KeyError:
+            log.err()
+            self.search = None
             return
 
-        log.msg("%s to %s, %s units" % (self.bot.pos.floor(), self.pos.floor(), (self.bot.pos-self.pos).manhattan_length()))
+        if not finished:
+            # Still thinking, carry on next frame
+            return self
+
+        search = self.search
+        moves = search.route
+        if search.slices > 1:
+            log.msg("Searched %d points over %d frames" % (search.expanded, search.slices))
 
-        actions = []
+        if not moves:
+            log.msg("Cant seem to do that, no data or invalid dest")
+            self.search = None
+            return
+
+        digging = getattr(search, "digging", None)
+        if digging is not None:
+            acts = []
+            for move, breaks in digging.annotate(moves):
+                acts.extend(Dig(self.bot, block) for block in breaks)
+                acts.append(MoveTo(self.bot, move))
+            self.search = None
+            return tuple(acts)
+
+        self.moves = [MoveTo(self.bot, move) for move in moves]
+        self.world = self.bot.protocol.world
+        self.world.watch(self.world_changed)
+
+        return tuple(self.moves) + (self, )
+
+    def begin(self, target):
         world = self.bot.protocol.world
 
+        self.origin = self.bot.pos.floor()
         try:
-            moves = astar.path(world, self.bot.pos, [self.pos], mode=self.mode)
+            if self.mode == "dig":
+                self.search = astar.begin(world, self.origin, [target], mode="dig", stats=self.bot.pathing)
+            else:
+                self.search = dstar.begin(world, self.origin, target, stats=self.bot.pathing)
         except KeyError:
             log.err()
-            moves = None
+            self.search = None
+
+        return self.search is not None
+
+    def stop_watching(self):
+        if self.world is not None:
+            self.world.unwatch(self.world_changed)
+        self.world = None
+        self.search = None
+        self.moves = []
+        self.repairing = False
+
+    def world_changed(self, cx, cz, positions):
+        queue = self.bot.actions
+        pending = [m for m in self.moves if m in queue]
+        if not pending and not self.repairing:
+            return
 
-        if not moves:
-            log.msg("Cant seem to do that, no data or invalid dest")
+        if not self.repairing:
+            # Repair from the last point reached
+            done = len(self.moves) - len(pending)
+            self.search.move(self.moves[done - 1].pos if done else self.origin)
+
+        if not self.search.column_changed(cx, cz, positions) or self.repairing:
+            return
+
+        if not self.search.step(self.NODES, self.SECONDS):
+            # Too much to repair in one frame. Stop walking the old route and
+            # carry on from do().
+            log.msg("Route changed, stopping to think")
+            at = queue.index(pending[0])
+            del queue[at:at + len(pending)]
+            self.moves = self.moves[:done]
+            self.repairing = True
             return
 
-        for move in moves:
-            actions.append(MoveTo(self.bot, move))
-        actions.append(self)
+        route = self.search.route or []
+        if route == [m.pos for m in pending]:
+            return
+
+        log.msg("Route changed, replacing %d moves with %d" % (len(pending), len(route)))
+        moves = [MoveTo(self.bot, move) for move in route]
+        at = queue.index(pending[0])
+        queue[at:at + len(pending)] = moves
+        self.moves = self.moves[:done] + moves
+
+
+class Follow(Action):
+
+    """
+    I keep the bot near target, an entity, by walking down the world's
+    FlowField towards it. Everything following the same entity shares the
+    field, so each move is looked up rather than searched for. The field is
+    forgotten when the last follower is done with it.
+
+    Once within distance I'm done, unless keep is set, in which case I wait
+    for the target to move off again. When the bot is further away than the
+    field reaches, I NavigateTo the target first.
+    """
 
-        return tuple(actions)
+    NODES = 2000
+    SECONDS = 0.01
+
+    def __init__(self, bot, target, distance=3, keep=True):
+        super(Follow, self).__init__(bot)
+        self.target = target
+        self.distance = distance
+        self.keep = keep
+        self.field = None
+
+        # Where the bot and target were the last time I had to NavigateTo
+        self.navigated = None
+
+    def do(self):
+        world = self.bot.protocol.world
+        if self.field is None:
+            self.field = world.flow_field(self.target.eid, self.target.pos)
+            self.field.users += 1
+        elif world.fields.get(self.target.eid) is not self.field:
+            log.msg("Lost sight of what I was following")
+            self.field = None
+            return None
+
+        field = self.field
+        field.move(self.target.pos)
+        field.step(self.NODES, self.SECONDS)
+
+        if (self.target.pos - self.bot.pos).length() <= self.distance:
+            return self if self.keep else self.finish()
+
+        points = field.next(self.bot.pos)
+        if points is None and field.ready:
+            # Too far away for the field, search the whole way instead. If
+            # that got nowhere, there's no point trying again until something
+            # has moved.
+            where = (self.bot.pos.floor(), self.target.pos.floor())
+            if where != self.navigated:
+                self.navigated = where
+                return (NavigateTo(self.bot, self.target.pos), self)
+            if self.keep:
+                return self
+            log.msg("Can't follow from here")
+            return self.finish()
+
+        if not points:
+            if not field.ready or self.keep:
+                # Still building, or the target may come back in range
+                return self
+            return self.finish()
+
+        return tuple(MoveTo(self.bot, point) for point in points) + (self, )
+
+    def finish(self):
+        self.bot.protocol.world.release_field(self.target.eid, self.field)
+        self.field = None
 
 
 class Dig(Action):
@@ -232,12 +439,14 @@ class MineGrid(Action):
         self.bot, self.corner1, self.corner2 = bot, corner1, corner2
 
     def do(self):
-        grid = []
-        for x in range(self.corner1.x, self.corner2.x+1):
-            for y in range(self.corner1.y, self.corner2.y+1):
-                for z in range(self.corner1.z, self.corner2.z+1):
-                    pos = Vector(x, y, z)
-                    grid.append((pos-self.bot.pos).length(), pos)
+        try:
+            region = self.bot.protocol.world.get_region(self.corner1.floor(), self.corner2.floor())
+        except KeyError:
+            log.msg("Don't know what is in that grid yet")
+            return
+
+        # Only what is there to dig, nearest first
+        grid = [((pos - self.bot.pos).length(), pos) for pos in region.where(blocks.diggable)]
         grid.sort()
 
         return tuple(Dig(self.bot, x[1]) for x in grid)
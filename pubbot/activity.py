@@ -14,24 +14,32 @@
 
 # Activities are built in "composite" actions
 
-from pubbot import actions
-from pubbot.vector import Vector
+from pubbot import actions, blocks
+from pubbot.vector import Vector, BlockPos
 
 def heel(bot, target):
-    flyto(bot, target.pos)
+    return (actions.Follow(bot, target), )
 
 
+# Height to fly at when the ground on the way isn't known
+CRUISE = 129
+
 def flyto(bot, pos):
     acts = []
 
+    # Just high enough to clear everything on the way
+    cruise = bot.protocol.world.cruise_height(bot.pos, pos)
+    if cruise is None:
+        cruise = CRUISE
+
     # Move straight up
     pos1 = bot.pos.copy()
-    pos1.y = 129
+    pos1.y = max(cruise, pos1.y)
     acts.append(actions.MoveTo(bot, pos1))
 
     # Move towards target
     pos2 = pos.copy()
-    pos2.y = 129
+    pos2.y = pos1.y
     acts.append(actions.MoveTo(bot, pos2))
 
     # Move straight down
@@ -51,12 +59,13 @@ def fire(bot):
     return tuple(acts)
 
 def grief(bot):
-    acts =[]
-    for x in range(-3, 3):
-        for y in range(-3, 3):
-            for z in range(-3, 3):
-                m = actions.Dig(bot, bot.pos.floor() + Vector(x,y,z), -1)
-                acts.append(m)
+    here = bot.pos.floor()
+    try:
+        region = bot.protocol.world.get_region(here + BlockPos(-3, -3, -3), here + BlockPos(2, 2, 2))
+    except KeyError:
+        return ()
+
+    acts = [actions.Dig(bot, pos, -1) for pos in region.where(blocks.diggable)]
 
     # nearest first
     acts.sort(key=lambda d: (bot.eyepos - d.pos).length())
@@ -15,28 +15,39 @@
 # Provides simple close-range navigation, based on
 #   golem (http://github.com/aniero/golem)
 
-import heapq
+import heapq, time
 
 from twisted.python import log
 
+from pubbot.vector import pack, unpack, XZ_OFFSET, Y_OFFSET
+from pubbot.dig import DigCosts
+
 
 MAX_PATH_SIZE = 64
 
+# Give up after expanding this many points. With flying allowed, proving a
+# goal is unreachable otherwise means visiting every open block in range.
+MAX_EXPANDED = 20000
+
 
 class Heap(object):
 
-    __slots__ = ("sortfn", "heap", )
+    __slots__ = ("sortfn", "heap", "count")
 
     def __init__(self, sortfn=lambda x: x):
         self.sortfn = sortfn
         self.heap = []
         heapq.heapify(self.heap)
 
+        # Ties are broken by insertion order, never by comparing the items
+        self.count = 0
+
     def push(self, x):
-        heapq.heappush(self.heap, (self.sortfn(x), x))
+        heapq.heappush(self.heap, (self.sortfn(x), self.count, x))
+        self.count += 1
 
     def pop(self):
-        sortval, val = heapq.heappop(self.heap)
+        sortval, count, val = heapq.heappop(self.heap)
         return val
 
     def empty(self):
@@ -64,7 +75,44 @@ class Path(object):
         return heuristic * 101 + len(self.path) * 100
 
 
-def path(world, start, goals, mode="move"):
+class SearchStats(object):
+
+    """
+    I total up the searches run for a bot, slice by slice.
+
+    yielded counts the slices that ran out of budget and left the rest of
+    their search for a later tick.
+    """
+
+    def __init__(self):
+        self.searches = self.found = self.failed = 0
+        self.slices = self.yielded = 0
+        self.expanded = 0
+        self.elapsed = 0.0
+        self.longest = 0.0
+
+    def record(self, search, expanded, spent):
+        self.slices += 1
+        self.expanded += expanded
+        self.elapsed += spent
+        self.longest = max(self.longest, spent)
+
+        if not search.done:
+            self.yielded += 1
+        elif search.route is None:
+            self.failed += 1
+        else:
+            self.found += 1
+
+
+def usable_goals(world, start, goals, digging=None):
+    """
+    Return goals, floored, if any of them are in range and could be stood
+    in, otherwise log why not and return None.
+
+    With digging, a DigCosts, a goal only has to be somewhere the bot could
+    dig its way into.
+    """
     start = start.floor()
     goals = [x.floor() for x in goals]
 
@@ -74,38 +122,284 @@ def path(world, start, goals, mode="move"):
         return None
 
     # Check the goal is actually valid...
-    if not filter(lambda x: world.allowed(x), goals):
+    allowed = digging.passable if digging is not None else world.allowed
+    if not filter(allowed, goals):
         log.msg("Goal isnt valid")
         return None
 
-    visited = set()
-    examined = 0
+    # ... and not walled off. Walls are no obstacle to digging.
+    reach = getattr(world, "reach", None) if digging is None else None
+    if reach is not None and not filter(lambda x: reach.reachable(start, x), goals):
+        log.msg("Goal is walled off")
+        return None
+
+    return goals
+
+
+def begin(world, start, goals, mode="move", stats=None):
+    """
+    Set up a Search from start to the nearest of goals, or return None if
+    none of them can be reached from here.
+
+    In "dig" mode solid blocks in the way are broken, and the search has a
+    digging attribute, the DigCosts that can annotate its route.
+    """
+    digging = DigCosts(world) if mode == "dig" else None
+    if not usable_goals(world, start, goals, digging):
+        return None
+
+    start = start.floor()
+    goals = [x.floor() for x in goals]
+
+    if digging is not None:
+        search = Search(
+            pack(*start),
+            [pack(*goal) for goal in goals],
+            digging.successors,
+            packed_heuristic(goals),
+            cost=digging.cost,
+            decode=unpack,
+            stats=stats,
+            )
+        search.digging = digging
+        return search
+
+    if hasattr(world, "successors"):
+        # A real World can expand packed positions without building any
+        # Vectors or BlockPos along the way
+        return Search(
+            pack(*start),
+            [pack(*goal) for goal in goals],
+            world.successors,
+            packed_heuristic(goals),
+            decode=unpack,
+            stats=stats,
+            )
+
+    return Search(start, goals, available_successors(world), heuristic(goals), stats=stats)
+
+
+def path(world, start, goals, mode="move"):
+    """
+    The points to move through from start to the nearest of goals, or None.
+    In "dig" mode each point comes paired with the blocks to break before
+    moving there (see DigCosts.annotate).
+    """
+    s = begin(world, start, goals, mode)
+    if s is None:
+        return None
+
+    final_path = s.run()
+    if final_path is None:
+        return None
+
+    if mode == "dig":
+        final_path = s.digging.annotate(final_path)
+
+    log.msg("FINAL PATH: ",  final_path)
+    return final_path
+
+
+class Search(object):
+
+    """
+    I am an A* search from start to the nearest of goals that can be run a
+    slice at a time, so a long search doesn't hold up the reactor.
+
+    successors(node) returns (node, intermediate nodes) pairs for every move
+    out of node. Each point moved through costs the same unless cost is
+    given, as cost(node, child, intermediate nodes), and the estimate from h
+    is weighted by 1% (see Path.cost). Nodes only ever need to be hashable.
+    decode, if given, turns each node of the finished route into something
+    else.
+
+    Once done, route holds the points on the way to the goal, not including
+    start, or None if there isn't one within limit expansions. Between
+    slices the search carries on against whatever successors() says then.
+    """
+
+    # How often to look at the clock, in expansions
+    CLOCK_EVERY = 32
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, start, goals, successors, h, limit=MAX_EXPANDED, cost=None, decode=None, stats=None):
+        self.goals = set(goals)
+        self.successors = successors
+        self.h = h
+        self.cost = cost
+        self.limit = limit
+        self.decode = decode
+
+        self.g_score = {start: 0}
+        self.came_from = {start: None}
+        self.closed = set()
+
+        self.heap = [(h(start) * 101, 0, start)]
+        self.count = 1
+
+        self.done = False
+        self.route = None
+
+        # Progress, for whoever is scheduling the slices
+        self.slices = 0
+        self.elapsed = 0.0
+        self.longest = 0.0
+
+        self.stats = stats
+        if stats is not None:
+            stats.searches += 1
+
+    @property
+    def expanded(self):
+        return len(self.closed)
+
+    @property
+    def frontier(self):
+        return len(self.heap)
+
+    def run(self):
+        """ Search to the end, however long it takes, and return the route """
+        self.step()
+        return self.route
+
+    def step(self, nodes=None, seconds=None):
+        """
+        Expand up to nodes points, or for up to seconds, whichever runs out
+        first. Returns True once the search has finished.
+        """
+        if self.done:
+            return True
+
+        clock = self.clock
+        started = clock()
+        deadline = started + seconds if seconds is not None else None
+        before = self.expanded
+        stop = before + nodes if nodes is not None else None
+
+        goals = self.goals
+        successors = self.successors
+        h = self.h
+        cost = self.cost
+        g_score = self.g_score
+        came_from = self.came_from
+        closed = self.closed
+        heap = self.heap
+
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        try:
+            while heap:
+                f, _, node = heappop(heap)
+
+                if node in closed:
+                    continue
+                closed.add(node)
+
+                if node in goals:
+                    self.finish(reconstruct(came_from, node))
+                    return True
+
+                expanded = len(closed)
+                if expanded > self.limit:
+                    log.msg("Gave up after expanding %d points" % self.limit)
+                    self.finish(None)
+                    return True
+
+                g = g_score[node]
+                for child, steps in successors(node):
+                    if child in closed:
+                        continue
+                    if steps and any(step in closed for step in steps):
+                        continue
+
+                    if cost is None:
+                        score = g + 1 + len(steps)
+                    else:
+                        score = g + cost(node, child, steps)
+                    if score >= g_score.get(child, score + 1):
+                        continue
+
+                    g_score[child] = score
+                    came_from[child] = (node, steps)
+
+                    heappush(heap, (h(child) * 101 + score * 100, self.count, child))
+                    self.count += 1
+
+                if stop is not None and expanded >= stop:
+                    return False
+                if deadline is not None and expanded % self.CLOCK_EVERY == 0 and clock() >= deadline:
+                    return False
+
+            self.finish(None)
+            return True
+
+        finally:
+            spent = clock() - started
+            self.slices += 1
+            self.elapsed += spent
+            self.longest = max(self.longest, spent)
+            if self.stats is not None:
+                self.stats.record(self, self.expanded - before, spent)
+
+    def finish(self, route):
+        if route is not None and self.decode is not None:
+            route = [self.decode(node) for node in route]
+        self.route = route
+        self.done = True
+
+
+def search(start, goals, successors, h, limit=MAX_EXPANDED):
+    """
+    A* from start to the nearest of goals, run to the end. See Search.
+    """
+    return Search(start, goals, successors, h, limit).run()
 
-    heap = Heap(lambda x: x.cost())
-    heap.push(Path(start, goals, []))
 
-    while not heap.empty():
-        path = heap.pop()
+def reconstruct(came_from, node):
+    route = []
+    while True:
+        link = came_from[node]
+        if link is None:
+            break
+        route.append(node)
+        node, steps = link
+        route.extend(reversed(steps))
+    route.reverse()
+    return route
 
-        if path.point in visited:
-            #log.msg("rejecting ", path.point)
-            continue
-        visited.add(path.point)
 
-        examined += 1
-        #log.msg(examined, len(heap.heap))
+def heuristic(goals):
+    """ Manhattan distance to the nearest goal, remembered per node """
+    cache = {}
+    def h(node):
+        try:
+            return cache[node]
+        except KeyError:
+            value = cache[node] = min((goal - node).manhattan_length() for goal in goals)
+            return value
+    return h
 
-        if path.point in goals:
-            final_path = path.path + [path.point]
-            final_path = final_path[1:]
-            log.msg("FINAL PATH: ",  final_path)
-            return final_path
 
-        for next_points in world.available(path.point):
-            if filter(lambda x: x in visited, next_points):
-                continue
-            #log.msg(next_point)
-            heap.push(Path(next_points[-1], goals, path.path + [path.point] + list(next_points[:-1])))
+def packed_heuristic(goals):
+    """ heuristic() for packed positions """
+    goals = [(goal.x, goal.y, goal.z) for goal in goals]
+    cache = {}
+    def h(key):
+        try:
+            return cache[key]
+        except KeyError:
+            x = (key >> 38) - XZ_OFFSET
+            y = (key & 0xFFF) - Y_OFFSET
+            z = ((key >> 12) & 0x3FFFFFF) - XZ_OFFSET
+            value = cache[key] = min(abs(gx - x) + abs(gy - y) + abs(gz - z) for gx, gy, gz in goals)
+            return value
+    return h
 
-    #log.msg("Ran out of heap")
 
+def available_successors(world):
+    """ Adapt world.available() to what search() expects """
+    def successors(node):
+        return [(points[-1], points[:-1]) for points in world.available(node)]
+    return successors
@@ -15,12 +15,10 @@
 # Provides a world object which provides access to block data, which is segmented
 # by minecraft in to chunks
 
-import os, zlib, math
-
-from twisted.internet import threads, defer
+import math
 
 from pubbot.vector import Vector
-from pubbot.blocks import blocks
+from pubbot import blocks
 
 
 class Block(object):
@@ -43,25 +41,23 @@ class Block(object):
 
     @property
     def solid(self):
-        return self.kind not in [0x00, 0x08, 0x09, 0x0A, 0x0B, ]
+        return blocks.solid[self.kind]
 
     @property
     def liquid(self):
-        return self.kind in [0x08, 0x09, 0x0A, 0x0B, ]
+        return blocks.liquid[self.kind]
+
+    @property
+    def passable(self):
+        return blocks.passable[self.kind]
 
     @property
     def preferred_tool(self):
-        try:
-            return blocks[self.kind]["preferred_tool"]
-        except KeyError:
-            return 0x104
+        return blocks.preferred_tool[self.kind]
 
     @property
     def ttl(self):
-        try:
-            return blocks[self.kind]["times"][self.preferred_tool]
-        except KeyError:
-            return 20.0
+        return blocks.ttl[self.kind]
 
     @property
     def digs(self):
@@ -70,7 +66,10 @@ class Block(object):
 
     @property
     def name(self):
-        return blocks[self.kind]["name"]
+        name = blocks.names[self.kind]
+        if name is None:
+            raise KeyError(self.kind)
+        return name
 
     def get_faces(self, observer):
         """
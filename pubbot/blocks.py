@@ -266,3 +266,60 @@ blocks = {
         },
     }
 
+
+
+# The same data, flattened into lists indexed by block id. These are what the
+# hot paths (Block properties, World.allowed, pathfinding) read.
+
+BLOCK_IDS = 4096
+
+DEFAULT_TOOL = 0x104
+DEFAULT_TIME = 20.0
+
+LIQUIDS = (0x08, 0x09, 0x0A, 0x0B)
+
+liquid = [False] * BLOCK_IDS
+for kind in LIQUIDS:
+    liquid[kind] = True
+
+solid = [True] * BLOCK_IDS
+solid[0x00] = False
+for kind in LIQUIDS:
+    solid[kind] = False
+
+# What the bot can stand in: anything that isn't solid
+passable = [not s for s in solid]
+
+# Bedrock, end portal, end portal frame
+UNBREAKABLE = (0x07, 0x77, 0x78)
+
+breakable = [True] * BLOCK_IDS
+for kind in UNBREAKABLE:
+    breakable[kind] = False
+
+# Worth sending the bot to dig: there is something there and it will break
+diggable = [s and b for s, b in zip(solid, breakable)]
+
+# Worth telling people about: ores, chests and spawners. World keeps where
+# these are, not just how many there are.
+INTERESTING = (
+    0x0E, 0x0F, 0x10, 0x15, 0x38, 0x49, 0x4A, 0x81,
+    0x36, 0x92,
+    0x34,
+    )
+
+names = [None] * BLOCK_IDS
+preferred_tool = [DEFAULT_TOOL] * BLOCK_IDS
+ttl = [DEFAULT_TIME] * BLOCK_IDS
+
+# tool id -> list of seconds to dig each block id with it
+dig_times = {}
+
+for kind, info in blocks.iteritems():
+    names[kind] = info["name"]
+    preferred_tool[kind] = info["preferred_tool"]
+    ttl[kind] = info["times"].get(info["preferred_tool"], DEFAULT_TIME)
+    for tool, time in info["times"].iteritems():
+        dig_times.setdefault(tool, [DEFAULT_TIME] * BLOCK_IDS)[kind] = time
+
+del kind, info, tool, time
@@ -23,7 +23,7 @@ from twisted.internet import task
 from twisted.python import log
 
 from pubbot.vector import Vector, forward
-from pubbot import activity, actions
+from pubbot import activity, actions, astar, blocks
 
 from pubbot.router import Pubbot
 
@@ -56,8 +56,15 @@ class Bot(object):
         self.stance = 0
         self.on_ground = True
 
+        # What the server was last told, so unchanged fields aren't resent
+        self.sent_position = None
+        self.sent_orientation = None
+
         self.actions = []
 
+        # How much thinking NavigateTo has done, frame by frame
+        self.pathing = astar.SearchStats()
+
         self.chat = Pubbot()
         self.places = ConfigParser.ConfigParser()
 
@@ -98,12 +105,17 @@ class Bot(object):
         self.look_at(pos.x, pos.y+1.7, pos.z)
         if nearby[0][0] > 5 or nearby[0][0] < -5:
             if not self.actions:
-                self.actions.append(actions.NavigateTo(self, nearby[0][1].pos))
+                if self.protocol.world.reach.reachable(self.pos, pos):
+                    self.actions.append(actions.Follow(self, nearby[0][1], distance=5, keep=False))
+                else:
+                    log.msg("Can't get to %s from here" % nearby[0][1].player_name)
             #self.move((pos-self.pos).normalize())
 
 
     def frame(self):
         #log.msg("Frame called")
+        self.protocol.sent.tick()
+
         self.on_ground = False
 
         self.look_at_nearest()
@@ -132,11 +144,30 @@ class Bot(object):
         self.send_location()
 
     def send_location(self):
-        self.protocol.send("location",
-            position = packets.Container(x=self.x, y=self.y, z=self.z, stance=self.stance),
-            orientation = packets.Container(yaw=self.yaw, pitch=self.pitch),
-            grounded = packets.Container(grounded=self.on_ground),
-            )
+        """
+        Tell the server where I am, using the smallest packet that covers what
+        changed since last time. When nothing changed a grounded packet is
+        still sent to keep the connection alive.
+        """
+        position = (self.x, self.y, self.stance, self.z)
+        orientation = (self.yaw, self.pitch)
+        grounded = 1 if self.on_ground else 0
+
+        moved = position != self.sent_position
+        turned = orientation != self.sent_orientation
+
+        if moved and turned:
+            data = packets.make_location_packet(self.x, self.y, self.stance, self.z, self.yaw, self.pitch, grounded)
+        elif moved:
+            data = packets.make_position_packet(self.x, self.y, self.stance, self.z, grounded)
+        elif turned:
+            data = packets.make_orientation_packet(self.yaw, self.pitch, grounded)
+        else:
+            data = packets.make_grounded_packet(grounded)
+
+        self.sent_position = position
+        self.sent_orientation = orientation
+        self.protocol.send_raw(data)
 
     def look_at(self, x, y, z):
         aim = Vector(x, y, z) - self.eyepos
@@ -234,9 +265,12 @@ class Bot(object):
 
             from pubbot.quaternion import directions
             dir = directions(ent.yaw, ent.pitch).forward
-            tunnel_loc = self.world.trace(ent.pos, dir)
+            hit = self.protocol.world.raycast(ent.pos + Vector(0, 1.65, 0), dir)
+            if hit is None:
+                self.protocol.send_chat_message("You aren't looking at anything")
+                return
 
-            self.protocol.send_chat_message("I'm looking at %s but you didnt teach me to tunnel yet", tunnel_loc)
+            self.protocol.send_chat_message("I'm looking at %s, %s, %s but you didnt teach me to tunnel yet" % hit.pos)
 
         elif message.startswith("orient"):
             if len(message) > 6:
@@ -247,6 +281,22 @@ class Bot(object):
             else:
                 self.protocol.send_chat_message("Current orientation is %s, %s" % (self.pitch, self.yaw))
 
+        elif message.startswith("find "):
+            what = message[5:].strip()
+            if what not in blocks.names:
+                self.protocol.send_chat_message("I don't know what %s is" % what)
+                return
+            found = self.protocol.world.find_nearest(blocks.names.index(what), self.pos, 128)
+            if found is None:
+                self.protocol.send_chat_message("I haven't seen any %s nearby" % what)
+            else:
+                self.protocol.send_chat_message("There is %s at %s, %s, %s" % ((what, ) + found))
+
+        elif message == "pathing":
+            p = self.pathing
+            self.protocol.send_chat_message("%d searches (%d found, %d failed), %d points in %d frames, %.1fms total, %.1fms longest" % (
+                p.searches, p.found, p.failed, p.expanded, p.slices, p.elapsed * 1000, p.longest * 1000))
+
         elif message.startswith("pos"):
             self.free_will = False
             if len(message) > 3:
@@ -12,20 +12,217 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-# A Chunk is a segment of world containing blocks, up to 16x16x128
+# A Chunk is a column of world 16 blocks wide, 16 blocks deep and 256 blocks
+# tall. It is stored as 16 stacked Sections of 16x16x16 blocks. Sections that
+# are entirely air are not stored at all.
 
 import os, zlib, math
+from itertools import izip
 
-from twisted.internet import threads, defer
-from twisted.python import log
-
+from pubbot import blocks as blockdata
 from pubbot.block import Block
 from pubbot.vector import Vector
 
 
+SECTION_HEIGHT = 16
+SECTION_COUNT = 16
+SECTION_SIZE = 16 * 16 * SECTION_HEIGHT
+CHUNK_HEIGHT = SECTION_HEIGHT * SECTION_COUNT
+
+# Section summary bits
+ALL_PASSABLE = 1
+ALL_SOLID = 2
+
+# Table for str.translate, turning solid block ids into "\x01"
+_SOLID = "".join("\x01" if blockdata.solid[k] else "\x00" for k in range(256))
+
+
+class Section(object):
+
+    """
+    I am a 16x16x16 cube of blocks.
+
+    Block ids live in a bytearray with one byte per block, metadata in a
+    bytearray of nibbles (two blocks per byte). Blocks are ordered the same way
+    the server sends them: index = y*256 + z*16 + x.
+    """
+
+    __slots__ = ("blocks", "metadata", "_solid")
+
+    def __init__(self, blocks=None, metadata=None):
+        self.blocks = blocks if blocks is not None else bytearray(SECTION_SIZE)
+        self.metadata = metadata if metadata is not None else bytearray(SECTION_SIZE // 2)
+        # How many of the blocks are solid, counted on first use and kept up
+        # to date by set() and scatter() after that
+        self._solid = None
+
+    def summary(self):
+        """
+        Return ALL_PASSABLE and/or ALL_SOLID bits for this section, so
+        searches can treat it as a whole instead of block by block.
+        """
+        if self._solid is None:
+            self._solid = str(self.blocks).translate(_SOLID).count("\x01")
+        if not self._solid:
+            return ALL_PASSABLE
+        if self._solid == len(self.blocks):
+            return ALL_SOLID
+        return 0
+
+    def get_kind(self, index):
+        return self.blocks[index]
+
+    def get_metadata(self, index):
+        value = self.metadata[index >> 1]
+        if index & 1:
+            return value >> 4
+        return value & 0x0F
+
+    def set(self, index, kind, metadata):
+        kind &= 0xFF
+        if self._solid is not None:
+            solid = blockdata.solid
+            self._solid += solid[kind] - solid[self.blocks[index]]
+        self.blocks[index] = kind
+
+        i = index >> 1
+        if index & 1:
+            self.metadata[i] = (self.metadata[i] & 0x0F) | ((metadata & 0x0F) << 4)
+        else:
+            self.metadata[i] = (self.metadata[i] & 0xF0) | (metadata & 0x0F)
+
+    def scatter(self, indexes, kinds, metadatas):
+        """ set() for many blocks at once """
+        blocks = self.blocks
+        metadata = self.metadata
+        solid = blockdata.solid
+        count = self._solid
+        for index, kind, meta in izip(indexes, kinds, metadatas):
+            kind &= 0xFF
+            if count is not None:
+                count += solid[kind] - solid[blocks[index]]
+            blocks[index] = kind
+
+            i = index >> 1
+            if index & 1:
+                metadata[i] = (metadata[i] & 0x0F) | ((meta & 0x0F) << 4)
+            else:
+                metadata[i] = (metadata[i] & 0xF0) | (meta & 0x0F)
+        self._solid = count
+
+    def nbytes(self):
+        return len(self.blocks) + len(self.metadata)
+
+
+def section_index(x, y, z):
+    """ Index of a block within its section, given coords relative to the chunk """
+    return ((y & 15) << 8) | (z << 4) | x
+
+
+def bitcount(mask):
+    return bin(mask & 0xFFFF).count("1")
+
+
+def column_size(primary, secondary, skylight, continuous):
+    """ How many bytes a column with these bitmasks takes up in a chunk payload """
+    count = bitcount(primary)
+    size = count * (SECTION_SIZE + SECTION_SIZE // 2 + SECTION_SIZE // 2)
+    if skylight:
+        size += count * (SECTION_SIZE // 2)
+    size += bitcount(secondary) * (SECTION_SIZE // 2)
+    if continuous:
+        size += 256
+    return size
+
+
+def read_sections(data, offset, primary, secondary, skylight, continuous):
+    """
+    Unpack a protocol 39 column from data, starting at offset.
+
+    Each array is stored for all of the present sections before the next
+    array starts: block ids, metadata, block light, sky light (only in
+    dimensions with a sky), "add" nibbles (for the sections in the secondary
+    bitmask) and, for continuous columns, 256 bytes of biomes.
+
+    Only block ids and metadata are kept, and they are copied straight out of
+    the payload a section at a time. Lighting, add and biome data are skipped
+    over.
+
+    Returns a list of (section y, Section) pairs and the offset of the first
+    byte after this column.
+    """
+    present = [sy for sy in range(SECTION_COUNT) if primary & (1 << sy)]
+    count = len(present)
+
+    view = memoryview(data)
+    blocks_at = offset
+    metadata_at = blocks_at + count * SECTION_SIZE
+
+    sections = []
+    for i, sy in enumerate(present):
+        b = blocks_at + i * SECTION_SIZE
+        m = metadata_at + i * (SECTION_SIZE // 2)
+        sections.append((sy, Section(
+            bytearray(view[b:b + SECTION_SIZE]),
+            bytearray(view[m:m + SECTION_SIZE // 2]),
+            )))
+
+    return sections, offset + column_size(primary, secondary, skylight, continuous)
+
+
+def decode_payload(data, columns):
+    """
+    Decompress a chunk or map-chunk-bulk payload and unpack every column in
+    it. columns is a list of (primary, secondary, skylight, continuous) in
+    the order they are packed. skylight may be None, in which case it is
+    worked out from how many bytes are left.
+
+    This touches no shared state, so it is safe to run in a worker thread.
+    Returns a list of section lists, one per column.
+    """
+    data = zlib.decompress(data)
+
+    results = []
+    offset = 0
+    for primary, secondary, skylight, continuous in columns:
+        if skylight is None:
+            skylight = len(data) - offset > column_size(primary, secondary, False, continuous)
+        sections, offset = read_sections(data, offset, primary, secondary, skylight, continuous)
+        results.append(sections)
+    return results
+
+
+def pack_sections(sections):
+    """
+    Flatten a column's sections (None for air) into a bitmask of the present
+    ones and their block ids and metadata, back to back.
+    """
+    mask = 0
+    data = []
+    for sy, section in enumerate(sections):
+        if section is not None:
+            mask |= 1 << sy
+            data.append(str(section.blocks))
+            data.append(str(section.metadata))
+    return mask, "".join(data)
+
+
+def unpack_sections(mask, data, offset=0):
+    """ The reverse of pack_sections, returning (section y, Section) pairs """
+    sections = []
+    for sy in range(SECTION_COUNT):
+        if mask & (1 << sy):
+            sections.append((sy, Section(
+                bytearray(buffer(data, offset, SECTION_SIZE)),
+                bytearray(buffer(data, offset + SECTION_SIZE, SECTION_SIZE // 2)),
+                )))
+            offset += SECTION_SIZE + SECTION_SIZE // 2
+    return sections
+
+
 class Chunk(object):
 
-    __slots__ = ("x", "y", "z", "blocks", "compressed")
+    __slots__ = ("x", "y", "z", "sections", "last_used")
 
     def __init__(self, x, y, z):
         # Record start of chunk.
@@ -33,17 +230,11 @@ class Chunk(object):
         self.y = y
         self.z = z
 
-        # Assume normal size
-        #self.sx = 16
-        #self.sy = 128
-        #self.sz = 16
-
-        self.compressed = None
-
-        self.blocks = {}
+        # Bottom section first. None means "all air".
+        self.sections = [None] * SECTION_COUNT
 
-    def set_compressed(self, *payload):
-        self.compressed = payload
+        # Stamped by the World on every lookup, for LRU eviction
+        self.last_used = 0
 
     def dump_chunk(self, payload):
         if not os.path.exists("/tmp/chunks"):
@@ -58,70 +249,122 @@ class Chunk(object):
         open(path, "wb").write(payload)
         open("/tmp/chunks/index", "a").write("\t".join([str(x) for x in (i, self.pos.x, self.pos.y, self.pos.z, self.sx, self.sy, self.sz)]) + "\n")
 
-    def load_chunk(self):
-        if not self.compressed:
-            return
-
-        log.msg("Attempting to load", *self.compressed[:-1])
-
-        stx, sty, stz, sx, sy, sz, compressed = self.compressed
-
-        payload = zlib.decompress(compressed)
-
-        if False:
-            self.dump_chunk(payload)
-
-        ox, oy, oz = self.x*16, self.y, self.z*16
+    def load_sections(self, data, offset, primary, secondary, skylight, continuous):
+        """
+        Unpack a protocol 39 column from data, starting at offset, into this
+        chunk. See read_sections for the layout.
+
+        Returns the offset of the first byte after this column.
+        """
+        sections, end = read_sections(data, offset, primary, secondary, skylight, continuous)
+        self.set_sections(sections, continuous)
+        return end
+
+    def set_sections(self, sections, continuous):
+        """
+        Store (section y, Section) pairs. A continuous update replaces the
+        whole column, so any section it doesn't mention becomes air.
+        """
+        if continuous:
+            self.sections = [None] * SECTION_COUNT
+        for sy, section in sections:
+            self.sections[sy] = section
+
+    def get_section(self, y, create=False):
+        """ Return the Section holding height y, optionally creating it """
+        sy = y >> 4
+        section = self.sections[sy]
+        if section is None and create:
+            section = self.sections[sy] = Section()
+        return section
+
+    def get_relative(self, x, y, z):
+        """ Return (kind, metadata) for coords relative to this chunk """
+        if y < 0 or y >= CHUNK_HEIGHT:
+            return 0, 0
+        section = self.sections[y >> 4]
+        if section is None:
+            return 0, 0
+        index = section_index(x, y, z)
+        return section.get_kind(index), section.get_metadata(index)
+
+    def is_solid(self, x, y, z):
+        """ Whether the block at coords relative to this chunk is solid """
+        if y < 0 or y >= CHUNK_HEIGHT:
+            return False
+        section = self.sections[y >> 4]
+        if section is None:
+            return False
+        summary = section.summary()
+        if summary:
+            return summary == ALL_SOLID
+        return blockdata.solid[section.blocks[section_index(x, y, z)]]
 
-        self.blocks = {}
-        for x in range(stx, sx+1):
-            for z in range(stz, sz+1):
-                for y in range(sty, sy+1):
-                    index = y + (z*(sy+1)) + (x*(sy+1)*(sz+1))
-                    #print index, len(payload)
-                    kind = ord(payload[index])
-                    self.blocks[(x, y, z)] = Block(Vector(ox + x, oy + y, oz + z), kind, 0)
+    def is_liquid(self, x, y, z):
+        kind, metadata = self.get_relative(x, y, z)
+        return blockdata.liquid[kind]
 
-        self.compressed = None
+    def set_relative(self, x, y, z, kind, metadata):
+        if y < 0 or y >= CHUNK_HEIGHT:
+            return
+        section = self.get_section(y, create=bool(kind or metadata))
+        if section is None:
+            return
+        section.set(section_index(x, y, z), kind, metadata)
 
     def multi_change(self, array_size, coords, kinds, metadatas):
-        for i in range(array_size):
-             # coord is a short comprised of 4 bits of X, 4 bits of Z and 8 bits of Y
-             coord = coords[i]
-             x = (coord & 0xF000) >> 12
-             z = (coord & 0x0F00) >> 8
-             y = (coord & 0x00FF)
-
-             kind = kinds[i]
-             metadata = metadatas[i]
-
-             b = self.get_relative_block(Vector(x, y, z))
-             b.kind = kind
-             b.metadata = metadata
+        # coord is a short comprised of 4 bits of X, 4 bits of Z and 8 bits of Y
+        indexes = [((c & 0xFF) << 8) | (c & 0x0F00) >> 4 | (c >> 12) for c in coords[:array_size]]
+        self.scatter(indexes, kinds[:array_size], metadatas[:array_size])
+
+    def scatter(self, indexes, kinds, metadatas):
+        """
+        Write many blocks at once. indexes are positions within the column,
+        y*256 + z*16 + x. Changes are grouped by section and each section is
+        written in one pass.
+        """
+        by_section = {}
+        for i, index in enumerate(indexes):
+            by_section.setdefault(index >> 12, []).append(i)
+
+        for sy, members in by_section.iteritems():
+            section_kinds = [kinds[i] for i in members]
+            section_metadatas = [metadatas[i] for i in members]
+
+            section = self.sections[sy]
+            if section is None:
+                if not any(section_kinds) and not any(section_metadatas):
+                    # Air over air
+                    continue
+                section = self.sections[sy] = Section()
+
+            section.scatter([indexes[i] & 0xFFF for i in members], section_kinds, section_metadatas)
 
     def change(self, pos, kind, metadata):
-        b = self.get_absolute_block(pos)
-        b.kind = kind
-        b.metadata = metadata
+        v = pos.floor()
+        self.set_relative(v.x - self.x*16, v.y, v.z - self.z*16, kind, metadata)
 
     def get_relative_block(self, vector):
-        if self.compressed:
-            self.load_chunk()
         v = vector.floor()
-        return self.blocks[(v.x, v.y, v.z)]
+        kind, metadata = self.get_relative(v.x, v.y, v.z)
+        return Block(Vector(self.x*16 + v.x, v.y, self.z*16 + v.z), kind, metadata)
 
     def get_absolute_block(self, vector):
-        rel = vector - Vector(self.x*16, self.y, self.z*16)
-        return self.get_relative_block(rel)
+        v = vector.floor()
+        kind, metadata = self.get_relative(v.x - self.x*16, v.y, v.z - self.z*16)
+        return Block(v, kind, metadata)
 
     def contains(self, vector):
-        if vector.x < self.pos.x or self.pos.x + 16  <= vector.x:
-             return False
-        if vector.y < self.pos.y or self.pos.z + 128 <= vector.y:
+        ox, oz = self.x * 16, self.z * 16
+        if vector.x < ox or ox + 16 <= vector.x:
             return False
-        if vector.z < self.pos.z or self.pos.z + 16 <= vector.z:
+        if vector.y < 0 or CHUNK_HEIGHT <= vector.y:
+            return False
+        if vector.z < oz or oz + 16 <= vector.z:
             return False
 
         return True
 
-
+    def nbytes(self):
+        """ Bytes of block storage held by this chunk """
+        return sum(s.nbytes() for s in self.sections if s is not None)
@@ -0,0 +1,197 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# An on-disk cache of the chunks a bot has seen, so a reconnecting bot knows
+# its surroundings before the server has streamed them all again.
+#
+# Columns are grouped 32x32 to a region file, like the Notchian client does.
+# A region file starts with a magic number and format version, then an index
+# of 1024 entries (sector offset, sector count, section bitmask), followed by
+# columns in 4K sectors. A file with any other header is thrown away, it is
+# only a cache. A column is the block ids then the metadata of each present
+# section, bottom up, stored uncompressed so a section can be copied straight
+# out of the mapped file. It is copied rather than used in place: sections
+# are changed by block updates, and the map is resized and closed under them.
+#
+# Bots in one process connected to the same server share a ChunkCache, see
+# open_cache(), so they don't allocate sectors in the same file over each
+# other.
+
+import os, mmap, struct
+
+from pubbot.chunk import pack_sections, unpack_sections
+
+
+SECTOR = 4096
+REGION = 32
+
+MAGIC = "PBRC"
+VERSION = 1
+
+_header = struct.Struct(">4sI")
+_entry = struct.Struct(">IHH")
+INDEX_SIZE = REGION * REGION * _entry.size
+
+# Where the first column can go, the sector after the header and index
+DATA_START = -(-(_header.size + INDEX_SIZE) // SECTOR) * SECTOR
+
+
+class RegionFile(object):
+
+    """
+    I am a memory mapped file holding up to 32x32 columns.
+
+    Rewriting a column that has grown moves it to the end of the file. The
+    space it leaves behind is not reused.
+    """
+
+    def __init__(self, path):
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self.file = open(path, mode)
+
+        header = _header.pack(MAGIC, VERSION)
+        if self.file.read(_header.size) != header:
+            self.file.seek(0)
+            self.file.truncate(0)
+            self.file.write(header)
+
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() < DATA_START:
+            self.file.truncate(DATA_START)
+
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.sectors = len(self.map) // SECTOR
+
+    def index(self, x, z):
+        return _header.size + ((z & 31) * REGION + (x & 31)) * _entry.size
+
+    def read(self, x, z):
+        """
+        Return the (section y, Section) pairs stored for column x, z or None
+        if it isn't cached.
+        """
+        sector, count, mask = _entry.unpack_from(self.map, self.index(x, z))
+        if not count:
+            return None
+        return unpack_sections(mask, self.map, sector * SECTOR)
+
+    def write(self, x, z, sections):
+        """ Store a column, given as a list with None for every air section """
+        mask, data = pack_sections(sections)
+
+        # Even an all air column takes a sector, a count of 0 means missing
+        needed = max(1, -(-len(data) // SECTOR))
+
+        at = self.index(x, z)
+        sector, count, _ = _entry.unpack_from(self.map, at)
+        if needed > count:
+            sector, count = self.sectors, needed
+            self.sectors += needed
+            self.map.resize(self.sectors * SECTOR)
+
+        offset = sector * SECTOR
+        self.map[offset:offset + len(data)] = data
+        _entry.pack_into(self.map, at, sector, count, mask)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class ChunkCache(object):
+
+    """
+    I keep the columns of one dimension of one server in region files under
+    root.
+
+    Don't make two of me for the same files, use open_cache().
+    """
+
+    def __init__(self, root, host, port, dimension):
+        self.path = os.path.join(root, "%s_%d" % (host, port), "DIM%d" % dimension)
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        self.regions = {}
+
+        # Regions known not to have a file yet
+        self.missing = set()
+
+        # How many open_cache() callers haven't closed me yet
+        self.users = 1
+
+        self.reads = 0
+        self.writes = 0
+
+    def region(self, x, z, create=False):
+        key = (x >> 5, z >> 5)
+        try:
+            return self.regions[key]
+        except KeyError:
+            pass
+
+        if not create and key in self.missing:
+            return None
+
+        path = os.path.join(self.path, "r.%d.%d.pbr" % key)
+        if not create and not os.path.exists(path):
+            self.missing.add(key)
+            return None
+
+        self.missing.discard(key)
+        r = self.regions[key] = RegionFile(path)
+        return r
+
+    def read(self, x, z):
+        r = self.region(x, z)
+        if r is None:
+            return None
+
+        sections = r.read(x, z)
+        if sections is not None:
+            self.reads += 1
+        return sections
+
+    def write(self, chunk):
+        self.region(chunk.x, chunk.z, create=True).write(chunk.x, chunk.z, chunk.sections)
+        self.writes += 1
+
+    def close(self):
+        self.users -= 1
+        if self.users > 0:
+            return
+        for r in self.regions.itervalues():
+            r.close()
+        self.regions = {}
+        if _shared.get(self.path) is self:
+            del _shared[self.path]
+
+
+# path -> the ChunkCache open for it
+_shared = {}
+
+
+def open_cache(root, host, port, dimension):
+    """
+    A ChunkCache for one dimension of one server, the same one for every
+    caller until they have all closed it.
+    """
+    path = os.path.join(root, "%s_%d" % (host, port), "DIM%d" % dimension)
+    cache = _shared.get(path)
+    if cache is not None:
+        cache.users += 1
+        return cache
+    cache = _shared[path] = ChunkCache(root, host, port, dimension)
+    return cache
@@ -0,0 +1,170 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Chunk payloads are zlib compressed. Inflating and unpacking a few hundred of
+# them at login is enough to stall the reactor past the keepalive timeout, so
+# that work is farmed out to worker threads. Only storing the finished
+# sections in the World happens on the reactor thread.
+
+import heapq
+
+from twisted.internet import defer, threads
+from twisted.python import failure
+
+from pubbot.chunk import decode_payload
+
+
+class Job(object):
+
+    __slots__ = ("seq", "data", "columns", "keys", "done", "result", "remaining", "deferred")
+
+    def __init__(self, seq, data, columns, keys):
+        self.seq = seq
+        self.data = data
+        self.columns = columns
+        self.keys = keys
+        self.done = False
+        self.result = None
+        self.remaining = len(keys)
+        self.deferred = defer.Deferred()
+
+
+class DecodePool(object):
+
+    """
+    I decode chunk payloads in a bounded number of worker threads.
+
+    Payloads wait in a queue ordered by how far their nearest column is from
+    origin (a callable returning the bot's position), so the ground around the
+    bot is ready first. Once the bot has moved into another column the queue
+    is ordered again from where it is now. Decoding can finish in any order, but updates to a
+    column are always stored in the order the server sent them.
+    """
+
+    def __init__(self, world, size=2):
+        self.world = world
+        self.size = size
+        self.origin = None
+        self.defer_to_thread = threads.deferToThread
+
+        self.queue = []
+        self.running = 0
+
+        # The column origin was in when the queue was last ordered
+        self.ordered_from = None
+
+        # Jobs touching each column, oldest first
+        self.columns = {}
+
+        self.decoded = 0
+        self.failed = 0
+
+    def pending(self):
+        """ How many payloads are queued or being decoded """
+        return len(self.queue) + self.running
+
+    def distance(self, keys):
+        if self.origin is None:
+            return 0
+        pos = self.origin()
+        return min(
+            (x * 16 + 8 - pos.x) ** 2 + (z * 16 + 8 - pos.z) ** 2
+            for x, z in keys
+            )
+
+    def reorder(self):
+        """ Order the queue by distance from where origin is now """
+        if self.origin is None:
+            return
+        pos = self.origin()
+        column = (int(pos.x) >> 4, int(pos.z) >> 4)
+        if column == self.ordered_from:
+            return
+        self.ordered_from = column
+        self.queue = [(self.distance(job.keys), job.seq, job) for distance, seq, job in self.queue]
+        heapq.heapify(self.queue)
+
+    def submit(self, seq, data, columns):
+        """
+        Queue a compressed payload that arrived at sequence number seq.
+        columns is a list of (x, z, primary, secondary, skylight, continuous),
+        in the order they are packed.
+
+        Returns a Deferred that fires once every column is in the World.
+        """
+        keys = [(c[0], c[1]) for c in columns]
+        job = Job(seq, data, [c[2:] for c in columns], keys)
+
+        for key in keys:
+            self.columns.setdefault(key, []).append(job)
+
+        heapq.heappush(self.queue, (self.distance(keys), job.seq, job))
+        self.start()
+
+        return job.deferred
+
+    def start(self):
+        if self.queue and self.running < self.size:
+            self.reorder()
+        while self.queue and self.running < self.size:
+            job = heapq.heappop(self.queue)[2]
+            data, job.data = job.data, None
+
+            self.running += 1
+            d = self.defer_to_thread(decode_payload, data, job.columns)
+            d.addBoth(self.decoded_job, job)
+
+    def decoded_job(self, result, job):
+        self.running -= 1
+
+        job.done = True
+        job.result = result
+        if isinstance(result, failure.Failure):
+            self.failed += 1
+        else:
+            self.decoded += 1
+
+        for key in job.keys:
+            self.store(key)
+
+        self.start()
+
+    def waiting(self, key):
+        """ Sequence number of the oldest payload not yet stored for a column """
+        jobs = self.columns.get(key)
+        if jobs:
+            return jobs[0].seq
+        return None
+
+    def store(self, key):
+        """ Store every finished update at the front of a column's queue """
+        jobs = self.columns[key]
+        while jobs and jobs[0].done:
+            job = jobs.pop(0)
+
+            if not isinstance(job.result, failure.Failure):
+                i = job.keys.index(key)
+                continuous = job.columns[i][3]
+                self.world.store_sections(key[0], key[1], job.result[i], continuous, job.seq)
+
+            job.remaining -= 1
+            if job.remaining == 0:
+                result, job.result = job.result, None
+                if isinstance(result, failure.Failure):
+                    job.deferred.errback(result)
+                else:
+                    job.deferred.callback(None)
+
+        if not jobs:
+            del self.columns[key]
@@ -23,10 +23,12 @@ from pubbot.protocol import MinecraftClientProtocol
 
 class MinecraftClientFactory(ClientFactory):
 
-    def __init__(self, username, password, session_id):
+    def __init__(self, username, password, session_id, cache_dir=None, chunk_budget=None):
         self.username = username
         self.password = password
         self.session_id = session_id
+        self.cache_dir = cache_dir
+        self.chunk_budget = chunk_budget
         #super(MinecraftClientFactory, self).__init__()
 
     def buildShell(self, p):
@@ -52,6 +54,8 @@ class MinecraftClientFactory(ClientFactory):
 
     def buildProtocol(self, addr):
         p = MinecraftClientProtocol(self.username, self.password, self.session_id)
+        p.cache_dir = self.cache_dir
+        p.world.budget = self.chunk_budget
         self.shell = self.buildShell(p)
         return p
 
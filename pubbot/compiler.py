@@ -0,0 +1,709 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Turns the declarative construct packet definitions into specialised decode
+# and encode functions.
+#
+# Runs of fixed size fields are coalesced into a single struct.Struct, nested
+# and embedded structs are flattened, and the common adapters (Enum, Flag,
+# length prefixed strings, arrays, conditionals) are handled directly. Anything
+# else falls back to construct itself, so every definition compiles.
+#
+# A decoder is called as decode(buf, offset, context) and returns a
+# (value, offset) tuple. buf can be a str or a bytearray. If buf ends before the
+# value does Incomplete is raised, saying how many bytes would be needed.
+#
+# An encoder is called as encode(obj, context, out) and appends strings to the
+# list out.
+
+import struct
+from cStringIO import StringIO
+
+from construct import Construct, Struct, Sequence, Switch, Reconfig, Value
+from construct import FormatField, StaticField, MetaField, MetaArray
+from construct import MappingAdapter, StringAdapter, LengthValueAdapter
+from construct import Container, ListContainer, Pass
+from construct import ConstructError, FieldError, MappingError
+
+FLAG_EMBED = Construct.FLAG_EMBED
+
+# Container.__init__ and __setitem__ are pure python and cost more than the
+# unpacking does, so containers are filled in directly.
+_keys_order = Container.__dict__["__keys_order__"]
+_dict_update = dict.update
+
+def _new_container():
+    obj = dict.__new__(Container)
+    _keys_order.__set__(obj, [])
+    return obj
+
+
+class Incomplete(FieldError):
+
+    """ Raised when a decoder runs off the end of its buffer """
+
+    def __init__(self, wanted):
+        FieldError.__init__(self, "need %d bytes" % wanted)
+        self.wanted = wanted
+
+
+class BufferStream(object):
+
+    """
+    I am a read-only file-like object over part of a bytearray, so construct
+    can parse packets in place without the buffer being copied first.
+
+    I remember the furthest offset anyone tried to read, so a caller can tell
+    how much data is needed before a failed parse is worth retrying.
+    """
+
+    __slots__ = ("buffer", "pos", "wanted")
+
+    def __init__(self, buffer, pos=0):
+        self.buffer = buffer
+        self.pos = pos
+        self.wanted = pos
+
+    def read(self, length):
+        start = self.pos
+        end = start + length
+        if end > self.wanted:
+            self.wanted = end
+        data = memoryview(self.buffer)[start:end].tobytes()
+        self.pos = start + len(data)
+        return data
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=0):
+        if whence == 1:
+            pos += self.pos
+        elif whence == 2:
+            pos += len(self.buffer)
+        self.pos = pos
+
+
+# Hand written codecs for particular construct objects, by id
+custom_decoders = {}
+custom_encoders = {}
+
+def register(con, decoder=None, encoder=None):
+    if decoder:
+        custom_decoders[id(con)] = decoder
+    if encoder:
+        custom_encoders[id(con)] = encoder
+
+
+def _fixed_format(con):
+    """
+    If con is a fixed size field that struct can deal with, return its
+    (endianness, format character(s), decode mapper, encode mapper). Otherwise
+    return None.
+    """
+    if isinstance(con, FormatField):
+        fmt = con.packer.format
+        return fmt[0], fmt[1:], None, None
+
+    if type(con) is StaticField:
+        return ">", "%ds" % con.length, None, None
+
+    if isinstance(con, MappingAdapter):
+        inner = _fixed_format(con.subcon)
+        if inner and not inner[2]:
+            return inner[0], inner[1], _mapper(con.decoding, con.decdefault, con.subcon.name), \
+                _mapper(con.encoding, con.encdefault, con.subcon.name)
+
+    return None
+
+
+def _mapper(mapping, default, name):
+    def mapper(value):
+        try:
+            return mapping[value]
+        except (KeyError, TypeError):
+            if default is NotImplemented:
+                raise MappingError("no mapping for %r [%s]" % (value, name))
+            if default is Pass:
+                return value
+            return default
+    return mapper
+
+
+def _slice(buf, start, end):
+    data = buf[start:end]
+    if not isinstance(data, str):
+        data = str(data)
+    return data
+
+
+def _flatten(subcons):
+    """
+    Inline embedded structs into their parent, so their fields can be
+    coalesced with the parent's.
+    """
+    for sc in subcons:
+        if sc.conflags & FLAG_EMBED and isinstance(sc, Reconfig) and isinstance(sc.subcon, Struct):
+            for inner in _flatten(sc.subcon.subcons):
+                yield inner
+        else:
+            yield sc
+
+
+def _groups(subcons):
+    """
+    Split a list of subcons into runs of fixed size fields, and everything else
+    """
+    run = []
+    endianness = None
+    for sc in _flatten(subcons):
+        fixed = _fixed_format(sc)
+        if fixed and (not run or fixed[0] == endianness):
+            endianness = fixed[0]
+            run.append((sc.name, fixed))
+            continue
+
+        if run:
+            yield "fixed", run
+            run = []
+
+        if fixed:
+            endianness = fixed[0]
+            run.append((sc.name, fixed))
+        else:
+            yield "other", sc
+
+    if run:
+        yield "fixed", run
+
+
+#
+# Decoders
+#
+
+def compile_decoder(con):
+    if id(con) in custom_decoders:
+        return custom_decoders[id(con)]
+
+    if isinstance(con, Struct) and not isinstance(con, Sequence):
+        return _decode_struct(con)
+
+    fixed = _fixed_format(con)
+    if fixed:
+        return _decode_fixed(fixed)
+
+    if isinstance(con, MetaField):
+        return _decode_metafield(con)
+
+    if isinstance(con, StringAdapter) and isinstance(con.subcon, LengthValueAdapter):
+        return _decode_prefixed_string(con)
+
+    if isinstance(con, MappingAdapter):
+        return _decode_mapping(con)
+
+    if isinstance(con, MetaArray):
+        return _decode_metaarray(con)
+
+    if isinstance(con, Switch) and not con.include_key:
+        return _decode_switch(con)
+
+    if isinstance(con, Reconfig):
+        return compile_decoder(con.subcon)
+
+    if isinstance(con, Value):
+        func = con.func
+        def decode(buf, offset, context):
+            return func(context), offset
+        return decode
+
+    return _decode_fallback(con)
+
+
+def _decode_fallback(con):
+    def decode(buf, offset, context):
+        stream = BufferStream(buf, offset)
+        try:
+            value = con._parse(stream, context)
+        except ConstructError:
+            if stream.wanted > len(buf):
+                raise Incomplete(stream.wanted)
+            raise
+        return value, stream.pos
+    return decode
+
+
+def _decode_fixed(fixed):
+    packer = struct.Struct(fixed[0] + fixed[1])
+    unpack_from = packer.unpack_from
+    size = packer.size
+    mapper = fixed[2]
+
+    def decode(buf, offset, context):
+        end = offset + size
+        if end > len(buf):
+            raise Incomplete(end)
+        value = unpack_from(buf, offset)[0]
+        if mapper:
+            value = mapper(value)
+        return value, end
+    return decode
+
+
+def _decode_metafield(con):
+    lengthfunc = con.lengthfunc
+    def decode(buf, offset, context):
+        end = offset + lengthfunc(context)
+        if end > len(buf):
+            raise Incomplete(end)
+        return _slice(buf, offset, end), end
+    return decode
+
+
+def _decode_prefixed_string(con):
+    # PascalString and AlphaString: a length field followed by that many units
+    # of data, then decoded with a codec.
+    length_field, data_field = con.subcon.subcon.subcons
+    length_name = length_field.name
+    length_unpack = struct.Struct(length_field.packer.format)
+    unpack_from = length_unpack.unpack_from
+    length_size = length_unpack.size
+    lengthfunc = data_field.lengthfunc
+    encoding = con.encoding
+
+    def decode(buf, offset, context):
+        start = offset + length_size
+        if start > len(buf):
+            raise Incomplete(start)
+        length = unpack_from(buf, offset)[0]
+        end = start + lengthfunc({length_name: length})
+        if end > len(buf):
+            raise Incomplete(end)
+        data = _slice(buf, start, end)
+        if encoding:
+            data = data.decode(encoding)
+        return data, end
+    return decode
+
+
+def _decode_mapping(con):
+    inner = compile_decoder(con.subcon)
+    mapper = _mapper(con.decoding, con.decdefault, con.subcon.name)
+    def decode(buf, offset, context):
+        value, offset = inner(buf, offset, context)
+        return mapper(value), offset
+    return decode
+
+
+def _decode_metaarray(con):
+    countfunc = con.countfunc
+    fixed = _fixed_format(con.subcon)
+
+    if fixed and not fixed[2]:
+        # An array of plain numbers can be unpacked in one go
+        fmt = fixed[0] + "%d" + fixed[1]
+        itemsize = struct.calcsize(fixed[0] + fixed[1])
+        def decode(buf, offset, context):
+            count = countfunc(context)
+            end = offset + count * itemsize
+            if end > len(buf):
+                raise Incomplete(end)
+            return ListContainer(struct.unpack_from(fmt % count, buf, offset)), end
+        return decode
+
+    inner = compile_decoder(con.subcon)
+    def decode(buf, offset, context):
+        obj = ListContainer()
+        append = obj.append
+        for i in xrange(countfunc(context)):
+            value, offset = inner(buf, offset, context)
+            append(value)
+        return obj, offset
+    return decode
+
+
+def _decode_switch(con):
+    keyfunc = con.keyfunc
+    cases = dict((k, compile_decoder(v)) for k, v in con.cases.iteritems())
+    default = compile_decoder(con.default)
+    def decode(buf, offset, context):
+        return cases.get(keyfunc(context), default)(buf, offset, context)
+    return decode
+
+
+def _decode_struct(con):
+    steps = list(_struct_decode_steps(con.subcons))
+
+    def decode(buf, offset, context):
+        obj = _new_container()
+        for step in steps:
+            offset = step(buf, offset, obj)
+        return obj, offset
+    return decode
+
+
+def _struct_decode_steps(subcons):
+    """
+    Yield functions that decode part of a struct into obj, which is also the
+    context for any lambdas in the definition.
+    """
+    for kind, item in _groups(subcons):
+        if kind == "fixed":
+            yield _fixed_step(item)
+        elif item.conflags & FLAG_EMBED and isinstance(item, Switch):
+            yield _embedded_switch_step(item)
+        else:
+            yield _named_step(item.name, compile_decoder(item))
+
+
+def _fixed_step(run):
+    packer = struct.Struct(run[0][1][0] + "".join(f[1] for n, f in run))
+    unpack_from = packer.unpack_from
+    size = packer.size
+    names = [name for name, f in run]
+    mappers = [(i, f[2]) for i, (name, f) in enumerate(run) if f[2]]
+    keep = [i for i, name in enumerate(names) if name is not None]
+    simple = not mappers and len(keep) == len(names)
+
+    def step(buf, offset, obj):
+        end = offset + size
+        if end > len(buf):
+            raise Incomplete(end)
+        values = unpack_from(buf, offset)
+        if simple:
+            _dict_update(obj, zip(names, values))
+            obj.__keys_order__.extend(names)
+        else:
+            values = list(values)
+            for i, mapper in mappers:
+                values[i] = mapper(values[i])
+            for i in keep:
+                obj[names[i]] = values[i]
+        return end
+    return step
+
+
+def _named_step(name, decoder):
+    def step(buf, offset, obj):
+        value, offset = decoder(buf, offset, obj)
+        if name is not None:
+            obj[name] = value
+        return offset
+    return step
+
+
+def _embedded_switch_step(con):
+    # This is what If(..., Embed(Struct(...))) turns in to
+    keyfunc = con.keyfunc
+    cases = {}
+    for key, case in con.cases.iteritems():
+        if isinstance(case, Value):
+            cases[key] = []
+        else:
+            cases[key] = list(_struct_decode_steps([case]))
+
+    def step(buf, offset, obj):
+        for s in cases[keyfunc(obj)]:
+            offset = s(buf, offset, obj)
+        return offset
+    return step
+
+
+#
+# Skippers
+#
+# A skipper is called as skip(buf, offset, context) and returns the offset of
+# the end of the value, without building it. Fixed fields are only unpacked
+# when a later length, count or condition might depend on them.
+#
+
+custom_skippers = {}
+
+def register_skipper(con, skipper):
+    custom_skippers[id(con)] = skipper
+
+
+def compile_skipper(con):
+    if id(con) in custom_skippers:
+        return custom_skippers[id(con)]
+
+    if isinstance(con, Struct) and not isinstance(con, Sequence):
+        return _skip_struct(con)
+
+    fixed = _fixed_format(con)
+    if fixed:
+        return _skip_bytes(struct.calcsize(fixed[0] + fixed[1]))
+
+    if isinstance(con, MetaField):
+        lengthfunc = con.lengthfunc
+        def skip(buf, offset, context):
+            end = offset + lengthfunc(context)
+            if end > len(buf):
+                raise Incomplete(end)
+            return end
+        return skip
+
+    if isinstance(con, StringAdapter) and isinstance(con.subcon, LengthValueAdapter):
+        return _skip_prefixed_string(con)
+
+    if isinstance(con, MetaArray):
+        return _skip_metaarray(con)
+
+    if isinstance(con, Reconfig):
+        return compile_skipper(con.subcon)
+
+    if isinstance(con, Value):
+        return _skip_nothing
+
+    decoder = compile_decoder(con)
+    def skip(buf, offset, context):
+        return decoder(buf, offset, context)[1]
+    return skip
+
+
+def _skip_nothing(buf, offset, context):
+    return offset
+
+
+def _skip_bytes(size):
+    def skip(buf, offset, context):
+        end = offset + size
+        if end > len(buf):
+            raise Incomplete(end)
+        return end
+    return skip
+
+
+def _skip_prefixed_string(con):
+    length_field, data_field = con.subcon.subcon.subcons
+    length_name = length_field.name
+    length_unpack = struct.Struct(length_field.packer.format)
+    unpack_from = length_unpack.unpack_from
+    length_size = length_unpack.size
+    lengthfunc = data_field.lengthfunc
+
+    def skip(buf, offset, context):
+        start = offset + length_size
+        if start > len(buf):
+            raise Incomplete(start)
+        end = start + lengthfunc({length_name: unpack_from(buf, offset)[0]})
+        if end > len(buf):
+            raise Incomplete(end)
+        return end
+    return skip
+
+
+def _skip_metaarray(con):
+    countfunc = con.countfunc
+    fixed = _fixed_format(con.subcon)
+
+    if fixed:
+        itemsize = struct.calcsize(fixed[0] + fixed[1])
+        def skip(buf, offset, context):
+            end = offset + countfunc(context) * itemsize
+            if end > len(buf):
+                raise Incomplete(end)
+            return end
+        return skip
+
+    inner = compile_skipper(con.subcon)
+    def skip(buf, offset, context):
+        for i in xrange(countfunc(context)):
+            offset = inner(buf, offset, context)
+        return offset
+    return skip
+
+
+def _is_static(sc):
+    """ True if skipping sc never needs to look at the fields before it """
+    if id(sc) in custom_skippers or _fixed_format(sc):
+        return True
+    if isinstance(sc, StringAdapter) and isinstance(sc.subcon, LengthValueAdapter):
+        return True
+    if isinstance(sc, Struct) and not isinstance(sc, Sequence):
+        return True
+    return False
+
+
+def _skip_struct(con):
+    groups = list(_groups(con.subcons))
+    need_context = not all(kind == "fixed" or _is_static(item) for kind, item in groups)
+
+    if len(groups) == 1 and groups[0][0] == "fixed":
+        return _skip_bytes(struct.calcsize(groups[0][1][0][1][0] + "".join(f[1] for n, f in groups[0][1])))
+
+    steps = list(_struct_skip_steps(groups, need_context))
+    def skip(buf, offset, context):
+        obj = _new_container() if need_context else None
+        for step in steps:
+            offset = step(buf, offset, obj)
+        return offset
+    return skip
+
+
+def _struct_skip_steps(groups, need_context):
+    for kind, item in groups:
+        if kind == "fixed":
+            if need_context:
+                yield _fixed_step(item)
+            else:
+                yield _skip_bytes(struct.calcsize(item[0][1][0] + "".join(f[1] for n, f in item)))
+        elif item.conflags & FLAG_EMBED and isinstance(item, Switch):
+            yield _embedded_switch_step(item)
+        else:
+            yield compile_skipper(item)
+
+
+#
+# Encoders
+#
+
+def compile_encoder(con):
+    if id(con) in custom_encoders:
+        return custom_encoders[id(con)]
+
+    if isinstance(con, Struct) and not isinstance(con, Sequence):
+        return _encode_struct(con)
+
+    fixed = _fixed_format(con)
+    if fixed:
+        return _encode_fixed(fixed)
+
+    if isinstance(con, MetaField):
+        return _encode_raw
+
+    if isinstance(con, StringAdapter) and isinstance(con.subcon, LengthValueAdapter):
+        return _encode_prefixed_string(con)
+
+    if isinstance(con, MetaArray):
+        return _encode_metaarray(con)
+
+    if isinstance(con, Reconfig):
+        return compile_encoder(con.subcon)
+
+    return _encode_fallback(con)
+
+
+def _encode_fallback(con):
+    def encode(obj, context, out):
+        stream = StringIO()
+        con._build(obj, stream, context)
+        out.append(stream.getvalue())
+    return encode
+
+
+def _encode_raw(obj, context, out):
+    out.append(obj)
+
+
+def _encode_fixed(fixed):
+    pack = struct.Struct(fixed[0] + fixed[1]).pack
+    mapper = fixed[3]
+    def encode(obj, context, out):
+        if mapper:
+            obj = mapper(obj)
+        out.append(pack(obj))
+    return encode
+
+
+def _encode_prefixed_string(con):
+    adapter = con.subcon
+    length_field = adapter.subcon.subcons[0]
+    pack = struct.Struct(length_field.packer.format).pack
+    encoding = con.encoding
+
+    def encode(obj, context, out):
+        if encoding:
+            obj = obj.encode(encoding)
+        length, data = adapter._encode(obj, context)
+        out.append(pack(length))
+        out.append(data)
+    return encode
+
+
+def _encode_metaarray(con):
+    inner = compile_encoder(con.subcon)
+    def encode(obj, context, out):
+        for item in obj:
+            inner(item, context, out)
+    return encode
+
+
+def _encode_struct(con):
+    steps = list(_struct_encode_steps(con.subcons))
+    def encode(obj, context, out):
+        for step in steps:
+            step(obj, out)
+    return encode
+
+
+def _struct_encode_steps(subcons):
+    for kind, item in _groups(subcons):
+        if kind == "fixed":
+            yield _fixed_encode_step(item)
+        elif item.conflags & FLAG_EMBED and isinstance(item, Switch):
+            yield _embedded_switch_encode_step(item)
+        elif item.name is None:
+            yield _unnamed_encode_step(compile_encoder(item))
+        else:
+            yield _named_encode_step(item.name, compile_encoder(item))
+
+
+def _fixed_encode_step(run):
+    pack = struct.Struct(run[0][1][0] + "".join(f[1] for n, f in run)).pack
+    fields = []
+    for name, f in run:
+        if name is None:
+            # Padding
+            fields.append((None, "\x00" * struct.calcsize(f[0] + f[1])))
+        else:
+            fields.append((name, f[3]))
+
+    def step(obj, out):
+        values = []
+        for name, mapper in fields:
+            if name is None:
+                values.append(mapper)
+            elif mapper:
+                values.append(mapper(obj[name]))
+            else:
+                values.append(obj[name])
+        out.append(pack(*values))
+    return step
+
+
+def _named_encode_step(name, encoder):
+    def step(obj, out):
+        encoder(obj[name], obj, out)
+    return step
+
+
+def _unnamed_encode_step(encoder):
+    def step(obj, out):
+        encoder(None, obj, out)
+    return step
+
+
+def _embedded_switch_encode_step(con):
+    keyfunc = con.keyfunc
+    cases = {}
+    for key, case in con.cases.iteritems():
+        if isinstance(case, Value):
+            cases[key] = []
+        else:
+            cases[key] = list(_struct_encode_steps([case]))
+
+    def step(obj, out):
+        for s in cases[keyfunc(obj)]:
+            s(obj, out)
+    return step
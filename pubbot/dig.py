@@ -0,0 +1,125 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Pathfinding for a bot that is allowed to dig its way through.
+#
+# Solid blocks in the way can be moved through at the cost of breaking them,
+# counted in frames like moving is: a frame per "Digging" message (see
+# Block.digs) plus the frames the Dig action spends looking and finishing.
+# Blocks that can't be broken, liquids and unloaded columns are never moved
+# through.
+
+import math
+
+from pubbot.blocks import solid, liquid, breakable, ttl
+from pubbot.moves import MOVES
+from pubbot.vector import pack, unpack, XZ_OFFSET, Y_OFFSET
+
+
+# Frames a Dig action takes besides digging: first look, start, destroy and
+# finish
+DIG_OVERHEAD = 4
+
+# Frames to break each block id with the tool the bot would hold for it
+frames = [int(math.ceil(t * 12)) + DIG_OVERHEAD for t in ttl]
+
+_up = pack(0, 1, 0) - pack(0, 0, 0)
+
+
+class DigCosts(object):
+
+    """
+    I am the successors() and cost() of an astar.Search for a bot that digs.
+
+    A move passes through some points; the block at each point and the one
+    above it (for head room) have to be broken if they are solid.
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+        # packed position -> block id, or None if not loaded
+        self.kinds = {}
+
+        # (from, to) -> frames of digging for the move
+        self.digging = {}
+
+    def kind(self, key):
+        try:
+            return self.kinds[key]
+        except KeyError:
+            x = (key >> 38) - XZ_OFFSET
+            y = (key & 0xFFF) - Y_OFFSET
+            z = ((key >> 12) & 0x3FFFFFF) - XZ_OFFSET
+            kind = self.kinds[key] = self.world.kind_at(x, y, z)
+            return kind
+
+    def in_the_way(self, key):
+        """
+        The packed positions of the solid blocks to break to stand at key, or
+        None if there is no getting there.
+        """
+        y = (key & 0xFFF) - Y_OFFSET
+        if y < 0 or y >= 255:
+            return None
+
+        found = []
+        for block in (key, key + _up):
+            kind = self.kind(block)
+            if kind is None or liquid[kind] or not breakable[kind]:
+                return None
+            if solid[kind]:
+                found.append(block)
+        return found
+
+    def passable(self, pos):
+        """ Whether the bot could dig its way to pos """
+        return self.in_the_way(pack(pos.x, pos.y, pos.z)) is not None
+
+    def successors(self, key):
+        result = []
+        for total, delta, steps in MOVES:
+            # Points of a move share blocks (one's head room is the next
+            # one's feet), each is only broken once
+            breaks = set()
+            for point in tuple(key + step for step in steps) + (key + delta, ):
+                blocks = self.in_the_way(point)
+                if blocks is None:
+                    break
+                breaks.update(blocks)
+            else:
+                child = key + delta
+                self.digging[key, child] = sum(frames[self.kinds[block]] for block in breaks)
+                result.append((child, tuple(key + step for step in steps)))
+        return result
+
+    def cost(self, node, child, steps):
+        return 1 + len(steps) + self.digging[node, child]
+
+    def annotate(self, route):
+        """
+        Pair each point of a route with the blocks, as BlockPos, to break
+        before moving there. Blocks already broken for an earlier point
+        aren't listed again.
+        """
+        broken = set()
+        result = []
+        for pos in route:
+            breaks = []
+            for block in self.in_the_way(pack(pos.x, pos.y, pos.z)) or ():
+                if block not in broken:
+                    broken.add(block)
+                    breaks.append(unpack(block))
+            result.append((pos, breaks))
+        return result
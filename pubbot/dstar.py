@@ -0,0 +1,323 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Incremental replanning with D* Lite (Koenig and Likhachev, "D* Lite").
+#
+# The search runs backwards, from the goal towards the bot, so the costs it
+# has worked out stay good as the bot walks along the route. When blocks
+# change, only the points whose cost to the goal could have changed are
+# looked at again.
+#
+# A move is allowed when the point it ends at is (see World.successors), so
+# the cost of every move into a point depends only on that point. A changed
+# block affects the point it is in, and the point below it, whose head room
+# it is.
+
+import heapq, time
+
+from twisted.python import log
+
+from pubbot.astar import MAX_EXPANDED, usable_goals
+from pubbot.vector import pack, unpack, XZ_OFFSET, Y_OFFSET
+from pubbot.moves import MOVES
+
+
+INF = float("inf")
+
+# (packed offset, cost) of every move
+EDGES = tuple((delta, 1 + len(steps)) for total, delta, steps in MOVES)
+
+_below = pack(0, 0, 0) - pack(0, -1, 0)
+
+
+def begin(world, start, goal, stats=None):
+    """
+    Set up a DStarLite from start to goal, or return None if goal can't be
+    reached from here.
+    """
+    goals = usable_goals(world, start, [goal])
+    if not goals:
+        return None
+    start = start.floor()
+    goal = goals[0]
+    return DStarLite(world, pack(start.x, start.y, start.z), pack(goal.x, goal.y, goal.z), stats=stats)
+
+
+class DStarLite(object):
+
+    """
+    I am a route from start to goal that can be repaired as the world
+    changes, and as the bot moves along it.
+
+    Like astar.Search, I am run a slice at a time with step(), and once done
+    route holds the points to move through or None. Tell me where the bot
+    is with move() and what changed with changed(), then step() again.
+    """
+
+    CLOCK_EVERY = 32
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, world, start, goal, limit=MAX_EXPANDED, stats=None):
+        self.world = world
+        self.start = start
+        self.goal = goal
+        self.limit = limit
+
+        self.reset()
+
+        self.expanded = 0
+        self.slices = 0
+        self.elapsed = 0.0
+        self.longest = 0.0
+        self.repairs = 0
+
+        self.stats = stats
+        if stats is not None:
+            stats.searches += 1
+
+    def allowed(self, node):
+        try:
+            return self.open[node]
+        except KeyError:
+            x = (node >> 38) - XZ_OFFSET
+            y = (node & 0xFFF) - Y_OFFSET
+            z = ((node >> 12) & 0x3FFFFFF) - XZ_OFFSET
+            value = self.open[node] = self.world.allowed_at(x, y, z)
+            self.columns.setdefault((x >> 4, z >> 4), set()).add(node)
+            return value
+
+    def h(self, a, b):
+        ax, ay, az = (a >> 38), (a & 0xFFF), ((a >> 12) & 0x3FFFFFF)
+        bx, by, bz = (b >> 38), (b & 0xFFF), ((b >> 12) & 0x3FFFFFF)
+        return abs(ax - bx) + abs(ay - by) + abs(az - bz)
+
+    def key(self, node):
+        best = min(self.g.get(node, INF), self.rhs.get(node, INF))
+        return (best + self.h(self.start, node) + self.km, best)
+
+    def enqueue(self, node):
+        if self.g.get(node, INF) != self.rhs.get(node, INF):
+            key = self.queued[node] = self.key(node)
+            heapq.heappush(self.heap, (key, node))
+        else:
+            self.queued.pop(node, None)
+
+    def update(self, node):
+        """ Work out rhs for node again, from its successors """
+        if node != self.goal:
+            best = INF
+            g = self.g
+            allowed = self.allowed
+            for delta, cost in EDGES:
+                child = node + delta
+                value = g.get(child, INF)
+                if value < INF and allowed(child):
+                    best = min(best, value + cost)
+            self.rhs[node] = best
+        self.enqueue(node)
+
+    def predecessors(self, node):
+        """ Points the bot could be at that have a move ending at node """
+        allowed = self.allowed
+        return [
+            node - delta for delta, cost in EDGES
+            if node - delta == self.start or allowed(node - delta)
+            ]
+
+    def top(self):
+        heap, queued = self.heap, self.queued
+        while heap:
+            key, node = heap[0]
+            if queued.get(node) == key:
+                return key
+            heapq.heappop(heap)
+        return (INF, INF)
+
+    def step(self, nodes=None, seconds=None):
+        """
+        Bring the route up to date, expanding up to nodes points or for up
+        to seconds. Returns True once route is ready.
+        """
+        if self.done:
+            return True
+
+        clock = self.clock
+        started = clock()
+        deadline = started + seconds if seconds is not None else None
+        before = self.expanded
+        stop = before + nodes if nodes is not None else None
+
+        g, rhs = self.g, self.rhs
+        start = self.start
+
+        try:
+            while True:
+                top = self.top()
+                if not (top < self.key(start) or rhs.get(start, INF) != g.get(start, INF)):
+                    break
+                if top[0] == INF:
+                    break
+
+                key, node = heapq.heappop(self.heap)
+                fresh = self.key(node)
+                if key < fresh:
+                    self.queued[node] = fresh
+                    heapq.heappush(self.heap, (fresh, node))
+                    continue
+                del self.queued[node]
+
+                self.expanded += 1
+                self.working += 1
+                if self.working > self.limit:
+                    log.msg("Gave up after expanding %d points" % self.limit)
+                    self.finish(None)
+                    return True
+
+                if g.get(node, INF) > rhs.get(node, INF):
+                    g[node] = rhs[node]
+                    for pred in self.predecessors(node):
+                        self.update(pred)
+                else:
+                    g[node] = INF
+                    self.update(node)
+                    for pred in self.predecessors(node):
+                        self.update(pred)
+
+                if stop is not None and self.expanded >= stop:
+                    return False
+                if deadline is not None and self.expanded % self.CLOCK_EVERY == 0 and clock() >= deadline:
+                    return False
+
+            self.finish(self.extract())
+            return True
+
+        finally:
+            spent = clock() - started
+            self.slices += 1
+            self.elapsed += spent
+            self.longest = max(self.longest, spent)
+            if self.stats is not None:
+                self.stats.record(self, self.expanded - before, spent)
+
+    def extract(self):
+        """ Follow the cheapest moves from start to goal """
+        g = self.g
+        if g.get(self.start, INF) == INF and self.start != self.goal:
+            return None
+
+        route = []
+        node = self.start
+        while node != self.goal:
+            best, best_move = INF, None
+            for total, delta, steps in MOVES:
+                child = node + delta
+                value = g.get(child, INF) + 1 + len(steps)
+                if value < best and self.allowed(child):
+                    best, best_move = value, (child, steps)
+            if best_move is None or len(route) > self.limit:
+                return None
+            child, steps = best_move
+            route.extend(unpack(node + step) for step in steps)
+            route.append(unpack(child))
+            node = child
+        return route
+
+    def finish(self, route):
+        self.route = route
+        self.done = True
+        self.working = 0
+
+    def move(self, pos):
+        """ The bot is now at pos, which should be a point on the route """
+        node = pack(pos.x, pos.y, pos.z)
+        if node == self.start:
+            return
+        self.km += self.h(self.last, node)
+        self.last = self.start = node
+        self.done = False
+
+    def changed(self, positions):
+        """
+        Blocks at positions, a list of (x, y, z), have changed. Returns True
+        if that could matter to the route.
+        """
+        touched = False
+        for x, y, z in positions:
+            block = pack(x, y, z)
+            for node in (block, block - _below):
+                if self.recheck(node):
+                    touched = True
+        return self.note_repair(touched)
+
+    def column_changed(self, cx, cz, positions):
+        """
+        Like changed(), with a World watcher's arguments. When the whole
+        column changed, only the points in it that have been looked at are
+        checked again.
+        """
+        if positions is not None:
+            return self.changed(positions)
+
+        touched = False
+        for node in list(self.columns.get((cx, cz), ())):
+            if self.recheck(node):
+                touched = True
+        return self.note_repair(touched)
+
+    def recheck(self, node):
+        """ Ask the world about node again. Returns True if it changed. """
+        was = self.open.pop(node, None)
+        if was is None:
+            # Never looked at, so nothing depends on it
+            return False
+        if was == self.allowed(node):
+            return False
+        self.update(node)
+        for delta, cost in EDGES:
+            pred = node - delta
+            if pred in self.g or pred in self.rhs:
+                self.update(pred)
+        return True
+
+    def note_repair(self, touched):
+        if touched:
+            self.repairs += 1
+            self.done = False
+        return touched
+
+    def reset(self):
+        """ Forget everything, as if starting from scratch at self.start """
+        # Whether each point can be stood in, as far as the world said when
+        # it was first asked
+        self.open = {}
+
+        # (cx, cz) -> the points of self.open in that column
+        self.columns = {}
+
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.km = 0
+        self.last = self.start
+
+        # The heap can hold stale entries, queued has the real key
+        self.queued = {}
+        self.heap = []
+        self.enqueue(self.goal)
+
+        # Expansions since the route was last ready, for the limit
+        self.working = 0
+
+        self.done = False
+        self.route = None
@@ -83,6 +83,12 @@ class Entities(object):
         self.on_entity_orientation(eid, yaw, pitch)
         self.on_entity_position(eid, x, y, z)
 
+    def on_entity_destroy(self, eids):
+        for eid in eids:
+            e = self.entities.pop(eid, None)
+            if e is not None and self.names.get(e.username) is e:
+                del self.names[e.username]
+
     def on_entity_teleport(self, eid, x, y, z, yaw, pitch):
         if not eid in self.entities:
             return
@@ -0,0 +1,238 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Following something that moves.
+#
+# Rather than search from each follower to the target every time it moves, a
+# Dijkstra search is run once outwards from the target, over the same moves
+# as the pathfinder, to every point within RADIUS moves of it. Each point
+# remembers the move that takes it closer, so any number of followers can
+# look up their next move directly. Moves cost 1 to 3, so the search keeps a
+# list of points for each distance rather than a heap.
+#
+# Small movements of the target don't change the field at all: it is only
+# rebuilt once the target is more than SLACK blocks from where it was rooted,
+# or a block change opens or closes a point it went through. That is a new
+# search from scratch, not a repair of the old field: moving the root changes
+# the distance of nearly every point. What is kept is whether each point can
+# be stood in, for the points still within reach of the new root. Rebuilding
+# is run a slice at a time, and followers carry on down the old field until
+# the new one is ready.
+
+import time
+
+from pubbot.moves import MOVES
+from pubbot.vector import pack, unpack, XZ_OFFSET, Y_OFFSET
+
+
+# How far, in moves as costed by the pathfinder, the field reaches
+RADIUS = 24
+
+# Blocks the target can move before the field is rebuilt around it
+SLACK = 3
+
+# (index in MOVES, packed offset, cost) of every move
+_EDGES = tuple((i, delta, 1 + len(steps)) for i, (total, delta, steps) in enumerate(MOVES))
+
+
+class FlowField(object):
+
+    """
+    I am the way to a target from every point near it.
+
+    Tell me where the target is with move(), give me time to build with
+    step(), and ask next() for the points a follower should move through.
+    """
+
+    CLOCK_EVERY = 32
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, world, pos, radius=RADIUS, slack=SLACK):
+        self.world = world
+        self.radius = radius
+        self.slack = slack
+
+        # Whether each point can be stood in, kept between builds
+        self.open = {}
+
+        # (cx, cz) -> the points of self.open in that column
+        self.columns = {}
+
+        # The field followers use: packed point -> (distance, index of the
+        # move in MOVES that gets closer). The root has no move.
+        self.field = {}
+        self.root = None
+        self.target = None
+
+        # A build in progress, as (root, field, points to visit at each
+        # distance, the distance up to)
+        self.building = None
+
+        # A block the field depends on has changed
+        self.stale = False
+
+        # How many followers are using me, see World.release_field
+        self.users = 0
+
+        self.builds = 0
+        self.expanded = 0
+
+        self.move(pos)
+
+    @property
+    def ready(self):
+        return self.root is not None
+
+    def allowed(self, node):
+        try:
+            return self.open[node]
+        except KeyError:
+            x = (node >> 38) - XZ_OFFSET
+            y = (node & 0xFFF) - Y_OFFSET
+            z = ((node >> 12) & 0x3FFFFFF) - XZ_OFFSET
+            value = self.open[node] = self.world.allowed_at(x, y, z)
+            self.columns.setdefault((x >> 4, z >> 4), set()).add(node)
+            return value
+
+    def move(self, pos):
+        """
+        The target is now at pos. Returns True if that starts a new build.
+        """
+        pos = pos.floor()
+        if self.target is not None and not self.stale:
+            if (pos - self.target).manhattan_length() <= self.slack:
+                return False
+
+        self.target = pos
+        self.stale = False
+        self.prune(pos)
+        root = pack(pos.x, pos.y, pos.z)
+        self.building = (root, {}, [[(root, None)]], 0)
+        self.builds += 1
+        return True
+
+    def prune(self, pos):
+        """ Forget the points looked up that a field around pos can't reach """
+        radius = self.radius
+        open, columns = self.open, self.columns
+        for key in columns.keys():
+            # The nearest the column comes to pos
+            bx, bz = key[0] * 16, key[1] * 16
+            near = max(bx - pos.x, pos.x - bx - 15, 0) + max(bz - pos.z, pos.z - bz - 15, 0)
+            if near > radius:
+                for node in columns.pop(key):
+                    del open[node]
+                continue
+
+            nodes = columns[key]
+            for node in [n for n in nodes if
+                    abs((n >> 38) - XZ_OFFSET - pos.x) +
+                    abs((n & 0xFFF) - Y_OFFSET - pos.y) +
+                    abs(((n >> 12) & 0x3FFFFFF) - XZ_OFFSET - pos.z) > radius]:
+                nodes.discard(node)
+                del open[node]
+            if not nodes:
+                del columns[key]
+
+    def step(self, nodes=None, seconds=None):
+        """
+        Carry on building, expanding up to nodes points or for up to seconds.
+        Returns True once the field is up to date.
+        """
+        if self.building is None:
+            return True
+
+        root, field, buckets, distance = self.building
+        radius = self.radius
+        allowed = self.allowed
+
+        clock = self.clock
+        deadline = clock() + seconds if seconds is not None else None
+        expanded = 0
+
+        try:
+            while distance < len(buckets):
+                bucket = buckets[distance]
+                while bucket:
+                    node, towards = bucket.pop()
+                    if node in field:
+                        continue
+                    field[node] = (distance, towards)
+
+                    expanded += 1
+
+                    # Points a move into node can be made from
+                    for index, delta, cost in _EDGES:
+                        pred = node - delta
+                        if pred in field or distance + cost > radius:
+                            continue
+                        if not allowed(pred):
+                            continue
+                        while len(buckets) <= distance + cost:
+                            buckets.append([])
+                        buckets[distance + cost].append((pred, index))
+
+                    if nodes is not None and expanded >= nodes:
+                        return False
+                    if deadline is not None and expanded % self.CLOCK_EVERY == 0 and clock() >= deadline:
+                        return False
+                distance += 1
+        finally:
+            self.expanded += expanded
+            if self.building is not None:
+                self.building = (root, field, buckets, distance)
+
+        self.root, self.field = root, field
+        self.building = None
+        return True
+
+    def distance(self, pos):
+        """ Moves from pos to the target, or None if pos isn't in the field """
+        pos = pos.floor()
+        entry = self.field.get(pack(pos.x, pos.y, pos.z))
+        if entry is None:
+            return None
+        return entry[0]
+
+    def next(self, pos):
+        """
+        The points to move through to get one move closer to the target from
+        pos. Empty at the root, None if pos isn't in the field.
+        """
+        pos = pos.floor()
+        node = pack(pos.x, pos.y, pos.z)
+        entry = self.field.get(node)
+        if entry is None:
+            return None
+        index = entry[1]
+        if index is None:
+            return []
+        total, delta, steps = MOVES[index]
+        return [unpack(node + step) for step in steps] + [unpack(node + delta)]
+
+    def column_changed(self, cx, cz, positions):
+        if positions is None:
+            # Forget everything looked up in the column
+            for node in self.columns.pop((cx, cz), ()):
+                del self.open[node]
+                self.stale = True
+            return
+
+        # A block is the head room of the one below it
+        for x, y, z in positions:
+            for node in (pack(x, y, z), pack(x, y - 1, z)):
+                was = self.open.pop(node, None)
+                if was is not None and was != self.allowed(node):
+                    self.stale = True
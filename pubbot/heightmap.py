@@ -0,0 +1,145 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Where the ground is.
+#
+# For each x, z of every loaded column we keep the height of the highest
+# solid block, the highest block that isn't air and the highest liquid, or -1
+# if there are none. They are worked out when a column's sections are stored,
+# top down, a layer of 256 blocks at a time, skipping sections without any
+# blocks of interest. A block change only has to look further down when it
+# removes the highest block of its kind.
+
+from array import array
+
+from pubbot.blocks import solid, liquid
+from pubbot.chunk import SECTION_COUNT
+
+
+# Tables for str.translate, turning block ids into "\x01" for the blocks each
+# height is of and "\x00" for the rest
+_SOLID = "".join("\x01" if solid[k] else "\x00" for k in range(256))
+_NON_AIR = "\x00" + "\x01" * 255
+_LIQUID = "".join("\x01" if liquid[k] else "\x00" for k in range(256))
+
+_NONE = array("h", [-1]) * 256
+
+
+class Heightmap(object):
+
+    """
+    I am the highest solid, non-air and liquid block of each x, z of a
+    column, indexed z * 16 + x.
+    """
+
+    __slots__ = ("solid", "non_air", "liquid")
+
+    def __init__(self, sections):
+        self.solid = highest(sections, _SOLID)
+        self.non_air = highest(sections, _NON_AIR)
+        self.liquid = highest(sections, _LIQUID)
+
+    def patch(self, c, x, y, z):
+        """ The block at x, y, z, relative to column c, has changed """
+        kind = c.get_relative(x, y, z)[0]
+        i = (z << 4) | x
+        for heights, table in ((self.solid, _SOLID), (self.non_air, _NON_AIR), (self.liquid, _LIQUID)):
+            if table[kind] == "\x01":
+                if y > heights[i]:
+                    heights[i] = y
+            elif y == heights[i]:
+                # The highest is gone, look for the next one down
+                below = y - 1
+                while below >= 0 and table[c.get_relative(x, below, z)[0]] != "\x01":
+                    below -= 1
+                heights[i] = below
+
+
+def highest(sections, table):
+    """
+    The height of the highest block of each x, z that table marks, or -1,
+    as an array indexed z * 16 + x.
+    """
+    heights = _NONE[:]
+    left = 256
+    for sy in xrange(SECTION_COUNT - 1, -1, -1):
+        section = sections[sy]
+        if section is None:
+            continue
+        marks = str(section.blocks).translate(table)
+        if "\x01" not in marks:
+            continue
+        for ly in xrange(15, -1, -1):
+            layer = marks[ly << 8:(ly + 1) << 8]
+            i = layer.find("\x01")
+            while i != -1:
+                if heights[i] == -1:
+                    heights[i] = (sy << 4) | ly
+                    left -= 1
+                i = layer.find("\x01", i + 1)
+            if not left:
+                return heights
+    return heights
+
+
+class Heightmaps(object):
+
+    """
+    I keep a Heightmap for every column a World has loaded.
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+        # (cx, cz) -> Heightmap
+        self.columns = {}
+
+        self.built = 0
+        self.patched = 0
+
+    def column_changed(self, cx, cz, positions):
+        key = (cx, cz)
+        if positions is None:
+            c = self.world.chunks.get((cx, 0, cz))
+            if c is None:
+                # Unloaded. If it comes back from the cache it is built again.
+                self.columns.pop(key, None)
+            else:
+                self.columns[key] = Heightmap(c.sections)
+                self.built += 1
+            return
+
+        heightmap = self.columns.get(key)
+        if heightmap is None:
+            return
+        c = self.world.chunks.get((cx, 0, cz))
+        if c is None:
+            c = self.world.load_cached((cx, 0, cz))
+        for x, y, z in positions:
+            heightmap.patch(c, x & 15, y, z & 15)
+            self.patched += 1
+
+    def get(self, cx, cz):
+        """ The Heightmap of a column, or None if it isn't loaded """
+        try:
+            return self.columns[(cx, cz)]
+        except KeyError:
+            c = self.world.chunks.get((cx, 0, cz))
+            if c is None:
+                c = self.world.load_cached((cx, 0, cz))
+                if c is None:
+                    return None
+            heightmap = self.columns[(cx, cz)] = Heightmap(c.sections)
+            self.built += 1
+            return heightmap
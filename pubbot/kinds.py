@@ -0,0 +1,197 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Where each kind of block is, so finding gold doesn't mean looking at every
+# block the bot knows about.
+#
+# Every section has a histogram of the kinds in it, and each kind has the set
+# of sections holding any. Sections are only ever looked at for a kind they
+# hold. The blocks of interesting kinds (see blocks.INTERESTING) are listed
+# too; other kinds are found by scanning the section's block ids for them.
+#
+# Sections a change touched are indexed again before the next query, so a
+# burst of changes to one section costs one pass over it.
+
+from math import sqrt
+
+from pubbot.blocks import INTERESTING
+from pubbot.chunk import SECTION_COUNT
+from pubbot.vector import BlockPos
+
+
+class KindIndex(object):
+
+    """
+    I know which sections of a World hold which kinds of block.
+
+    Air in sections the server never sent isn't counted.
+    """
+
+    def __init__(self, world, interesting=INTERESTING):
+        self.world = world
+        self.interesting = frozenset(interesting)
+
+        # (cx, sy, cz) -> {kind: count}
+        self.histograms = {}
+
+        # (cx, sy, cz) -> {kind: [index within the section]}, for the
+        # interesting kinds in it
+        self.positions = {}
+
+        # kind -> set of (cx, sy, cz) holding any
+        self.holding = {}
+
+        # Sections to index again before the next query
+        self.dirty = set()
+
+        self.indexed = 0
+        self.scanned = 0
+
+    def column_changed(self, cx, cz, positions):
+        if positions is None:
+            self.dirty.update((cx, sy, cz) for sy in xrange(SECTION_COUNT))
+        else:
+            self.dirty.update((cx, y >> 4, cz) for x, y, z in positions)
+
+    def refresh(self):
+        """ Index the sections that have changed """
+        dirty, self.dirty = self.dirty, set()
+        for key in dirty:
+            self.forget(key)
+
+            cx, sy, cz = key
+            c = self.world.chunks.get((cx, 0, cz))
+            if c is None:
+                c = self.world.load_cached((cx, 0, cz))
+            if c is None or c.sections[sy] is None:
+                continue
+            self.index(key, c.sections[sy].blocks)
+
+    def forget(self, key):
+        histogram = self.histograms.pop(key, None)
+        if histogram is None:
+            return
+        for kind in histogram:
+            holding = self.holding[kind]
+            holding.discard(key)
+            if not holding:
+                del self.holding[kind]
+        self.positions.pop(key, None)
+
+    def index(self, key, blocks):
+        data = str(blocks)
+        histogram = {}
+        found = {}
+        for char in set(data):
+            kind = ord(char)
+            histogram[kind] = data.count(char)
+            self.holding.setdefault(kind, set()).add(key)
+            if kind in self.interesting:
+                found[kind] = find_all(data, char)
+
+        self.histograms[key] = histogram
+        if found:
+            self.positions[key] = found
+        self.indexed += 1
+
+    def section_positions(self, key, kind):
+        """ The BlockPos of every block of kind in a section """
+        indexes = self.positions.get(key, {}).get(kind)
+        if indexes is None:
+            cx, sy, cz = key
+            c = self.world.chunks.get((cx, 0, cz))
+            if c is None:
+                c = self.world.load_cached((cx, 0, cz))
+            indexes = find_all(str(c.sections[sy].blocks), chr(kind))
+            self.scanned += 1
+
+        bx, by, bz = key[0] * 16, key[1] * 16, key[2] * 16
+        return [BlockPos(bx + (i & 15), by + (i >> 8), bz + ((i >> 4) & 15)) for i in indexes]
+
+    def find_nearest(self, kind, origin, radius=None):
+        """
+        The BlockPos of the block of kind nearest to origin, measured to the
+        middle of the block, or None if there isn't one within radius.
+        """
+        self.refresh()
+
+        ox, oy, oz = origin.x, origin.y, origin.z
+        candidates = []
+        for key in self.holding.get(kind, ()):
+            distance = section_distance(key, ox, oy, oz)
+            if radius is None or distance <= radius:
+                candidates.append((distance, key))
+        candidates.sort()
+
+        best = radius if radius is not None else float("inf")
+        best_pos = None
+        for distance, key in candidates:
+            if distance > best:
+                break
+            for pos in self.section_positions(key, kind):
+                dx, dy, dz = pos[0] + 0.5 - ox, pos[1] + 0.5 - oy, pos[2] + 0.5 - oz
+                d = sqrt(dx * dx + dy * dy + dz * dz)
+                if d <= best:
+                    best, best_pos = d, pos
+        return best_pos
+
+    def count(self, kind, box):
+        """
+        How many blocks of kind are in box, a pair of opposite corners
+        (included).
+        """
+        self.refresh()
+
+        (x1, y1, z1), (x2, y2, z2) = box
+        low = (min(x1, x2), min(y1, y2), min(z1, z2))
+        high = (max(x1, x2), max(y1, y2), max(z1, z2))
+
+        total = 0
+        for key in self.holding.get(kind, ()):
+            inside = True
+            for axis in (0, 1, 2):
+                first = key[axis] * 16
+                if first + 15 < low[axis] or first > high[axis]:
+                    break
+                if first < low[axis] or first + 15 > high[axis]:
+                    inside = False
+            else:
+                if inside:
+                    total += self.histograms[key][kind]
+                    continue
+                for pos in self.section_positions(key, kind):
+                    if low[0] <= pos[0] <= high[0] and low[1] <= pos[1] <= high[1] and low[2] <= pos[2] <= high[2]:
+                        total += 1
+        return total
+
+
+def find_all(data, char):
+    """ Every index of char in the string data """
+    found = []
+    i = data.find(char)
+    while i != -1:
+        found.append(i)
+        i = data.find(char, i + 1)
+    return found
+
+
+def section_distance(key, x, y, z):
+    """ How far x, y, z is from the nearest point of a section """
+    distance = 0.0
+    for value, first in ((x, key[0] * 16), (y, key[1] * 16), (z, key[2] * 16)):
+        if value < first:
+            distance += (first - value) ** 2
+        elif value > first + 16:
+            distance += (value - first - 16) ** 2
+    return sqrt(distance)
@@ -0,0 +1,55 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The moves the pathfinders may make from one block to the next. A move is
+# one or two steps, and is allowed when the block it ends in can be stood
+# in (see World.allowed_at).
+
+from pubbot.vector import BlockPos, pack
+
+
+NORTH = BlockPos(-1, 0, 0)
+EAST = BlockPos(0, 0, -1)
+SOUTH = BlockPos(1, 0, 0)
+WEST = BlockPos(0, 0, 1)
+UP = BlockPos(0, 1, 0)
+DOWN = BlockPos(0, -1, 0)
+
+# The moves a bot can make, as the steps it takes
+TRANSFORMS = (
+    (NORTH,), (EAST,), (SOUTH,), (WEST,), #(DOWN,), (UP,),
+    (NORTH,DOWN), (EAST,DOWN), (SOUTH,DOWN), (WEST,DOWN),
+    (UP, NORTH), (UP, EAST), (UP, SOUTH), (UP, WEST),
+    )
+
+def _packed_offset(v):
+    return pack(v.x, v.y, v.z) - pack(0, 0, 0)
+
+def _moves():
+    """
+    Precompute each move as (total offset, packed total offset, packed offsets
+    of the points passed through on the way). Adding a packed offset to a
+    packed position moves it, as long as nothing wraps.
+    """
+    moves = []
+    for transform in TRANSFORMS:
+        points = []
+        total = BlockPos(0, 0, 0)
+        for step in transform:
+            total = total + step
+            points.append(total)
+        moves.append((total, _packed_offset(total), tuple(_packed_offset(p) for p in points[:-1])))
+    return tuple(moves)
+
+MOVES = _moves()
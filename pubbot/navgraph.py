@@ -0,0 +1,522 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Long distance route planning, in the style of HPA* (Botea et al, "Near
+# Optimal Hierarchical Path-Finding").
+#
+# Every column is a cluster. Where two loaded columns meet, each connected
+# patch of the border the bot could stand in becomes an entrance: a pair of
+# nodes, one either side. Nodes in the same column are joined by the length
+# of the local A* route between them. Routes are planned over those nodes,
+# and only the stretch up to the next waypoint is ever searched block by
+# block.
+#
+# Linking a column is a local search per pair of its entrances, so a Plan
+# links columns as it reaches them and runs those searches a slice at a
+# time, like astar.Search. A block change only costs anything when it is on
+# a border whose entrances it moves, or on a local route a column's edges
+# were worked out from.
+
+import heapq, time
+
+from pubbot import astar
+from pubbot.blocks import solid
+from pubbot.chunk import SECTION_HEIGHT, ALL_PASSABLE, ALL_SOLID
+from pubbot.astar import MAX_PATH_SIZE
+from pubbot.vector import pack, unpack, XZ_OFFSET
+
+
+# Local searches between two nodes of a column give up after this many
+# points, so a pair that can't reach each other doesn't flood the column
+LOCAL_LIMIT = 2000
+
+_up = pack(0, 1, 0) - pack(0, 0, 0)
+
+# The two borders a column owns: with the column to the east (+x), and with
+# the column to the south (+z)
+X_BORDER = 0
+Z_BORDER = 1
+
+
+def column_of(key):
+    """ The column a packed position is in """
+    return ((key >> 38) - XZ_OFFSET) >> 4, (((key >> 12) & 0x3FFFFFF) - XZ_OFFSET) >> 4
+
+
+def column_successors(world, cx, cz):
+    """ world.successors, without ever leaving column cx, cz """
+    successors = world.successors
+    def inside(key):
+        return column_of(key) == (cx, cz)
+    def f(key):
+        return [
+            (child, steps) for child, steps in successors(key)
+            if inside(child) and all(inside(step) for step in steps)
+            ]
+    return f
+
+
+def solid_line(c, x, z):
+    """
+    Whether each block up column x, z of chunk c is solid, plus one past the
+    top of the world. Sections that are all one way aren't looked into.
+    """
+    line = []
+    for section in c.sections:
+        summary = section.summary() if section is not None else ALL_PASSABLE
+        if summary:
+            line.extend([summary == ALL_SOLID] * SECTION_HEIGHT)
+        else:
+            blocks = section.blocks
+            index = (z << 4) | x
+            line.extend([solid[blocks[index + (y << 8)]] for y in xrange(SECTION_HEIGHT)])
+    line.append(False)
+    return line
+
+
+def manhattan(a, b):
+    ax, ay, az = unpack(a)
+    bx, by, bz = unpack(b)
+    return abs(ax - bx) + abs(ay - by) + abs(az - bz)
+
+
+class ChunkGraph(object):
+
+    """
+    I am the abstract graph of entrances between the loaded columns of a
+    World.
+
+    Nothing is worked out until a plan needs it. I watch the World for
+    changes, and forget the borders and edges that depended on a column
+    when it changes.
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+        # (cx, cz, X_BORDER or Z_BORDER) -> [(node in cx, cz, node across)]
+        self.borders = {}
+
+        # (cx, cz) -> {node: [(node, cost)]}, including the step across each
+        # entrance
+        self.edges = {}
+
+        # (cx, cz) -> set of the points on the local routes behind its edges
+        self.routes = {}
+
+        # (cx, cz) -> how many times its edges have been forgotten, so a
+        # column linked over several slices isn't kept if it changed meanwhile
+        self.versions = {}
+
+        self.scanned = 0
+        self.linked = 0
+        self.planned = 0
+
+    def forget_edges(self, cx, cz):
+        key = (cx, cz)
+        self.edges.pop(key, None)
+        self.routes.pop(key, None)
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def invalidate(self, cx, cz):
+        """ Column cx, cz has changed or gone """
+        for key in ((cx, cz, X_BORDER), (cx, cz, Z_BORDER), (cx - 1, cz, X_BORDER), (cx, cz - 1, Z_BORDER)):
+            self.borders.pop(key, None)
+        for key in ((cx, cz), (cx - 1, cz), (cx + 1, cz), (cx, cz - 1), (cx, cz + 1)):
+            self.forget_edges(*key)
+
+    def column_changed(self, cx, cz, positions):
+        if positions is None:
+            self.invalidate(cx, cz)
+            return
+
+        sides = set()
+        used = self.routes.get((cx, cz), ())
+        for x, y, z in positions:
+            x, z = x & 15, z & 15
+            if x == 15:
+                sides.add((cx, cz, X_BORDER))
+            elif x == 0:
+                sides.add((cx - 1, cz, X_BORDER))
+            if z == 15:
+                sides.add((cx, cz, Z_BORDER))
+            elif z == 0:
+                sides.add((cx, cz - 1, Z_BORDER))
+
+            # A block is the head room of the one below it
+            key = pack(cx * 16 + x, y, cz * 16 + z)
+            if key in used or key - _up in used:
+                self.forget_edges(cx, cz)
+                used = ()
+
+        for side in sides:
+            old = self.borders.pop(side, None)
+            if old is None or self.border(*side) == old:
+                continue
+            bx, bz, axis = side
+            self.forget_edges(bx, bz)
+            if axis == X_BORDER:
+                self.forget_edges(bx + 1, bz)
+            else:
+                self.forget_edges(bx, bz + 1)
+
+    def chunk(self, cx, cz):
+        key = (cx, 0, cz)
+        c = self.world.chunks.get(key)
+        if c is None:
+            c = self.world.load_cached(key)
+        return c
+
+    def border(self, cx, cz, axis):
+        """
+        The entrances between column cx, cz and its neighbour to the east
+        (X_BORDER) or south (Z_BORDER).
+        """
+        key = (cx, cz, axis)
+        try:
+            return self.borders[key]
+        except KeyError:
+            pass
+
+        if axis == X_BORDER:
+            ox, oz = cx + 1, cz
+        else:
+            ox, oz = cx, cz + 1
+
+        near = self.chunk(cx, cz)
+        far = self.chunk(ox, oz)
+        if near is None or far is None:
+            # Not cached, there will be a border once the neighbour arrives
+            return []
+
+        # Which blocks along the border could be stood in, on both sides, as
+        # runs of y. Index i runs along the border, as z for X_BORDER or x for
+        # Z_BORDER.
+        if axis == X_BORDER:
+            lines = [(solid_line(near, 15, i), solid_line(far, 0, i)) for i in xrange(16)]
+        else:
+            lines = [(solid_line(near, i, 15), solid_line(far, i, 0)) for i in xrange(16)]
+
+        runs = []
+        for i, (a, b) in enumerate(lines):
+            bottom = None
+            for y in xrange(257):
+                if y < 256 and not (a[y] or a[y + 1] or b[y] or b[y + 1]):
+                    if bottom is None:
+                        bottom = y
+                elif bottom is not None:
+                    runs.append((i, bottom, y))
+                    bottom = None
+
+        # Runs in neighbouring lines that overlap are part of the same patch
+        patch = range(len(runs))
+        def find(r):
+            while patch[r] != r:
+                patch[r] = patch[patch[r]]
+                r = patch[r]
+            return r
+        for r, (i, bottom, top) in enumerate(runs):
+            for s, (j, other_bottom, other_top) in enumerate(runs[:r]):
+                if j == i - 1 and bottom < other_top and other_bottom < top:
+                    patch[find(r)] = find(s)
+
+        # Cross each patch where there is ground to stand on, as low and as
+        # near the middle of the border as possible. Something solid is what
+        # ends a run, so only the bottom of the world isn't standing room.
+        best = {}
+        for r, (i, bottom, top) in enumerate(runs):
+            preference = (bottom == 0, bottom, abs(2 * i - 15))
+            p = find(r)
+            if p not in best or preference < best[p][0]:
+                best[p] = (preference, i, bottom)
+
+        entrances = []
+        for preference, i, y in sorted(best.itervalues()):
+            if axis == X_BORDER:
+                near_pos = (cx * 16 + 15, y, cz * 16 + i)
+                far_pos = (ox * 16, y, oz * 16 + i)
+            else:
+                near_pos = (cx * 16 + i, y, cz * 16 + 15)
+                far_pos = (ox * 16 + i, y, oz * 16)
+            entrances.append((pack(*near_pos), pack(*far_pos)))
+
+        self.borders[key] = entrances
+        self.scanned += 1
+        return entrances
+
+    def portals(self, cx, cz):
+        """ (node in cx, cz, node across) for every entrance of a column """
+        portals = list(self.border(cx, cz, X_BORDER))
+        portals.extend(self.border(cx, cz, Z_BORDER))
+        portals.extend((b, a) for a, b in self.border(cx - 1, cz, X_BORDER))
+        portals.extend((b, a) for a, b in self.border(cx, cz - 1, Z_BORDER))
+        return portals
+
+    def local_search(self, start, goal):
+        """ A search between two points in the same column """
+        cx, cz = column_of(start)
+        return astar.Search(
+            start, [goal],
+            column_successors(self.world, cx, cz),
+            astar.packed_heuristic([unpack(goal)]),
+            limit=LOCAL_LIMIT,
+            )
+
+    def link(self, cx, cz, edges):
+        """
+        Work out the edges of a column into edges, yielding each local search
+        for the caller to run, or None after scanning a border. They are kept
+        for next time unless the column changes meanwhile.
+        """
+        key = (cx, cz)
+        version = self.versions.get(key, 0)
+
+        for side in ((cx, cz, X_BORDER), (cx, cz, Z_BORDER), (cx - 1, cz, X_BORDER), (cx, cz - 1, Z_BORDER)):
+            if side not in self.borders:
+                self.border(*side)
+                yield None
+
+        for node, across in self.portals(cx, cz):
+            edges.setdefault(node, []).append((across, 1))
+
+        # Moves are reversible, so each pair only needs searching once
+        used = set()
+        nodes = edges.keys()
+        for i, a in enumerate(nodes):
+            for b in nodes[i + 1:]:
+                search = self.local_search(a, b)
+                yield search
+                if search.route is not None:
+                    cost = len(search.route)
+                    edges[a].append((b, cost))
+                    edges[b].append((a, cost))
+                    used.add(a)
+                    used.update(search.route)
+
+        if self.versions.get(key, 0) == version:
+            self.edges[key] = edges
+            self.routes[key] = used
+        self.linked += 1
+
+    def begin(self, start, goal):
+        """ A Plan from start to goal, to be run with step() """
+        return Plan(self, start, goal)
+
+    def plan(self, start, goal):
+        """
+        Plan a route from start to goal over the entrance graph, however long
+        it takes. See Plan.
+        """
+        plan = self.begin(start, goal)
+        plan.step()
+        return plan.route
+
+    def next_waypoint(self, start, goal, reach=MAX_PATH_SIZE):
+        """
+        Where to search to next on the way from start to goal, or None if
+        there is no plan. See Plan.waypoint.
+        """
+        plan = self.begin(start, goal)
+        plan.step()
+        return plan.waypoint(start, reach)
+
+
+class Plan(object):
+
+    """
+    I am a route over a ChunkGraph from start to goal, worked out a slice at
+    a time like astar.Search.
+
+    Columns are linked as the plan reaches them. The local searches that
+    takes are what step() gives time to, so a plan across unlinked columns
+    doesn't hold up the reactor. Once done, route holds the entrances to
+    pass through followed by goal, or None if there is no route through the
+    loaded columns.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, graph, start, goal):
+        self.graph = graph
+        self.start = start.floor()
+        self.goal = goal.floor()
+
+        # The edges of the columns this plan has reached, as they were then
+        self.linked = {}
+
+        # The local search being run, and what comes after it
+        self.search = None
+        self.work = self.run()
+
+        self.done = False
+        self.route = None
+
+        self.slices = 0
+        self.expanded = 0
+
+        graph.planned += 1
+
+    def step(self, nodes=None, seconds=None):
+        """
+        Carry on planning, running local searches for up to nodes points or
+        seconds, whichever runs out first. Returns True once the plan is
+        done.
+        """
+        if self.done:
+            return True
+
+        clock = self.clock
+        deadline = clock() + seconds if seconds is not None else None
+        self.slices += 1
+
+        while True:
+            if self.search is None:
+                try:
+                    self.search = self.work.next()
+                except StopIteration:
+                    self.done = True
+                    return True
+                if self.search is None:
+                    # A border was scanned
+                    if deadline is not None and clock() >= deadline:
+                        return False
+                    continue
+
+            left = None
+            if deadline is not None:
+                left = max(deadline - clock(), 0)
+            before = self.search.expanded
+            finished = self.search.step(nodes, left)
+            spent = self.search.expanded - before
+            self.expanded += spent
+
+            if not finished:
+                return False
+            self.search = None
+
+            if nodes is not None:
+                nodes -= spent
+                if nodes <= 0:
+                    return False
+            if deadline is not None and clock() >= deadline:
+                return False
+
+    def link(self, cx, cz):
+        """ Get the edges of a column into self.linked, yielding as ChunkGraph.link """
+        key = (cx, cz)
+        if key in self.linked:
+            return
+        edges = self.graph.edges.get(key)
+        if edges is None:
+            edges = {}
+            for search in self.graph.link(cx, cz, edges):
+                yield search
+        self.linked[key] = edges
+
+    def run(self):
+        graph = self.graph
+        start, goal = self.start, self.goal
+        start_key = pack(start.x, start.y, start.z)
+        goal_key = pack(goal.x, goal.y, goal.z)
+
+        start_column = column_of(start_key)
+        goal_column = column_of(goal_key)
+
+        if start_column == goal_column:
+            search = graph.local_search(start_key, goal_key)
+            yield search
+            if search.route is not None:
+                self.route = [goal]
+                return
+
+        # Temporary edges out of start and into goal
+        for search in self.link(*start_column):
+            yield search
+        start_edges = []
+        for node in self.linked[start_column]:
+            search = graph.local_search(start_key, node)
+            yield search
+            if search.route is not None:
+                start_edges.append((node, len(search.route)))
+
+        for search in self.link(*goal_column):
+            yield search
+        goal_edges = {}
+        for node in self.linked[goal_column]:
+            search = graph.local_search(node, goal_key)
+            yield search
+            if search.route is not None:
+                goal_edges[node] = len(search.route)
+
+        if not start_edges or not goal_edges:
+            return
+
+        g_score = {start_key: 0}
+        came_from = {start_key: None}
+        closed = set()
+        heap = [(manhattan(start_key, goal_key) * 101, start_key)]
+
+        while heap:
+            f, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            closed.add(node)
+
+            if node == goal_key:
+                route = []
+                while node != start_key:
+                    route.append(unpack(node))
+                    node = came_from[node]
+                route.reverse()
+                self.route = route
+                return
+
+            if node == start_key:
+                edges = start_edges
+            else:
+                column = column_of(node)
+                for search in self.link(*column):
+                    yield search
+                edges = self.linked[column].get(node, [])
+                if node in goal_edges:
+                    edges = edges + [(goal_key, goal_edges[node])]
+
+            g = g_score[node]
+            for child, cost in edges:
+                if child in closed:
+                    continue
+                score = g + cost
+                if score >= g_score.get(child, score + 1):
+                    continue
+                g_score[child] = score
+                came_from[child] = node
+                # Weighted like astar.search, to settle ties towards the goal
+                heapq.heappush(heap, (manhattan(child, goal_key) * 101 + score * 100, child))
+
+    def waypoint(self, start, reach=MAX_PATH_SIZE):
+        """
+        Where to search to next from start: the furthest waypoint of the
+        route within reach of start, or None if there is no route.
+        """
+        route = self.route
+        if not route:
+            return None
+
+        start = start.floor()
+        waypoint = route[0]
+        for pos in route[1:]:
+            if (pos - start).manhattan_length() > reach:
+                break
+            waypoint = pos
+        return waypoint
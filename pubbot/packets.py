@@ -1,14 +1,16 @@
+import struct
 from collections import namedtuple
 
 from construct import Struct, Container, Embed, Enum, MetaField
 from construct import MetaArray, If, Switch, Const, Peek
-from construct import OptionalGreedyRange, RepeatUntil
+from construct import RepeatUntil
 from construct import Flag, PascalString, Adapter, Padding
 from construct import UBInt8, UBInt16, UBInt32, UBInt64
 from construct import SBInt8, SBInt16, SBInt32, SBInt64
 from construct import BFloat32, BFloat64
 from construct import BitStruct, BitField
 from construct import StringAdapter, LengthValueAdapter, Sequence
+from construct import ConstructError, SwitchError
 
 DUMP_ALL_PACKETS = False
 
@@ -19,6 +21,9 @@ from pubbot.encodings import ucs2
 from codecs import register
 register(ucs2)
 
+from pubbot import compiler
+from pubbot.compiler import compile_decoder, compile_encoder, compile_skipper, Incomplete
+
 class DoubleAdapter(LengthValueAdapter):
 
     def _encode(self, obj, context):
@@ -125,6 +130,88 @@ metadata = MetadataAdapter(
     ),
 )
 
+# The compiled metadata codec. RepeatUntil plus Peek is about the slowest
+# thing construct can do, and entity metadata turns up constantly.
+_ubyte = struct.Struct(">B")
+_metadata_numbers = {
+    0: struct.Struct(">B"),
+    1: struct.Struct(">H"),
+    2: struct.Struct(">I"),
+    3: struct.Struct(">f"),
+}
+_metadata_slot = struct.Struct(">HBH")
+_metadata_coords = struct.Struct(">III")
+_metadata_string = compile_decoder(metadata_switch[4])
+
+def decode_metadata(buf, offset, context):
+    d = {}
+    size = len(buf)
+    while True:
+        if offset >= size:
+            raise Incomplete(offset + 1)
+        key = _ubyte.unpack_from(buf, offset)[0]
+        first, second = key >> 5, key & 0x1F
+        offset += 1
+
+        if first in _metadata_numbers:
+            packer = _metadata_numbers[first]
+            if offset + packer.size > size:
+                raise Incomplete(offset + packer.size)
+            value = packer.unpack_from(buf, offset)[0]
+            offset += packer.size
+        elif first == 4:
+            value, offset = _metadata_string(buf, offset, context)
+        elif first == 5:
+            if offset + _metadata_slot.size > size:
+                raise Incomplete(offset + _metadata_slot.size)
+            primary, count, secondary = _metadata_slot.unpack_from(buf, offset)
+            value = Container(primary=primary, count=count, secondary=secondary)
+            offset += _metadata_slot.size
+        elif first == 6:
+            if offset + _metadata_coords.size > size:
+                raise Incomplete(offset + _metadata_coords.size)
+            x, y, z = _metadata_coords.unpack_from(buf, offset)
+            value = Container(x=x, y=y, z=z)
+            offset += _metadata_coords.size
+        else:
+            raise SwitchError("no default case defined")
+
+        d[second] = Metadata(metadata_types[first], value)
+
+        # Like RepeatUntil, only look for the terminator after each entry
+        if offset >= size:
+            raise Incomplete(offset + 1)
+        if _ubyte.unpack_from(buf, offset)[0] == 0x7F:
+            return d, offset + 1
+
+_metadata_sizes = {0: 1, 1: 2, 2: 4, 3: 4, 5: 5, 6: 12}
+_ushort = struct.Struct(">H")
+
+def skip_metadata(buf, offset, context):
+    size = len(buf)
+    while True:
+        if offset >= size:
+            raise Incomplete(offset + 1)
+        first = _ubyte.unpack_from(buf, offset)[0] >> 5
+        offset += 1
+
+        if first == 4:
+            if offset + 2 > size:
+                raise Incomplete(offset + 2)
+            offset += 2 + _ushort.unpack_from(buf, offset)[0] * 2
+        elif first in _metadata_sizes:
+            offset += _metadata_sizes[first]
+        else:
+            raise SwitchError("no default case defined")
+
+        if offset >= size:
+            raise Incomplete(offset + 1)
+        if _ubyte.unpack_from(buf, offset)[0] == 0x7F:
+            return offset + 1
+
+compiler.register(metadata, decoder=decode_metadata)
+compiler.register_skipper(metadata, skip_metadata)
+
 # Build faces, used during dig and build.
 faces = {
     "noop": -1,
@@ -501,20 +588,16 @@ packets = {
         Bool("continuous"),
         UBInt16("primary"),
         UBInt16("secondary"),
-        PascalString("data", length_field=UBInt32("length"), encoding="zlib"),
+        # Left compressed, chunk data is inflated off the reactor thread
+        PascalString("data", length_field=UBInt32("length")),
     ),
     52: Struct("block-batch-change",
         SBInt32("x"),
         SBInt32("z"),
         UBInt16("record_count"),
-        UBInt32("length"),
-        MetaArray(lambda ctx: ctx["record_count"], BitStruct("records",
-            BitField("x", 4),
-            BitField("z", 4),
-            BitField("y", 8),
-            BitField("block_id", 12),
-            BitField("meta", 4),
-            )),
+        # Packed 32 bit records: 4 bits x, 4 bits z, 8 bits y, 12 bits block
+        # id and 4 bits metadata. Left as bytes to be unpacked in one go.
+        PascalString("data", length_field=UBInt32("length")),
     ),
     53: Struct("block-change",
         SBInt32("x"),
@@ -547,7 +630,7 @@ packets = {
     ),
     56: Struct("map-chunk-bulk",
         UBInt16("count"),
-        PascalString("data", length_field=UBInt32("length"), encoding="zlib"),
+        PascalString("data", length_field=UBInt32("length")),
         MetaArray(lambda context: context["count"], Struct("metadata",
             SBInt32("x"),
             SBInt32("z"),
@@ -561,10 +644,8 @@ packets = {
         BFloat64("z"),
         BFloat32("radius"),
         UBInt32("count"),
-        MetaArray(lambda context: context["count"], Struct("records",
-            SBInt8("x"),
-            SBInt8("y"),
-            SBInt8("z"))),
+        # x, y, z signed byte offsets of each destroyed block
+        MetaField("records", lambda context: context["count"] * 3),
         BFloat32("unknown1"),
         BFloat32("unknown2"),
         BFloat32("unknown3"),
@@ -751,17 +832,80 @@ packets = {
     ),
 }
 
-packet_stream = Struct("packet_stream",
-    OptionalGreedyRange(
-        Struct("full_packet",
-            UBInt8("header"),
-            Switch("payload", lambda context: context["header"], packets),
-        ),
-    ),
-    OptionalGreedyRange(
-        UBInt8("leftovers"),
-    ),
-)
+# Compile the table into fast decoders and encoders. These produce and accept
+# the same containers as the construct definitions above.
+decoders = dict((k, compile_decoder(v)) for (k, v) in packets.iteritems())
+encoders = dict((k, compile_encoder(v)) for (k, v) in packets.iteritems())
+skippers = dict((k, compile_skipper(v)) for (k, v) in packets.iteritems())
+
+def decode_packet(buf, offset=0):
+    """
+    Decode the packet starting at offset in buf, which may be a str or a
+    bytearray.
+
+    Returns a tuple of packet header, payload and the offset of the first byte
+    after the packet. Raises Incomplete if buf ends before the packet does.
+    """
+
+    if offset >= len(buf):
+        raise Incomplete(offset + 1)
+
+    header = ord(buf[offset:offset+1])
+    try:
+        decoder = decoders[header]
+    except KeyError:
+        raise SwitchError("Unknown packet type %d" % header)
+
+    payload, end = decoder(buf, offset + 1, None)
+    return header, payload, end
+
+def skip_packet(buf, offset=0):
+    """
+    Like decode_packet, but only works out where the packet ends.
+
+    Returns a tuple of packet header and the offset of the first byte after
+    the packet.
+    """
+
+    if offset >= len(buf):
+        raise Incomplete(offset + 1)
+
+    header = ord(buf[offset:offset+1])
+    try:
+        skipper = skippers[header]
+    except KeyError:
+        raise SwitchError("Unknown packet type %d" % header)
+
+    return header, skipper(buf, offset + 1, None)
+
+class LazyPacket(object):
+
+    """
+    I hold the raw bytes of a packet nobody has asked to be decoded, and only
+    decode them if one of my fields is actually read.
+    """
+
+    __slots__ = ("header", "data", "_payload")
+
+    def __init__(self, header, data):
+        self.header = header
+        self.data = data
+        self._payload = None
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            self._payload = decoders[self.header](self.data, 1, None)[0]
+        return self._payload
+
+    def __getattr__(self, name):
+        return getattr(self.payload, name)
+
+    def __getitem__(self, name):
+        return self.payload[name]
+
+    def __repr__(self):
+        return "LazyPacket(%s)" % packet_names[self.header]
 
 def parse_packets(bytestream):
     """
@@ -772,10 +916,16 @@ def parse_packets(bytestream):
     leftover unparseable bytes.
     """
 
-    container = packet_stream.parse(bytestream)
+    l = []
+    offset = 0
+    while True:
+        try:
+            header, payload, offset = decode_packet(bytestream, offset)
+        except ConstructError:
+            break
+        l.append((header, payload))
 
-    l = [(i.header, i.payload) for i in container.full_packet]
-    leftovers = "".join(chr(i) for i in container.leftovers)
+    leftovers = bytestream[offset:]
 
     if DUMP_ALL_PACKETS:
         for packet in l:
@@ -784,16 +934,6 @@ def parse_packets(bytestream):
 
     return l, leftovers
 
-incremental_packet_stream = Struct("incremental_packet_stream",
-    Struct("full_packet",
-        UBInt8("header"),
-        Switch("payload", lambda context: context["header"], packets),
-    ),
-    OptionalGreedyRange(
-        UBInt8("leftovers"),
-    ),
-)
-
 def parse_packets_incrementally(bytestream):
     """
     Parse out packets one-by-one, yielding a tuple of packet header and packet
@@ -807,14 +947,90 @@ def parse_packets_incrementally(bytestream):
     :returns: a generator yielding tuples of headers and payloads
     """
 
-    while bytestream:
-        parsed = incremental_packet_stream.parse(bytestream)
-        header = parsed.full_packet.header
-        payload = parsed.full_packet.payload
-        bytestream = "".join(chr(i) for i in parsed.leftovers)
-
+    offset = 0
+    while offset < len(bytestream):
+        header, payload, offset = decode_packet(bytestream, offset)
         yield header, payload
 
+class PacketBuffer(object):
+
+    """
+    I accumulate bytes from the network and frame them into packets.
+
+    Every packet is parsed exactly once, straight out of my buffer. When a
+    packet is incomplete I remember how many bytes the parse wanted and won't
+    try again until at least that much has arrived, so a 100KB chunk packet
+    trickling in over dozens of segments is only parsed when it is whole.
+    Consumed bytes are dropped from the front of the buffer in bulk rather
+    than after every packet.
+
+    If handled is a set of packet ids, any other packet is only framed, and
+    handed out as a LazyPacket.
+    """
+
+    # Don't bother moving unconsumed data to the front of the buffer for
+    # anything smaller than this
+    COMPACT_THRESHOLD = 64 * 1024
+
+    def __init__(self, handled=None):
+        self.buffer = bytearray()
+        self.offset = 0
+        self.wanted = 0
+        self.handled = handled
+
+    def feed(self, data):
+        self.buffer.extend(data)
+
+    def pending(self):
+        """ How many bytes have been received but not framed yet """
+        return len(self.buffer) - self.offset
+
+    def transform(self, fn):
+        """ Replace the unframed bytes with fn(bytes), e.g. to decrypt them """
+        tail = fn(memoryview(self.buffer)[self.offset:].tobytes())
+        del self.buffer[self.offset:]
+        self.buffer.extend(tail)
+
+    def compact(self):
+        if self.offset == len(self.buffer):
+            del self.buffer[:]
+        elif self.offset > self.COMPACT_THRESHOLD and self.offset * 2 > len(self.buffer):
+            del self.buffer[:self.offset]
+        else:
+            return
+        self.wanted = max(0, self.wanted - self.offset)
+        self.offset = 0
+
+    def next_packet(self):
+        """
+        Returns a (header, payload) tuple, or None if there isn't a whole
+        packet buffered yet.
+        """
+        if self.offset >= len(self.buffer) or len(self.buffer) < self.wanted:
+            return None
+
+        start = self.offset
+        try:
+            if self.handled is None or self.buffer[start] in self.handled:
+                header, payload, self.offset = decode_packet(self.buffer, start)
+            else:
+                header, self.offset = skip_packet(self.buffer, start)
+                payload = LazyPacket(header, memoryview(self.buffer)[start:self.offset].tobytes())
+        except Incomplete, e:
+            self.wanted = e.wanted
+            return None
+
+        self.wanted = 0
+        return header, payload
+
+    def __iter__(self):
+        while True:
+            packet = self.next_packet()
+            if packet is None:
+                break
+            yield packet
+        self.compact()
+
 packets_by_name = dict((v.name, k) for (k, v) in packets.iteritems())
 packet_names = dict((k, v.name) for (k, v) in packets.iteritems())
 
@@ -840,8 +1056,29 @@ def make_packet(packet, *args, **kwargs):
     if DUMP_ALL_PACKETS:
         print "Making packet %s (%d)" % (packet, header)
         print container
-    payload = packets[header].build(container)
-    return chr(header) + payload
+
+    out = [chr(header)]
+    encoders[header](container, container, out)
+    return "".join(out)
+
+# The bot reports where it is every tick, so these are packed directly rather
+# than going through make_packet.
+_grounded = struct.Struct(">BB")
+_position = struct.Struct(">BddddB")
+_orientation = struct.Struct(">BffB")
+_location = struct.Struct(">BddddffB")
+
+def make_grounded_packet(grounded):
+    return _grounded.pack(10, grounded)
+
+def make_position_packet(x, y, stance, z, grounded):
+    return _position.pack(11, x, y, stance, z, grounded)
+
+def make_orientation_packet(rotation, pitch, grounded):
+    return _orientation.pack(12, rotation, pitch, grounded)
+
+def make_location_packet(x, y, stance, z, rotation, pitch, grounded):
+    return _location.pack(13, x, y, stance, z, rotation, pitch, grounded)
 
 def make_error_packet(message):
     """
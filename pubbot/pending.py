@@ -0,0 +1,112 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Block changes can arrive for a column that isn't decoded yet, or one that
+# still has newer map data waiting in the decode pool. They are parked here
+# until the column's data has been stored.
+
+# No more than this many distinct blocks are remembered for one column
+MAX_PER_COLUMN = 4096
+
+# ... or for this many columns at once
+MAX_COLUMNS = 1024
+
+
+class PendingChanges(object):
+
+    """
+    I am a bounded log of block changes per column.
+
+    Every change carries the sequence number it arrived with, as does every
+    chunk payload. When a payload is stored, changes that arrived before it
+    are stale and dropped, changes that arrived after it are replayed in
+    order. Writing the same block again before replay replaces the earlier
+    change rather than queueing another one.
+    """
+
+    def __init__(self, per_column=MAX_PER_COLUMN, columns=MAX_COLUMNS):
+        self.per_column = per_column
+        self.columns = columns
+
+        # column key -> {y << 8 | z << 4 | x: (seq, x, y, z, kind, metadata)},
+        # keyed by block within the column so later changes replace earlier ones
+        self.logs = {}
+
+        self.queued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.stale = 0
+        self.replayed = 0
+
+    def __contains__(self, key):
+        return key in self.logs
+
+    def __len__(self):
+        return sum(len(log) for log in self.logs.itervalues())
+
+    def add(self, key, seq, x, y, z, kind, metadata):
+        """ Queue a change, given in coordinates relative to its column """
+        log = self.logs.get(key)
+        if log is None:
+            if len(self.logs) >= self.columns:
+                self.dropped += 1
+                return
+            log = self.logs[key] = {}
+
+        index = (y << 8) | (z << 4) | x
+        if index in log:
+            self.coalesced += 1
+        elif len(log) >= self.per_column:
+            self.dropped += 1
+            return
+        else:
+            self.queued += 1
+
+        log[index] = (seq, x, y, z, kind, metadata)
+
+    def discard(self, key):
+        """ Forget everything queued for a column """
+        log = self.logs.pop(key, None)
+        if log:
+            self.dropped += len(log)
+
+    def take(self, key, seq, covered=None, before=None):
+        """
+        A payload that arrived at seq has just been stored for this column.
+        covered is the set of section ys it replaced, or None for all of them.
+        Changes older than seq in those sections are thrown away.
+
+        Returns the changes that should now be applied, oldest first, as
+        (x, y, z, kind, metadata). Changes that arrived at or after before
+        (the next payload still waiting for this column) stay queued.
+        """
+        log = self.logs.get(key)
+        if not log:
+            return []
+
+        ready = []
+        for index, change in log.items():
+            if change[0] < seq and (covered is None or (change[2] >> 4) in covered):
+                del log[index]
+                self.stale += 1
+            elif before is None or change[0] < before:
+                del log[index]
+                ready.append(change)
+
+        if not log:
+            del self.logs[key]
+
+        ready.sort()
+        self.replayed += len(ready)
+        return [change[1:] for change in ready]
@@ -15,7 +15,7 @@
 from math import floor
 from StringIO import StringIO
 
-from twisted.internet import defer, task
+from twisted.internet import defer, task, reactor
 from twisted.internet.protocol import Protocol
 from twisted.web.client import getPage
 from twisted.python import log
@@ -25,8 +25,43 @@ from Crypto.PublicKey import RSA
 from Crypto.Cipher import AES, PKCS1_v1_5
 
 from . import bot, entities, world
-from .packets import make_packet, parse_packets, packet_names
-from .utils import *
+from .chunkcache import open_cache
+from .packets import make_packet, packet_names, PacketBuffer, Container, faces
+
+
+face_names = dict((v, k) for (k, v) in faces.iteritems())
+digging_states = ("started", "digging", "stopped", "broken", "dropped", "shooting")
+animations = {0: "noop", 1: "arm", 2: "hit", 3: "leave_bed", 5: "eat", 104: "crouch", 105: "uncrouch"}
+
+
+class TrafficCounter(object):
+
+    """
+    I count what a protocol writes to its transport.
+
+    The totals cover the whole connection. The bot calls tick() once per frame,
+    which moves the counts since the previous tick into last_packets,
+    last_bytes and last_writes.
+    """
+
+    def __init__(self):
+        self.packets = self.bytes = self.writes = 0
+        self.ticks = 0
+        self.last_packets = self.last_bytes = self.last_writes = 0
+        self._mark = (0, 0, 0)
+
+    def record(self, packets, nbytes):
+        self.packets += packets
+        self.bytes += nbytes
+        self.writes += 1
+
+    def tick(self):
+        packets, nbytes, writes = self._mark
+        self.last_packets = self.packets - packets
+        self.last_bytes = self.bytes - nbytes
+        self.last_writes = self.writes - writes
+        self._mark = (self.packets, self.bytes, self.writes)
+        self.ticks += 1
 
 
 class BaseMinecraftClientProtocol(Protocol):
@@ -41,44 +76,119 @@ class BaseMinecraftClientProtocol(Protocol):
 
     VERSION = 39
 
+    clock = reactor
+
     def __init__(self, username, password, session):
         self.username = username
         self.password = password
         self.session = session
-        self.buffered = ""
         self.encryption_on = False
 
+        # Packets are queued and written out together at the end of the
+        # reactor turn that sent them
+        self.outgoing = []
+        self.flush_call = None
+        self.sent = TrafficCounter()
+
+        # Packets nobody handles are only framed, never decoded
+        self.handlers = self.find_handlers()
+        self.received = PacketBuffer(handled=set(self.handlers))
+
+    def find_handlers(self):
+        """
+        Map packet ids to the on_<packet-name> method that handles them, for
+        every packet I have a handler for.
+        """
+        handlers = {}
+        for packet_id, packet_name in packet_names.iteritems():
+            fn = getattr(self, "on_" + packet_name.replace("-", "_"), None)
+            if fn is not None:
+                handlers[packet_id] = fn
+        return handlers
+
     def dataReceived(self, data):
         if self.encryption_on:
             data = self.decryptor.decrypt(data)
 
-        packets, self.buffered = parse_packets(self.buffered + data)
-        for p in packets:
-            packet_id, packet = p
-            packet_name = packet_names[packet_id]
+        self.received.feed(data)
+        for packet_id, packet in self.received:
             #if not packet_id in (0x38, 0x33):
-            #    log.msg("SERVER %s %s" % (packet_name, packet))
+            #    log.msg("SERVER %s %s" % (packet_names[packet_id], packet))
             #else:
-            #    log.msg("SERVER %s" % packet_name)
+            #    log.msg("SERVER %s" % packet_names[packet_id])
 
-            try:
-                fn = getattr(self, "on_" + packet_name.replace("-", "_"))
-            except AttributeError:
-                #log.msg("Packet not processed: %s %s" % (packet_id, packet_name))
+            fn = self.handlers.get(packet_id)
+            if fn is None:
+                #log.msg("Packet not processed: %s %s" % (packet_id, packet_names[packet_id]))
                 continue
+
+            encrypted = self.encryption_on
             fn(packet)
 
-        if self.buffered:
-            log.msg("Waiting for data for packed type %d" % ord(self.buffered[0]))
+            # Anything after the packet that turned on encryption arrived
+            # encrypted, even if it came in the same segment
+            if self.encryption_on and not encrypted:
+                self.received.transform(self.decryptor.decrypt)
+
+        if self.received.pending():
+            log.msg("Waiting for data for packet type %d" % self.received.buffer[self.received.offset])
 
     def send(self, name, **kwargs):
         #log.msg("CLIENT %s %s" % (name, kwargs))
 
-        data = make_packet(name, kwargs)
+        self.send_raw(make_packet(name, kwargs))
+
+    def send_raw(self, data):
+        """ Queue an already encoded packet """
+        self.outgoing.append(data)
+        if self.flush_call is None:
+            self.flush_call = self.clock.callLater(0, self.flush)
+
+    def flush(self):
+        """
+        Write every queued packet to the transport. They are joined and run
+        through the cipher as one buffer, so a whole tick's worth of packets
+        costs a single encrypt and a single write.
+        """
+        if self.flush_call is not None:
+            if self.flush_call.active():
+                self.flush_call.cancel()
+            self.flush_call = None
+
+        if not self.outgoing:
+            return
+
+        data = "".join(self.outgoing)
+        count = len(self.outgoing)
+        self.outgoing = []
+
         if self.encryption_on:
             data = self.encryptor.encrypt(data)
         self.transport.write(data)
 
+        self.sent.record(count, len(data))
+
+    def send_chat_message(self, message):
+        self.send("chat", message=message)
+
+    def send_player(self, grounded):
+        self.send("grounded", grounded=int(grounded))
+
+    def send_player_digging(self, status, x, y, z, face):
+        self.send("digging", state=digging_states[status], x=x, y=y, z=z, face=face_names[face])
+
+    def send_arm_animation(self, eid, animation):
+        self.send("animate", eid=eid, animation=animations[animation])
+
+    def send_holding_change(self, eid, item):
+        self.send("equip", item=item)
+
+    def send_player_block_placement(self, block_type, x, y, z, face):
+        self.send("build", x=x, y=y, z=z, face=face_names[face],
+            slot=Container(id=block_type, count=1, info=0, size=-1, data=None),
+            cursor_x=8, cursor_y=8, cursor_z=8,
+            )
+
     def connectionMade(self):
         self.loading_map = True
 
@@ -88,6 +198,11 @@ class BaseMinecraftClientProtocol(Protocol):
     def connectionLost(self, reason):
         log.msg("connectionLost", reason)
 
+        if self.flush_call is not None and self.flush_call.active():
+            self.flush_call.cancel()
+        self.flush_call = None
+        self.outgoing = []
+
     @defer.inlineCallbacks
     def on_encryption_key_request(self, packet):
         self.public_key = RSA.importKey(packet.public_key)
@@ -112,6 +227,8 @@ class BaseMinecraftClientProtocol(Protocol):
             )
 
     def on_encryption_key_response(self, packet):
+        # Anything still queued was sent before encryption was turned on
+        self.flush()
         self.encryption_on = True
         self.send("client-status", status=0)
 
@@ -126,19 +243,32 @@ class BaseMinecraftClientProtocol(Protocol):
 
     def on_location(self, packet):
         self.send("location",
-            grounded = Grounded.from_packet(packet.grounded),
-            position = Location.from_packet(packet.position),
-            orientation = Orientation.from_packet(packet.orientation),
+            grounded = packet.grounded,
+            position = packet.position,
+            orientation = packet.orientation,
             )
 
 
 class MinecraftClientProtocol(BaseMinecraftClientProtocol):
 
+    # Directory to keep a ChunkCache in, or None for no cache
+    cache_dir = None
+
     def __init__(self, username, password, session):
         BaseMinecraftClientProtocol.__init__(self, username, password, session)
         self.bot = bot.Bot(self)
         self.entities = entities.Entities()
         self.world = world.World()
+        self.world.pool.origin = lambda: self.bot.pos
+
+    def connectionLost(self, reason):
+        BaseMinecraftClientProtocol.connectionLost(self, reason)
+        self.world.close_cache()
+
+    def on_login(self, packet):
+        if self.cache_dir:
+            peer = self.transport.getPeer()
+            self.world.open_cache(open_cache(self.cache_dir, peer.host, peer.port, packet.dimension))
 
     def on_location(self, packet):
         BaseMinecraftClientProtocol.on_location(self, packet)
@@ -158,6 +288,30 @@ class MinecraftClientProtocol(BaseMinecraftClientProtocol):
             )
 
 
+    def on_chunk(self, packet):
+        d = self.world.load_chunk(
+            x = packet.x,
+            z = packet.z,
+            continuous = packet.continuous,
+            primary = packet.primary,
+            secondary = packet.secondary,
+            data = packet.data,
+            )
+        d.addErrback(log.err, "Couldn't decode chunk %d, %d" % (packet.x, packet.z))
+
+    def on_map_chunk_bulk(self, packet):
+        d = self.world.load_map_chunk_bulk(packet.count, packet.data, packet.metadata)
+        d.addErrback(log.err, "Couldn't decode map chunk bulk")
+
+    def on_block_change(self, p):
+        self.world.on_block_change(p.x, p.y, p.z, p.type, p.meta)
+
+    def on_block_batch_change(self, p):
+        self.world.on_block_batch(p.x, p.z, p.record_count, p.data)
+
+    def on_explosion(self, p):
+        self.world.on_explosion(p.x, p.y, p.z, p.count, p.records)
+
     def on_spawn_named_entity(self, packet):
         self.entities.on_spawn_named_entity(
             eid = packet.eid,
@@ -184,3 +338,10 @@ class MinecraftClientProtocol(BaseMinecraftClientProtocol):
         self.entities.on_entity_teleport(p.eid, p.x, p.y, p.z)
         self.on_entity_orientation(p)
 
+    def on_entity_destroy(self, p):
+        eids = p.eids[:p.count]
+        self.entities.on_entity_destroy(eids)
+        for eid in eids:
+            # Nothing left to follow
+            self.world.forget_field(eid)
+
@@ -0,0 +1,312 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Which blocks the bot can get between, so a search for somewhere walled off
+# can be skipped instead of running until it gives up.
+#
+# The blocks of each section the bot could stand in (see World.allowed_at)
+# are labelled by which connected component they are in, using the same
+# moves as the pathfinder. Components of neighbouring sections are linked
+# where a move crosses between them. Labels and links are worked out the
+# first time a query needs them, and only the sections a change touched are
+# labelled again.
+#
+# A query only looks at the columns around the two points, so it can only
+# prove they aren't connected when everything connected to the start is in
+# there. Otherwise it says they might be, and the pathfinder finds out.
+
+from pubbot.blocks import solid
+from pubbot.chunk import SECTION_COUNT, ALL_PASSABLE, ALL_SOLID
+from pubbot.moves import MOVES
+
+
+# Columns either side of the two points that a path between them may use
+PAD = 1
+
+# Every block in the section can be stood in, and is reachable from every
+# other
+_ALL_FREE = (1, [1] * 4096)
+
+# None of them can
+_NONE_FREE = (0, [0] * 4096)
+
+# The moves, as (dx, dy, dz)
+_OFFSETS = tuple(tuple(total) for total, delta, steps in MOVES)
+
+
+class ReachIndex(object):
+
+    """
+    I know which points of a World are connected to which.
+
+    reachable() answers from a search over section components, which are
+    few, rather than blocks. Answers are remembered until something
+    changes.
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+        # (cx, sy, cz) -> (component count, label of each block)
+        self.labels = {}
+
+        # (cx, sy, cz) -> set of (own label, neighbour key, neighbour label)
+        self.links = {}
+
+        self.answers = {}
+
+        self.labelled = 0
+        self.queries = 0
+        self.remembered = 0
+
+    def column_changed(self, cx, cz, positions):
+        self.answers.clear()
+
+        if positions is None:
+            touched = set((cx, sy, cz) for sy in xrange(SECTION_COUNT))
+        else:
+            # A block is the head room of the one below it
+            touched = set()
+            for x, y, z in positions:
+                touched.add((cx, y >> 4, cz))
+                touched.add((cx, (y - 1) >> 4, cz))
+
+        for key in touched:
+            self.labels.pop(key, None)
+            kx, sy, kz = key
+            for n in ((kx, sy, kz), (kx - 1, sy, kz), (kx + 1, sy, kz), (kx, sy, kz - 1), (kx, sy, kz + 1)):
+                for dy in (-1, 0, 1):
+                    self.links.pop((n[0], n[1] + dy, n[2]), None)
+
+    def chunk(self, cx, cz):
+        key = (cx, 0, cz)
+        c = self.world.chunks.get(key)
+        if c is None:
+            c = self.world.load_cached(key)
+        return c
+
+    def section_labels(self, key):
+        try:
+            return self.labels[key]
+        except KeyError:
+            pass
+
+        cx, sy, cz = key
+        c = self.chunk(cx, cz) if 0 <= sy < SECTION_COUNT else None
+        if c is None:
+            result = _NONE_FREE
+        else:
+            result = label_section(c, sy)
+
+        self.labels[key] = result
+        self.labelled += 1
+        return result
+
+    def label_at(self, x, y, z):
+        """ The component of the block at x, y, z, as (section key, label) """
+        key = (x >> 4, y >> 4, z >> 4)
+        count, labels = self.section_labels(key)
+        return key, labels[((y & 15) << 8) | ((z & 15) << 4) | (x & 15)]
+
+    def section_links(self, key):
+        try:
+            return self.links[key]
+        except KeyError:
+            pass
+
+        count, labels = self.section_labels(key)
+        links = set()
+        if count:
+            cx, sy, cz = key
+
+            # Labels of each neighbouring section a move can reach, by offset
+            near = {}
+            for dx, dy, dz in _OFFSETS:
+                for d in ((dx, 0, dz), (0, dy, 0), (dx, dy, dz)):
+                    if d != (0, 0, 0) and d not in near:
+                        near[d] = self.section_labels((cx + d[0], sy + d[1], cz + d[2]))
+
+            # Two sections that are each all one component are simply joined
+            scan = False
+            for d, (other_count, other_labels) in near.iteritems():
+                if not other_count:
+                    continue
+                if labels is _ALL_FREE[1] and other_labels is _ALL_FREE[1]:
+                    links.add((1, (cx + d[0], sy + d[1], cz + d[2]), 1))
+                else:
+                    scan = True
+
+            if scan:
+                self.scan_links(key, labels, near, links)
+
+        self.links[key] = links
+        return links
+
+    def scan_links(self, key, labels, near, links):
+        """ Find the links out of a section block by block """
+        cx, sy, cz = key
+        for ly in xrange(16):
+            for lz in xrange(16):
+                shell = ly in (0, 15) or lz in (0, 15)
+                row = (ly << 8) | (lz << 4)
+                for lx in (xrange(16) if shell else (0, 15)):
+                    label = labels[row | lx]
+                    if not label:
+                        continue
+                    for dx, dy, dz in _OFFSETS:
+                        nx, ny, nz = lx + dx, ly + dy, lz + dz
+                        d = (nx >> 4, ny >> 4, nz >> 4)
+                        if d == (0, 0, 0):
+                            continue
+                        other_count, other_labels = near[d]
+                        if not other_count:
+                            continue
+                        other_label = other_labels[((ny & 15) << 8) | ((nz & 15) << 4) | (nx & 15)]
+                        if other_label:
+                            links.add((label, (cx + d[0], sy + d[1], cz + d[2]), other_label))
+
+    def reachable(self, a, b):
+        """
+        Whether there is a way from a to b. The search only looks within PAD
+        columns of them, so False means every point connected to a was
+        found there and b wasn't one of them. If the way out of a leads
+        further afield, or either can't be stood in, there is no telling and
+        the answer is True.
+        """
+        a, b = a.floor(), b.floor()
+        start = self.label_at(a.x, a.y, a.z)
+        goal = self.label_at(b.x, b.y, b.z)
+        if not start[1] or not goal[1]:
+            return True
+
+        self.queries += 1
+        if start == goal:
+            return True
+
+        answer = self.answers.get((start, goal))
+        if answer is not None:
+            self.remembered += 1
+            return answer
+
+        low_x, high_x = (min(a.x, b.x) >> 4) - PAD, (max(a.x, b.x) >> 4) + PAD
+        low_z, high_z = (min(a.z, b.z) >> 4) - PAD, (max(a.z, b.z) >> 4) + PAD
+
+        seen = set([start])
+        stack = [start]
+        answer = False
+        while stack:
+            key, label = stack.pop()
+            for own, other, other_label in self.section_links(key):
+                if own != label:
+                    continue
+                node = (other, other_label)
+                if node in seen:
+                    continue
+                if not (low_x <= other[0] <= high_x and low_z <= other[2] <= high_z):
+                    # Could go round whatever is in the way out here
+                    answer = True
+                    continue
+                if node == goal:
+                    answer = True
+                    stack = []
+                    break
+                seen.add(node)
+                stack.append(node)
+
+        self.answers[(start, goal)] = self.answers[(goal, start)] = answer
+        return answer
+
+
+def label_section(c, sy):
+    """
+    Label the blocks of section sy of chunk c that can be stood in by which
+    component they belong to, numbered from 1. Returns (count, labels),
+    where labels has 0 for every other block.
+    """
+    section = c.sections[sy]
+    above = c.sections[sy + 1] if sy + 1 < SECTION_COUNT else None
+
+    summary = section.summary() if section is not None else ALL_PASSABLE
+    if summary == ALL_SOLID:
+        return _NONE_FREE
+
+    # Is the head room above the top layer all clear?
+    if above is None or above.summary() & ALL_PASSABLE:
+        top = [False] * 256
+    else:
+        top = [solid[k] for k in above.blocks[:256]]
+
+    if summary & ALL_PASSABLE and not any(top):
+        return _ALL_FREE
+
+    if section is None:
+        blocked = [False] * 4096
+    else:
+        blocked = [solid[k] for k in section.blocks]
+    blocked.extend(top)
+
+    # Runs of free blocks along x in each row, as (first x, end x)
+    runs = {}
+    for ly in xrange(16):
+        for lz in xrange(16):
+            row = (ly << 8) | (lz << 4)
+            found = []
+            start = None
+            for lx in xrange(17):
+                free = lx < 16 and not (blocked[row | lx] or blocked[(row | lx) + 256])
+                if free and start is None:
+                    start = lx
+                elif not free and start is not None:
+                    found.append((start, lx))
+                    start = None
+            if found:
+                runs[ly, lz] = found
+
+    parent = {}
+    def find(r):
+        while parent.get(r, r) != r:
+            r = parent[r]
+        return r
+    def union(r, s):
+        r, s = find(r), find(s)
+        if r != s:
+            parent[r] = s
+
+    for (ly, lz), found in runs.iteritems():
+        for i, (a, b) in enumerate(found):
+            run = (ly, lz, i)
+            # Along z, and climbing along z to the layer above
+            for other_row in ((ly, lz + 1), (ly + 1, lz + 1), (ly + 1, lz - 1)):
+                for j, (c, d) in enumerate(runs.get(other_row, ())):
+                    if a < d and c < b:
+                        union(run, other_row + (j, ))
+            # Climbing along x: one block over, one block up
+            other_row = (ly + 1, lz)
+            for j, (c, d) in enumerate(runs.get(other_row, ())):
+                if max(a, c - 1) < min(b, d - 1) or max(a, c + 1) < min(b, d + 1):
+                    union(run, other_row + (j, ))
+
+    labels = [0] * 4096
+    numbers = {}
+    for (ly, lz), found in runs.iteritems():
+        row = (ly << 8) | (lz << 4)
+        for i, (a, b) in enumerate(found):
+            root = find((ly, lz, i))
+            number = numbers.get(root)
+            if number is None:
+                number = numbers[root] = len(numbers) + 1
+            for lx in xrange(a, b):
+                labels[row | lx] = number
+
+    return len(numbers), labels
@@ -0,0 +1,153 @@
+# Copyright 2010 John Carr
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Copies of a box of the world in one flat array, for code that wants to look
+# at every block in it.
+#
+# A Region is assembled by slicing rows of block ids out of each section the
+# box overlaps, so the cost is a copy per row of up to 16 blocks rather than
+# a chunk lookup per block. Metadata nibbles are unpacked a section at a time
+# with str.translate.
+
+from pubbot.chunk import SECTION_COUNT
+from pubbot.vector import BlockPos
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Tables for str.translate, picking out the low and high nibble of a byte
+_LOW = "".join(chr(b & 0x0F) for b in range(256))
+_HIGH = "".join(chr(b >> 4) for b in range(256))
+
+
+class Region(object):
+
+    """
+    I am a copy of the blocks in a box, from low to high (included).
+
+    Block ids are in blocks, a bytearray, and metadata, if it was asked for,
+    in another with a byte per block. Both are ordered like a section, y then
+    z then x, so index = (y * depth + z) * width + x relative to low.
+    """
+
+    __slots__ = ("low", "high", "width", "height", "depth", "blocks", "metadata")
+
+    def __init__(self, low, high, metadata=False):
+        self.low = BlockPos(*low)
+        self.high = BlockPos(*high)
+        self.width = high[0] - low[0] + 1
+        self.height = high[1] - low[1] + 1
+        self.depth = high[2] - low[2] + 1
+
+        size = self.width * self.height * self.depth
+        self.blocks = bytearray(size)
+        self.metadata = bytearray(size) if metadata else None
+
+    def contains(self, x, y, z):
+        low, high = self.low, self.high
+        return low[0] <= x <= high[0] and low[1] <= y <= high[1] and low[2] <= z <= high[2]
+
+    def index(self, x, y, z):
+        """ Where the block at world coordinates x, y, z is in the arrays """
+        low = self.low
+        return ((y - low[1]) * self.depth + (z - low[2])) * self.width + (x - low[0])
+
+    def kind_at(self, x, y, z):
+        return self.blocks[self.index(x, y, z)]
+
+    def set_kind(self, x, y, z, kind):
+        self.blocks[self.index(x, y, z)] = kind & 0xFF
+
+    def position(self, i):
+        """ The BlockPos of index i """
+        zy, x = divmod(i, self.width)
+        y, z = divmod(zy, self.depth)
+        low = self.low
+        return BlockPos(low[0] + x, low[1] + y, low[2] + z)
+
+    def where(self, kinds):
+        """
+        The BlockPos of every block whose id is marked in kinds, a list
+        indexed by block id such as blocks.solid.
+        """
+        table = "".join("\x01" if kinds[k] else "\x00" for k in range(256))
+        marks = str(self.blocks).translate(table)
+        found = []
+        i = marks.find("\x01")
+        while i != -1:
+            found.append(self.position(i))
+            i = marks.find("\x01", i + 1)
+        return found
+
+    def array(self):
+        """
+        The block ids as a NumPy array indexed [y, z, x], sharing memory with
+        blocks. Needs NumPy.
+        """
+        if numpy is None:
+            raise RuntimeError("NumPy isn't installed")
+        return numpy.frombuffer(self.blocks, dtype=numpy.uint8).reshape(self.height, self.depth, self.width)
+
+
+def copy_region(world, low, high, metadata=False):
+    """
+    Copy the blocks from low to high, opposite corners, out of world into a
+    Region. Raises KeyError if any column it covers isn't loaded.
+    """
+    low, high = (
+        (min(low[0], high[0]), min(low[1], high[1]), min(low[2], high[2])),
+        (max(low[0], high[0]), max(low[1], high[1]), max(low[2], high[2])),
+        )
+    region = Region(low, high, metadata)
+    blocks, metas = region.blocks, region.metadata
+    width, depth = region.width, region.depth
+
+    for cx in xrange(low[0] >> 4, (high[0] >> 4) + 1):
+        x0, x1 = max(low[0], cx * 16), min(high[0], cx * 16 + 15)
+        lx0, count = x0 & 15, x1 - x0 + 1
+
+        for cz in xrange(low[2] >> 4, (high[2] >> 4) + 1):
+            c = world.chunks.get((cx, 0, cz))
+            if c is None:
+                c = world.load_cached((cx, 0, cz))
+                if c is None:
+                    raise KeyError("No chunk for region %d, %d" % (cx, cz))
+            z0, z1 = max(low[2], cz * 16), min(high[2], cz * 16 + 15)
+
+            for sy in xrange(max(low[1], 0) >> 4, min(high[1] >> 4, SECTION_COUNT - 1) + 1):
+                section = c.sections[sy]
+                if section is None:
+                    # Air, and the region starts out as air
+                    continue
+                source = section.blocks
+
+                if metas is not None:
+                    packed = str(section.metadata)
+                    meta_source = bytearray(len(source))
+                    meta_source[0::2] = packed.translate(_LOW)
+                    meta_source[1::2] = packed.translate(_HIGH)
+
+                y0, y1 = max(low[1], sy * 16), min(high[1], sy * 16 + 15)
+                for y in xrange(y0, y1 + 1):
+                    for z in xrange(z0, z1 + 1):
+                        src = ((y & 15) << 8) | ((z & 15) << 4) | lx0
+                        dst = ((y - low[1]) * depth + (z - low[2])) * width + (x0 - low[0])
+                        blocks[dst:dst + count] = source[src:src + count]
+                        if metas is not None:
+                            metas[dst:dst + count] = meta_source[src:src + count]
+
+    return region
@@ -27,17 +27,21 @@ class Options(usage.Options):
         ["password", "s", "", "The password to login with"],
         ["port", "p", 25565, "The port number to connect to."],
         ["host", "h", "localhost", "The host machine to connect to."],
+        ["cache", "c", "", "Directory to cache chunks in between runs."],
+        ["chunk-budget", "b", 0, "Megabytes of decoded chunks to keep in memory, 0 for no limit."],
         ]
 
 class MinecraftClientService(service.MultiService):
 
     LAUNCHER_VERSION = 13
 
-    def __init__(self, username, password, host="localhost", port=25565):
+    def __init__(self, username, password, host="localhost", port=25565, cache_dir=None, chunk_budget=None):
         self.username = username
         self.password = password
         self.host = host
         self.port = port
+        self.cache_dir = cache_dir
+        self.chunk_budget = chunk_budget
         self.session = None
         service.MultiService.__init__(self)
 
@@ -53,12 +57,13 @@ class MinecraftClientService(service.MultiService):
         self.session = Session()
         yield self.session.login(self.username, self.password)
  
-        self.factory = MinecraftClientFactory(self.username, self.password, self.session)
+        self.factory = MinecraftClientFactory(self.username, self.password, self.session, self.cache_dir, self.chunk_budget)
         self.client = internet.TCPClient(self.host, self.port, self.factory)
         self.client.setServiceParent(self)
 
 
 
 def makeService(cfg):
-    return MinecraftClientService(cfg["username"], cfg["password"], cfg["host"], int(cfg["port"]))
+    budget = int(cfg["chunk-budget"]) * 1024 * 1024 or None
+    return MinecraftClientService(cfg["username"], cfg["password"], cfg["host"], int(cfg["port"]), cfg["cache"] or None, budget)
 
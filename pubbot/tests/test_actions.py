@@ -22,3 +22,230 @@ class TestSay(TestCase):
         result = a.do()
         self.failUnlessEqual(result, None)
         self.failUnlessEqual(a.bot.protocol.send_chat_message.call_args[0][0], "hello everybody")
+
+
+class TestNavigateTo(TestCase):
+
+    def setUp(self):
+        from pubbot.astar import SearchStats
+        from pubbot.vector import Vector
+        from pubbot.world import World
+        from pubbot.tests.test_world import make_column
+
+        world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        world.on_chunk(0, 0, True, primary, 0, data)
+
+        self.bot = Mock()
+        self.bot.pos = Vector(1.5, 64, 1.5)
+        self.bot.protocol.world = world
+        self.bot.pathing = SearchStats()
+        self.target = Vector(10, 64, 1)
+
+    def test_sliced(self):
+        a = actions.NavigateTo(self.bot, self.target)
+        a.NODES = 3
+
+        frames = 1
+        result = a.do()
+        while result is a:
+            frames += 1
+            result = a.do()
+
+        self.failUnless(frames > 1)
+        self.failUnlessEqual(self.bot.pathing.slices, frames)
+        self.failUnlessEqual(self.bot.pathing.found, 1)
+
+        # A move for every step, then navigate again to check we arrived
+        self.failUnlessEqual(len(result), 10)
+        self.failUnlessEqual(result[-2].pos, self.target)
+        self.failUnlessEqual(result[-1], a)
+
+    def test_far_planned_over_frames(self):
+        from pubbot.vector import Vector
+        from pubbot.tests.test_world import make_column
+        world = self.bot.protocol.world
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        for cx in range(1, 6):
+            world.on_chunk(cx, 0, True, primary, 0, data)
+
+        a = actions.NavigateTo(self.bot, self.target + Vector(70, 0, 0))
+        a.NODES = 50
+
+        result = a.do()
+        self.failUnless(a.plan is not None)
+        while result is a:
+            result = a.do()
+
+        # Heads for a waypoint of the plan, then navigates again
+        self.failUnless(world.graph.linked > 1)
+        self.failUnlessEqual(result[-1], a)
+        self.failUnless(64 >= result[-2].pos.x > 16)
+
+    def test_dig(self):
+        from pubbot.vector import BlockPos
+        world = self.bot.protocol.world
+        for z in range(16):
+            for y in range(64, 100):
+                world.on_block_change(5, y, z, 1, 0)
+
+        a = actions.NavigateTo(self.bot, self.target, mode="dig")
+        result = a.do()
+        while result is a:
+            result = a.do()
+
+        # Both blocks in the way are dug before moving into them
+        kinds = [type(x) for x in result]
+        self.failUnlessEqual(kinds.count(actions.Dig), 2)
+        at = kinds.index(actions.Dig)
+        self.failUnlessEqual([x.pos for x in result[at:at + 3]], [BlockPos(5, 64, 1), BlockPos(5, 65, 1), BlockPos(5, 64, 1)])
+        self.failUnless(isinstance(result[at + 2], actions.MoveTo))
+        self.failUnlessEqual(result[-1].pos, self.target)
+
+    def test_route_repaired(self):
+        a = actions.NavigateTo(self.bot, self.target)
+        self.bot.actions = list(a.do())
+        self.failUnlessEqual(self.bot.actions[-1], a)
+
+        # Walk the first two moves
+        del self.bot.actions[:2]
+
+        world = self.bot.protocol.world
+        for z in range(16):
+            for y in (64, 65):
+                world.on_block_change(6, y, z, 1, 0)
+
+        queue = self.bot.actions
+        self.failUnlessEqual(queue[-1], a)
+        route = [m.pos for m in queue[:-1]]
+        self.failUnlessEqual(route[-1], self.target)
+        for p, q in zip([a.moves[1].pos] + route, route):
+            self.failUnlessEqual((q - p).manhattan_length(), 1)
+            self.failUnless(world.allowed(q))
+        self.failUnless(max(p.y for p in route) >= 66)
+
+        # Done walking, so it stops watching the world
+        self.bot.pos = self.target
+        self.failUnlessEqual(a.do(), None)
+        self.failIf(a.world_changed in world.watchers)
+
+    def test_column_elsewhere(self):
+        from pubbot.tests.test_world import make_column
+        a = actions.NavigateTo(self.bot, self.target)
+        self.bot.actions = list(a.do())
+        queue = list(self.bot.actions)
+        expanded = a.search.expanded
+
+        # A column the search never looked at arrives
+        world = self.bot.protocol.world
+        primary, data = make_column({0: (1, 0)})
+        world.on_chunk(5, 5, True, primary, 0, data)
+        self.failUnlessEqual(self.bot.actions, queue)
+        self.failUnlessEqual(a.search.expanded, expanded)
+
+    def test_repair_over_frames(self):
+        a = actions.NavigateTo(self.bot, self.target)
+        self.bot.actions = list(a.do())
+        del self.bot.actions[:2]
+
+        a.NODES = 3
+        world = self.bot.protocol.world
+        for z in range(16):
+            for y in (64, 65):
+                world.on_block_change(6, y, z, 1, 0)
+
+        # The old route is dropped while the repair carries on
+        self.failUnlessEqual(self.bot.actions, [a])
+        self.failUnless(a.repairing)
+
+        result = a.do()
+        while result is a:
+            result = a.do()
+        self.failUnlessEqual(result[-1], a)
+        route = [m.pos for m in result[:-1]]
+        self.failUnlessEqual(route[-1], self.target)
+        for p, q in zip([a.moves[1].pos] + route, route):
+            self.failUnlessEqual((q - p).manhattan_length(), 1)
+            self.failUnless(world.allowed(q))
+
+
+class TestFollow(TestCase):
+
+    def setUp(self):
+        from pubbot.vector import Vector
+        from pubbot.world import World
+        from pubbot.tests.test_world import make_column
+
+        world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        world.on_chunk(0, 0, True, primary, 0, data)
+
+        self.bot = Mock()
+        self.bot.pos = Vector(1.5, 64, 1.5)
+        self.bot.protocol.world = world
+
+        self.target = Mock()
+        self.target.eid = 7
+        self.target.pos = Vector(10.5, 64, 1.5)
+
+    def test_follow(self):
+        from pubbot.vector import BlockPos
+        a = actions.Follow(self.bot, self.target)
+        result = a.do()
+        while result is a:
+            # Waiting for the field
+            result = a.do()
+        self.failUnlessEqual([m.pos for m in result[:-1]], [BlockPos(2, 64, 1)])
+        self.failUnlessEqual(result[-1], a)
+
+        # Close enough, so wait
+        self.bot.pos = self.target.pos
+        self.failUnlessEqual(a.do(), a)
+
+    def test_arrived(self):
+        self.bot.pos = self.target.pos
+        self.failUnlessEqual(actions.Follow(self.bot, self.target, keep=False).do(), None)
+        self.failUnlessEqual(self.bot.protocol.world.fields, {})
+
+    def test_shared(self):
+        world = self.bot.protocol.world
+        first = actions.Follow(self.bot, self.target, keep=False)
+        first.do()
+        second = actions.Follow(self.bot, self.target, keep=False)
+        second.do()
+        self.failUnlessEqual(len(world.fields), 1)
+        self.failUnlessEqual(world.fields[7].builds, 1)
+
+        # Forgotten once both are done
+        self.bot.pos = self.target.pos
+        self.failUnlessEqual(first.do(), None)
+        self.failUnlessEqual(len(world.fields), 1)
+        self.failUnlessEqual(second.do(), None)
+        self.failUnlessEqual(world.fields, {})
+
+    def test_target_gone(self):
+        a = actions.Follow(self.bot, self.target)
+        a.do()
+        self.bot.protocol.world.forget_field(7)
+        self.failUnlessEqual(a.do(), None)
+
+    def test_out_of_reach(self):
+        from pubbot.vector import Vector
+        from pubbot.tests.test_world import make_column
+        world = self.bot.protocol.world
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        for cx in (1, 2):
+            world.on_chunk(cx, 0, True, primary, 0, data)
+        self.target.pos = Vector(40.5, 64, 1.5)
+
+        a = actions.Follow(self.bot, self.target, keep=False)
+        result = a.do()
+        while result is a:
+            result = a.do()
+        self.failUnless(isinstance(result[0], actions.NavigateTo))
+        self.failUnlessEqual(result[0].pos, self.target.pos)
+        self.failUnlessEqual(result[1], a)
+
+        # The search got nowhere and nothing has moved, so give up
+        self.failUnlessEqual(a.do(), None)
+        self.failUnlessEqual(world.fields, {})
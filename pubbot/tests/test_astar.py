@@ -1,7 +1,9 @@
 import unittest
 
 from pubbot.astar import *
-from pubbot.vector import Vector
+from pubbot.vector import Vector, BlockPos
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
 
 class MockWorld(object):
 
@@ -71,3 +73,94 @@ class TestAStar(unittest.TestCase):
         self.failUnlessEqual(route[5], Vector(0, 0, 4))
         self.failUnlessEqual(route[6], Vector(0, 0, 5))
 
+
+
+class TestWorldAStar(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+
+    def test_flat(self):
+        route = path(self.world, Vector(1.5, 64, 1.5), [Vector(10, 64, 1)])
+        self.failUnlessEqual(len(route), 9)
+        self.failUnlessEqual(route[-1], Vector(10, 64, 1))
+
+    def test_over_wall(self):
+        for z in range(16):
+            for y in (64, 65):
+                self.world.on_block_change(8, y, z, 1, 0)
+
+        start = BlockPos(1, 64, 1)
+        route = path(self.world, start, [Vector(12, 64, 1)])
+        self.failUnlessEqual(route[-1], BlockPos(12, 64, 1))
+
+        # Every step, including the ones inside a climb, is to a neighbour
+        for a, b in zip([start] + route, route):
+            self.failUnlessEqual((b - a).manhattan_length(), 1)
+            self.failUnless(self.world.allowed(b))
+
+    def test_unreachable(self):
+        for y in (64, 65, 66):
+            for x, z in ((11, 1), (13, 1), (12, 0), (12, 2)):
+                self.world.on_block_change(x, y, z, 1, 0)
+        self.world.on_block_change(12, 66, 1, 1, 0)
+        self.failUnlessEqual(path(self.world, Vector(1, 64, 1), [Vector(12, 64, 1)]), None)
+
+
+class TestSearchSlices(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+
+    def test_node_budget(self):
+        stats = SearchStats()
+        s = begin(self.world, Vector(1, 64, 1), [Vector(10, 64, 1)], stats=stats)
+
+        slices = 0
+        while not s.step(nodes=2):
+            slices += 1
+            self.failUnlessEqual(s.expanded, slices * 2)
+
+        self.failUnlessEqual(s.route, path(self.world, Vector(1, 64, 1), [Vector(10, 64, 1)]))
+        self.failUnlessEqual(stats.searches, 1)
+        self.failUnlessEqual(stats.found, 1)
+        self.failUnlessEqual(stats.yielded, slices)
+        self.failUnlessEqual(stats.slices, slices + 1)
+
+        # Once done, stepping again is harmless
+        self.failUnless(s.step(nodes=2))
+
+    def test_time_budget(self):
+        s = begin(self.world, Vector(1, 64, 1), [Vector(10, 64, 1)])
+        ticks = []
+        def clock():
+            ticks.append(None)
+            return len(ticks)
+        s.clock = clock
+        s.CLOCK_EVERY = 1
+
+        # Every look at the clock is a second later
+        self.failIf(s.step(seconds=1.5))
+        self.failUnlessEqual(s.expanded, 2)
+
+    def test_unreachable_in_slices(self):
+        for y in (64, 65, 66):
+            for x, z in ((11, 1), (13, 1), (12, 0), (12, 2)):
+                self.world.on_block_change(x, y, z, 1, 0)
+        self.world.on_block_change(12, 66, 1, 1, 0)
+
+        # Without the reachability check, so the search has to find out
+        self.failUnlessEqual(begin(self.world, Vector(1, 64, 1), [Vector(12, 64, 1)]), None)
+        self.world.reach = None
+
+        stats = SearchStats()
+        s = begin(self.world, Vector(1, 64, 1), [Vector(12, 64, 1)], stats=stats)
+        while not s.step(nodes=5000):
+            pass
+        self.failUnlessEqual(s.route, None)
+        self.failUnlessEqual(stats.failed, 1)
+        self.failUnless(stats.yielded >= MAX_EXPANDED // 5000)
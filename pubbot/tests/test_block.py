@@ -17,6 +17,19 @@ class TestBlock(TestCase):
         b = Block(Vector(0,0,0), 4, 0)
         self.failUnlessEqual(b.name, "cobblestone")
 
+    def test_properties(self):
+        self.failIf(Block(Vector(0,0,0), 0, 0).solid)
+        self.failUnless(Block(Vector(0,0,0), 0, 0).passable)
+        self.failUnless(Block(Vector(0,0,0), 9, 0).liquid)
+        self.failIf(Block(Vector(0,0,0), 9, 0).solid)
+        self.failUnless(Block(Vector(0,0,0), 1, 0).solid)
+
+    def test_unknown_block(self):
+        b = Block(Vector(0,0,0), 200, 0)
+        self.failUnlessEqual(b.preferred_tool, 0x104)
+        self.failUnlessEqual(b.ttl, 20.0)
+        self.failUnlessRaises(KeyError, getattr, b, "name")
+
     def test_face_neg_y(self):
         b = Block(Vector(0, 0, 0), 4, 0)
         self.failUnlessEqual(b.get_faces(Vector(0.5,-2,0.5))[0][0], 0)
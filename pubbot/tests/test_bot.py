@@ -0,0 +1,37 @@
+from twisted.trial.unittest import TestCase
+
+from mock import Mock
+
+from pubbot import packets
+from pubbot.bot import Bot
+
+
+class TestSendLocation(TestCase):
+
+    def setUp(self):
+        self.bot = Bot(Mock())
+        self.bot.x, self.bot.y, self.bot.stance, self.bot.z = 1.0, 64.0, 65.6, 2.0
+
+    def sent(self):
+        return self.bot.protocol.send_raw.call_args[0][0]
+
+    def test_first_is_full_location(self):
+        self.bot.send_location()
+        self.failUnlessEqual(self.sent(), packets.make_location_packet(1.0, 64.0, 65.6, 2.0, 0, 0, 1))
+
+    def test_unchanged_is_grounded(self):
+        self.bot.send_location()
+        self.bot.send_location()
+        self.failUnlessEqual(self.sent(), packets.make_grounded_packet(1))
+
+    def test_moved(self):
+        self.bot.send_location()
+        self.bot.x = 1.5
+        self.bot.send_location()
+        self.failUnlessEqual(self.sent(), packets.make_position_packet(1.5, 64.0, 65.6, 2.0, 1))
+
+    def test_turned(self):
+        self.bot.send_location()
+        self.bot.yaw = 45.0
+        self.bot.send_location()
+        self.failUnlessEqual(self.sent(), packets.make_orientation_packet(45.0, 0, 1))
@@ -0,0 +1,71 @@
+import unittest
+
+from pubbot.chunk import Chunk, Section, ALL_PASSABLE, ALL_SOLID
+from pubbot.vector import Vector
+
+
+class TestSection(unittest.TestCase):
+
+    def test_metadata_nibbles(self):
+        s = Section()
+        s.set(0, 1, 0x3)
+        s.set(1, 2, 0xC)
+        self.failUnlessEqual(s.get_kind(0), 1)
+        self.failUnlessEqual(s.get_kind(1), 2)
+        self.failUnlessEqual(s.get_metadata(0), 0x3)
+        self.failUnlessEqual(s.get_metadata(1), 0xC)
+        self.failUnlessEqual(s.metadata[0], 0xC3)
+
+    def test_summary(self):
+        s = Section()
+        self.failUnlessEqual(s.summary(), ALL_PASSABLE)
+
+        s.set(10, 9, 0)
+        self.failUnlessEqual(s.summary(), ALL_PASSABLE)
+
+        s.set(11, 1, 0)
+        self.failUnlessEqual(s.summary(), 0)
+
+        s.set(11, 0, 0)
+        self.failUnlessEqual(s.summary(), ALL_PASSABLE)
+
+        s.scatter(range(4096), [1] * 4096, [0] * 4096)
+        self.failUnlessEqual(s.summary(), ALL_SOLID)
+
+        s.scatter([5, 6, 5], [0, 9, 1], [0, 0, 0])
+        self.failUnlessEqual(s.summary(), 0)
+        s.set(6, 1, 0)
+        self.failUnlessEqual(s.summary(), ALL_SOLID)
+
+
+class TestChunk(unittest.TestCase):
+
+    def test_empty_is_air(self):
+        c = Chunk(0, 0, 0)
+        self.failUnlessEqual(c.get_relative(3, 100, 3), (0, 0))
+        self.failUnlessEqual(c.sections, [None] * 16)
+
+    def test_change(self):
+        c = Chunk(1, 0, -1)
+        c.change(Vector(20, 70, -5), 4, 2)
+        self.failUnlessEqual(c.get_relative(4, 70, 11), (4, 2))
+        self.failUnlessEqual(c.sections[3], None)
+        self.failIfEqual(c.sections[70 >> 4], None)
+
+        b = c.get_absolute_block(Vector(20.5, 70.2, -4.5))
+        self.failUnlessEqual(b.kind, 4)
+        self.failUnlessEqual(b.metadata, 2)
+        self.failUnlessEqual(b.pos, Vector(20, 70, -5))
+
+    def test_multi_change(self):
+        c = Chunk(0, 0, 0)
+        coords = [(1 << 12) | (2 << 8) | 64, (15 << 12) | (15 << 8) | 255]
+        c.multi_change(2, coords, [1, 3], [0, 5])
+        self.failUnlessEqual(c.get_relative(1, 64, 2), (1, 0))
+        self.failUnlessEqual(c.get_relative(15, 255, 15), (3, 5))
+
+    def test_contains(self):
+        c = Chunk(-1, 0, 2)
+        self.failUnless(c.contains(Vector(-16, 0, 32)))
+        self.failIf(c.contains(Vector(0, 0, 32)))
+        self.failIf(c.contains(Vector(-1, 256, 40)))
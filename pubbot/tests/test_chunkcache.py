@@ -0,0 +1,172 @@
+from twisted.trial.unittest import TestCase
+
+from pubbot.chunk import Chunk, Section
+from pubbot.chunkcache import ChunkCache, open_cache
+from pubbot import world
+from pubbot.world import World
+from pubbot.vector import Vector
+from pubbot.tests.test_world import make_column
+
+
+def make_chunk(x, z, kinds):
+    c = Chunk(x, 0, z)
+    for sy, kind in kinds.items():
+        s = c.sections[sy] = Section()
+        s.set(0, kind, 3)
+    return c
+
+
+class TestChunkCache(TestCase):
+
+    def setUp(self):
+        self.root = self.mktemp()
+
+    def test_round_trip(self):
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        cache.write(make_chunk(-1, 40, {0: 7, 9: 1}))
+        cache.close()
+
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        sections = cache.read(-1, 40)
+        self.failUnlessEqual([sy for sy, s in sections], [0, 9])
+        self.failUnlessEqual(sections[1][1].get_kind(0), 1)
+        self.failUnlessEqual(sections[1][1].get_metadata(0), 3)
+
+        self.failUnlessEqual(cache.read(0, 40), None)
+        self.failUnlessEqual(cache.read(500, 500), None)
+
+    def test_header(self):
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        cache.write(make_chunk(0, 0, {0: 1}))
+        path = cache.regions[(0, 0)].file.name
+        cache.close()
+
+        # From some other version, so start again
+        f = open(path, "r+b")
+        f.write("PBRC\0\0\0\x09")
+        f.close()
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        self.failUnlessEqual(cache.read(0, 0), None)
+        cache.write(make_chunk(0, 0, {0: 2}))
+        cache.close()
+
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        self.failUnlessEqual(cache.read(0, 0)[0][1].get_kind(0), 2)
+        cache.close()
+
+    def test_rewrite(self):
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        cache.write(make_chunk(0, 0, {0: 1}))
+        cache.write(make_chunk(1, 0, {0: 2}))
+
+        # Grows, so has to move
+        cache.write(make_chunk(0, 0, dict((sy, 3) for sy in range(16))))
+        # Shrinks, stays put
+        cache.write(make_chunk(1, 0, {}))
+
+        self.failUnlessEqual(len(cache.read(0, 0)), 16)
+        self.failUnlessEqual(cache.read(1, 0), [])
+        self.failUnlessEqual(cache.read(0, 0)[15][1].get_kind(0), 3)
+
+    def test_keyed_by_server_and_dimension(self):
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        cache.write(make_chunk(0, 0, {0: 1}))
+        cache.close()
+
+        self.failUnlessEqual(ChunkCache(self.root, "localhost", 25565, 255).read(0, 0), None)
+        self.failUnlessEqual(ChunkCache(self.root, "example.com", 25565, 0).read(0, 0), None)
+
+    def test_missing_region_remembered(self):
+        cache = ChunkCache(self.root, "localhost", 25565, 0)
+        self.failUnlessEqual(cache.read(0, 0), None)
+        self.failUnless((0, 0) in cache.missing)
+
+        cache.write(make_chunk(0, 0, {0: 1}))
+        self.failIf((0, 0) in cache.missing)
+        self.failUnlessEqual(cache.read(0, 0)[0][1].get_kind(0), 1)
+        cache.close()
+
+    def test_shared(self):
+        first = open_cache(self.root, "localhost", 25565, 0)
+        second = open_cache(self.root, "localhost", 25565, 0)
+        self.failUnless(first is second)
+        other = open_cache(self.root, "localhost", 25565, -1)
+        self.failIf(first is other)
+        other.close()
+
+        first.write(make_chunk(0, 0, {0: 1}))
+        first.close()
+        # Still open for the other user
+        second.write(make_chunk(1, 0, {0: 2}))
+        self.failUnlessEqual(second.read(0, 0)[0][1].get_kind(0), 1)
+        second.close()
+
+        third = open_cache(self.root, "localhost", 25565, 0)
+        self.failIf(third is first)
+        self.failUnlessEqual(third.read(1, 0)[0][1].get_kind(0), 2)
+        third.close()
+
+
+class TestWorldCache(TestCase):
+
+    def test_warm_start(self):
+        root = self.mktemp()
+
+        w = World()
+        w.open_cache(ChunkCache(root, "localhost", 25565, 0))
+        primary, data = make_column({0: (7, 0)})
+        w.on_chunk(3, 3, True, primary, 0, data)
+        w.on_block_change(48, 1, 48, 20, 0)
+        w.close_cache()
+
+        w = World()
+        w.open_cache(ChunkCache(root, "localhost", 25565, 0))
+        self.failUnless(w.has_chunk(Vector(50, 0, 50)))
+        self.failUnlessEqual(w.get_block(Vector(50, 0, 50)).kind, 7)
+        self.failUnlessEqual(w.get_block(Vector(48, 1, 48)).kind, 20)
+
+        # Fresh data from the server replaces what was cached
+        primary, data = make_column({0: (1, 0)})
+        w.on_chunk(3, 3, True, primary, 0, data)
+        self.failUnlessEqual(w.get_block(Vector(48, 1, 48)).kind, 1)
+        self.failUnlessEqual(w.cache.read(3, 3)[0][1].get_kind(0), 1)
+        w.close_cache()
+
+    def test_unload(self):
+        w = World()
+        w.open_cache(ChunkCache(self.mktemp(), "localhost", 25565, 0))
+        primary, data = make_column({0: (7, 0)})
+        w.on_chunk(0, 0, True, primary, 0, data)
+
+        # Still in the cache, but the server says it is gone
+        w.unload(0, 0)
+        self.failIf(w.has_chunk(Vector(5, 0, 5)))
+        self.failUnlessEqual(w.kind_at(5, 0, 5), None)
+        self.failUnless(w.cache.read(0, 0))
+
+        w.on_chunk(0, 0, True, primary, 0, data)
+        self.failUnlessEqual(w.kind_at(5, 0, 5), 7)
+        w.close_cache()
+
+    def test_forgotten_limit(self):
+        w = World()
+        w.open_cache(ChunkCache(self.mktemp(), "localhost", 25565, 0))
+        primary, data = make_column({0: (7, 0)})
+        for cx in range(4):
+            w.on_chunk(cx, 0, True, primary, 0, data)
+
+        # Coming back from the server takes it off the list
+        w.unload(0, 0)
+        w.on_chunk(0, 0, True, primary, 0, data)
+        self.failIf(w.forgotten)
+
+        self.patch(world, "FORGOTTEN_LIMIT", 2)
+        for cx in range(4):
+            w.unload(cx, 0)
+        self.failUnlessEqual(list(w.forgotten), [(2, 0, 0), (3, 0, 0)])
+
+        # The oldest is brought back from the cache like any other
+        self.failUnlessEqual(w.kind_at(5, 0, 5), 7)
+        self.failUnlessEqual(w.kind_at(53, 0, 5), None)
+        w.close_cache()
+        self.failIf(w.forgotten)
@@ -0,0 +1,153 @@
+import zlib
+
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from construct import Container
+
+from pubbot.world import World
+from pubbot.vector import Vector
+from pubbot.tests.test_world import make_column
+
+
+class ManualThreads(object):
+
+    """ Stands in for deferToThread, running jobs only when asked """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, f, *args):
+        d = defer.Deferred()
+        self.calls.append((f, args, d))
+        return d
+
+    def run(self, i=0):
+        f, args, d = self.calls.pop(i)
+        defer.maybeDeferred(f, *args).chainDeferred(d)
+
+
+class TestDecodePool(TestCase):
+
+    def setUp(self):
+        self.world = World()
+        self.threads = ManualThreads()
+        self.world.pool.defer_to_thread = self.threads
+
+    def test_load_chunk(self):
+        primary, data = make_column({0: (7, 0), 3: (1, 2)})
+        d = self.world.load_chunk(2, -1, True, primary, 0, zlib.compress(data))
+        self.failIf(self.world.has_chunk(Vector(32, 0, -16)))
+
+        fired = []
+        d.addCallback(fired.append)
+        self.threads.run()
+
+        self.failUnlessEqual(fired, [None])
+        self.failUnlessEqual(self.world.get_block(Vector(40, 50, -10)).kind, 1)
+        self.failUnlessEqual(self.world.pool.pending(), 0)
+
+    def test_load_map_chunk_bulk(self):
+        p1, d1 = make_column({0: (7, 0)})
+        p2, d2 = make_column({15: (2, 0)})
+        metadata = [
+            Container(x=0, z=0, primary=p1, secondary=0),
+            Container(x=1, z=0, primary=p2 - 0x10000, secondary=0),
+            ]
+        self.world.load_map_chunk_bulk(2, zlib.compress(d1 + d2), metadata)
+        self.threads.run()
+
+        self.failUnlessEqual(self.world.get_block(Vector(5, 5, 5)).kind, 7)
+        self.failUnlessEqual(self.world.get_block(Vector(20, 255, 5)).kind, 2)
+
+    def test_bounded(self):
+        self.world.pool.size = 2
+        primary, data = make_column({0: (7, 0)})
+        for x in range(5):
+            self.world.load_chunk(x, 0, True, primary, 0, zlib.compress(data))
+        self.failUnlessEqual(len(self.threads.calls), 2)
+        self.failUnlessEqual(self.world.pool.pending(), 5)
+
+        self.threads.run()
+        self.failUnlessEqual(len(self.threads.calls), 2)
+        self.failUnlessEqual(self.world.pool.pending(), 4)
+
+    def test_nearest_first(self):
+        self.world.pool.size = 1
+        self.world.pool.origin = lambda: Vector(100, 64, 100)
+
+        primary, data = make_column({0: (7, 0)})
+        self.world.load_chunk(50, 50, True, primary, 0, zlib.compress(data))
+        for x in (-10, 6, 20):
+            self.world.load_chunk(x, 6, True, primary, 0, zlib.compress(data))
+
+        order = []
+        while self.threads.calls:
+            before = set(self.world.chunks)
+            self.threads.run()
+            order.extend(set(self.world.chunks) - before)
+        self.failUnlessEqual(order, [(50, 0, 50), (6, 0, 6), (20, 0, 6), (-10, 0, 6)])
+
+    def test_nearest_after_moving(self):
+        self.world.pool.size = 1
+        pos = [Vector(100, 64, 100)]
+        self.world.pool.origin = lambda: pos[0]
+
+        primary, data = make_column({0: (7, 0)})
+        self.world.load_chunk(50, 50, True, primary, 0, zlib.compress(data))
+        for x in (-10, 6, 20):
+            self.world.load_chunk(x, 6, True, primary, 0, zlib.compress(data))
+
+        # Queued while near (6, 6), but the bot has gone west since
+        pos[0] = Vector(-150, 64, 100)
+        order = []
+        while self.threads.calls:
+            before = set(self.world.chunks)
+            self.threads.run()
+            order.extend(set(self.world.chunks) - before)
+        self.failUnlessEqual(order, [(50, 0, 50), (-10, 0, 6), (6, 0, 6), (20, 0, 6)])
+
+    def test_updates_stored_in_order(self):
+        primary, data = make_column({0: (7, 0), 1: (1, 0)})
+        self.world.load_chunk(0, 0, True, primary, 0, zlib.compress(data))
+        primary, data = make_column({1: (3, 0)}, continuous=False)
+        self.world.load_chunk(0, 0, False, primary, 0, zlib.compress(data))
+
+        # The partial update finishes first but has to wait for the full one
+        self.threads.run(1)
+        self.failIf(self.world.has_chunk(Vector(0, 0, 0)))
+
+        self.threads.run()
+        self.failUnlessEqual(self.world.get_block(Vector(0, 0, 0)).kind, 7)
+        self.failUnlessEqual(self.world.get_block(Vector(0, 16, 0)).kind, 3)
+
+    def test_bad_payload(self):
+        d = self.world.load_chunk(0, 0, True, 1, 0, "not zlib")
+        self.threads.run()
+        self.failUnlessEqual(self.world.pool.failed, 1)
+        return self.assertFailure(d, zlib.error)
+
+    def test_changes_wait_for_decode(self):
+        primary, data = make_column({0: (7, 0)})
+        self.world.load_chunk(0, 0, True, primary, 0, zlib.compress(data))
+
+        # Arrives after the chunk, so must survive it being stored
+        self.world.on_block_change(1, 1, 1, 20, 0)
+        self.world.on_multi_block_change(0, 0, 1, [(2 << 12) | (2 << 8) | 2], [4], [0])
+        self.failUnlessEqual(len(self.world.pending), 2)
+
+        self.threads.run()
+        self.failUnlessEqual(self.world.get_block(Vector(1, 1, 1)).kind, 20)
+        self.failUnlessEqual(self.world.get_block(Vector(2, 2, 2)).kind, 4)
+        self.failUnlessEqual(self.world.get_block(Vector(3, 3, 3)).kind, 7)
+        self.failUnlessEqual(self.world.pending.replayed, 2)
+
+    def test_changes_before_chunk_are_stale(self):
+        self.world.on_block_change(1, 1, 1, 20, 0)
+
+        primary, data = make_column({0: (7, 0)})
+        self.world.load_chunk(0, 0, True, primary, 0, zlib.compress(data))
+        self.threads.run()
+
+        self.failUnlessEqual(self.world.get_block(Vector(1, 1, 1)).kind, 7)
+        self.failUnlessEqual(self.world.pending.stale, 1)
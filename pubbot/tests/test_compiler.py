@@ -0,0 +1,101 @@
+import unittest
+
+from construct import Container
+
+from pubbot.compiler import Incomplete
+from pubbot.packets import packets, packets_by_name, decoders, encoders, skippers, Metadata
+
+
+def slot(id, count=1, info=0, data=None):
+    if id < 0:
+        return Container(id=id)
+    if data is None:
+        return Container(id=id, count=count, info=info, size=-1, data=None)
+    return Container(id=id, count=count, info=info, size=len(data), data=data)
+
+
+samples = [
+    ("ping", dict(pid=12345)),
+    ("login", dict(eid=1, level_type=u"default", mode=0, dimension=0, difficulty=1, notused=0, max_players=20)),
+    ("chat", dict(message=u"hello \u2603")),
+    ("location", dict(
+        position=Container(x=1.5, y=64.0, stance=65.62, z=-7.25),
+        orientation=Container(rotation=90.0, pitch=-10.0),
+        grounded=Container(grounded=1),
+        )),
+    ("digging", dict(state="started", x=-5, y=64, z=10, face="+y")),
+    ("spawn-vehicle", dict(eid=1, type=60, x=1, y=2, z=3, thrower=0)),
+    ("spawn-vehicle", dict(eid=1, type=60, x=1, y=2, z=3, thrower=9, dx=1, dy=2, dz=3)),
+    ("spawn-named-entity", dict(eid=1, username=u"jc2k", x=1, y=2, z=3, yaw=4, pitch=5, item=0,
+        metadata={0: ("byte", 0), 1: ("short", 300), 8: ("int", 7)})),
+    ("entity-metadata", dict(eid=1, metadata={
+        0: ("float", 0.5),
+        2: ("string", u"name"),
+        10: ("slot", Container(primary=1, count=2, secondary=3)),
+        17: ("coords", Container(x=1, y=2, z=3)),
+        })),
+    ("entity-destroy", dict(count=3, eids=[1, 2, 3])),
+    ("chunk", dict(x=1, z=-1, continuous=True, primary=1, secondary=0, data="\x01" * 5000)),
+    ("block-batch-change", dict(x=1, z=2, record_count=1, data="\x12\x40\x00\x41")),
+    ("map-chunk-bulk", dict(count=2, data="\x00" * 300, metadata=[
+        Container(x=0, z=0, primary=1, secondary=0),
+        Container(x=0, z=1, primary=-1, secondary=0),
+        ])),
+    ("explosion", dict(x=1.0, y=2.0, z=3.0, radius=4.0, count=2,
+        records="\x01\xff\x00\x00\x00\x01",
+        unknown1=0.0, unknown2=0.0, unknown3=0.0)),
+    ("set-window-items", dict(wid=0, count=3, **{"slot": [slot(-1), slot(1, 64, 0), slot(276, 1, 3, [1, -2, 3])]})),
+    ("update-tile-entity", dict(x=1, y=2, z=3, action=1, size=2, data=[1, -1])),
+    ("player-abilities", dict(flags=Container(is_god=True, is_flying=False, can_fly=True, is_creative=False),
+        walking_speed=12, flying_speed=25)),
+    ("encryption-key-request", dict(server_id=u"-", public_key="key", verify_token="token")),
+]
+
+
+class TestCompiledPackets(unittest.TestCase):
+
+    def test_samples(self):
+        for name, fields in samples:
+            header = packets_by_name[name]
+            con = packets[header]
+            container = Container(**fields)
+
+            expected = con.build(container)
+            out = []
+            encoders[header](container, container, out)
+            self.failUnlessEqual("".join(out), expected, name)
+
+            payload, end = decoders[header](expected, 0, None)
+            self.failUnlessEqual(end, len(expected), name)
+            self.failUnlessEqual(payload, con.parse(expected), name)
+
+            # Compiled decoders work straight out of a receive buffer too
+            buf = bytearray("\xff" + expected)
+            self.failUnlessEqual(decoders[header](buf, 1, None)[0], payload, name)
+
+    def test_incomplete(self):
+        for name, fields in samples:
+            header = packets_by_name[name]
+            data = packets[header].build(Container(**fields))
+            for i in range(len(data)):
+                try:
+                    decoders[header](data[:i], 0, None)
+                except Incomplete, e:
+                    self.failUnless(i < e.wanted <= len(data), name)
+                else:
+                    self.fail("%s parsed from %d of %d bytes" % (name, i, len(data)))
+
+    def test_metadata_values(self):
+        header = packets_by_name["entity-metadata"]
+        data = packets[header].build(Container(eid=1, metadata={3: ("short", 7), 4: ("string", u"x")}))
+        payload, end = decoders[header](data, 0, None)
+        self.failUnlessEqual(payload.metadata[3], Metadata("short", 7))
+        self.failUnlessEqual(payload.metadata[4], Metadata("string", u"x"))
+
+    def test_skip(self):
+        for name, fields in samples:
+            header = packets_by_name[name]
+            data = packets[header].build(Container(**fields))
+            self.failUnlessEqual(skippers[header](data, 0, None), len(data), name)
+            for i in range(len(data)):
+                self.failUnlessRaises(Incomplete, skippers[header], data[:i], 0, None)
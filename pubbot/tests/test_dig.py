@@ -0,0 +1,93 @@
+import unittest
+
+from pubbot import astar
+from pubbot.dig import DigCosts, frames
+from pubbot.vector import Vector, BlockPos, pack
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
+
+
+class TestDigCosts(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+        self.start, self.goal = Vector(1, 64, 1), Vector(12, 64, 1)
+
+    def wall(self, kind, x=6, low=64, high=100):
+        for z in range(16):
+            for y in range(low, high):
+                self.world.on_block_change(x, y, z, kind, 0)
+
+    def test_open_ground(self):
+        # Nothing in the way, so the same as walking
+        search = astar.begin(self.world, self.start, [self.goal], mode="dig")
+        route = search.run()
+        self.failUnlessEqual(len(route), 11)
+        self.failIf(any(breaks for pos, breaks in search.digging.annotate(route)))
+
+    def test_through_wall(self):
+        # Without digging that's a climb over the top
+        self.wall(1)
+        self.failUnless(len(astar.path(self.world, self.start, [self.goal])) > 70)
+
+        search = astar.begin(self.world, self.start, [self.goal], mode="dig")
+        route = search.run()
+        self.failUnlessEqual(len(route), 11)
+
+        annotated = search.digging.annotate(route)
+        broken = [(pos, breaks) for pos, breaks in annotated if breaks]
+        self.failUnlessEqual(broken, [(BlockPos(6, 64, 1), [BlockPos(6, 64, 1), BlockPos(6, 65, 1)])])
+
+    def test_path(self):
+        self.wall(1)
+        route = astar.path(self.world, self.start, [self.goal], mode="dig")
+        self.failUnlessEqual(route[0], (BlockPos(2, 64, 1), []))
+        self.failUnlessEqual(route[4], (BlockPos(6, 64, 1), [BlockPos(6, 64, 1), BlockPos(6, 65, 1)]))
+
+    def test_around_hard_block(self):
+        # Obsidian takes longer to break than walking round it
+        for y in (64, 65):
+            self.world.on_block_change(6, y, 1, 49, 0)
+
+        search = astar.begin(self.world, self.start, [self.goal], mode="dig")
+        route = search.run()
+        self.failIf(BlockPos(6, 64, 1) in route)
+        self.failIf(any(breaks for pos, breaks in search.digging.annotate(route)))
+
+    def test_cost(self):
+        costs = DigCosts(self.world)
+        node = pack(1, 64, 1)
+        self.world.on_block_change(2, 65, 1, 3, 0)
+        moves = dict((child, steps) for child, steps in costs.successors(node))
+        child = pack(2, 64, 1)
+        self.failUnlessEqual(costs.cost(node, child, moves[child]), 1 + frames[3])
+
+    def test_shared_block_counted_once(self):
+        # Stepping over and down, the block at x=2, y=64 is head room for the
+        # landing and in the way of the step over
+        costs = DigCosts(self.world)
+        node = pack(1, 64, 1)
+        self.world.on_block_change(2, 64, 1, 3, 0)
+        moves = dict((child, steps) for child, steps in costs.successors(node))
+        child = pack(2, 63, 1)
+        self.failUnlessEqual(costs.cost(node, child, moves[child]), 2 + frames[3] + frames[1])
+
+    def test_excluded(self):
+        # Bedrock can't be broken, and digging into water would flood
+        self.world.on_block_change(2, 65, 1, 7, 0)
+        self.world.on_block_change(1, 65, 2, 9, 0)
+
+        costs = DigCosts(self.world)
+        children = [child for child, steps in costs.successors(pack(1, 64, 1))]
+        self.failIf(pack(2, 64, 1) in children)
+        self.failIf(pack(1, 64, 2) in children)
+        self.failUnless(pack(0, 64, 1) in children)
+
+        # Nor is digging into columns that aren't loaded
+        self.failIf(pack(-1, 64, 0) in [child for child, steps in costs.successors(pack(0, 64, 0))])
+
+    def test_unbreakable_goal(self):
+        self.world.on_block_change(12, 64, 1, 7, 0)
+        self.failUnlessEqual(astar.begin(self.world, self.start, [self.goal], mode="dig"), None)
@@ -0,0 +1,99 @@
+import unittest
+
+from pubbot import astar
+from pubbot.dstar import begin
+from pubbot.vector import BlockPos
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
+
+
+class TestDStarLite(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+
+        self.start, self.goal = BlockPos(1, 64, 1), BlockPos(12, 64, 1)
+        self.search = begin(self.world, self.start, self.goal)
+        self.search.step()
+
+    def change(self, *positions):
+        for x, y, z in positions:
+            self.world.on_block_change(x, y, z, 1, 0)
+        return self.search.changed(positions)
+
+    def check_route(self, start, route):
+        self.failUnlessEqual(route[-1], self.goal)
+        for a, b in zip([start] + route, route):
+            self.failUnlessEqual((b - a).manhattan_length(), 1)
+            self.failUnless(self.world.allowed(b))
+
+    def test_route(self):
+        route = self.search.route
+        self.failUnlessEqual(len(route), len(astar.path(self.world, self.start, [self.goal])))
+        self.check_route(self.start, route)
+
+    def test_wall(self):
+        self.failUnless(self.change(*[(6, y, z) for z in range(16) for y in (64, 65)]))
+        self.failUnless(self.search.step())
+
+        route = self.search.route
+        self.check_route(self.start, route)
+        self.failUnlessEqual(len(route), len(astar.path(self.world, self.start, [self.goal])))
+
+    def test_repair_is_local(self):
+        self.goal = BlockPos(14, 64, 12)
+        self.search = begin(self.world, self.start, self.goal)
+        self.search.step()
+        expanded = self.search.expanded
+
+        # Something appears right in front of the bot
+        self.failUnless(self.change((2, 64, 1), (2, 65, 1)))
+        self.failUnless(self.search.step())
+        self.check_route(self.start, self.search.route)
+
+        fresh = begin(self.world, self.start, self.goal)
+        fresh.step()
+        self.failUnlessEqual(len(fresh.route), len(self.search.route))
+        self.failUnless(self.search.expanded - expanded < fresh.expanded // 10)
+
+    def test_unrelated_change(self):
+        expanded = self.search.expanded
+        self.failIf(self.change((3, 80, 14)))
+        self.failUnless(self.search.step())
+        self.failUnlessEqual(self.search.expanded, expanded)
+
+    def test_move_along(self):
+        route = self.search.route
+        self.search.move(route[4])
+        self.search.step()
+        self.failUnlessEqual(self.search.route, route[5:])
+
+        self.change(*[(9, y, z) for z in range(16) for y in (64, 65)])
+        self.search.step()
+        self.check_route(route[4], self.search.route)
+
+    def test_blocked(self):
+        for y in (64, 65, 66):
+            for x, z in ((11, 1), (13, 1), (12, 0), (12, 2)):
+                self.change((x, y, z))
+        self.change((12, 66, 1))
+        self.search.limit = 5000
+        self.search.step()
+        self.failUnlessEqual(self.search.route, None)
+
+    def test_column_changed(self):
+        # Never looked at
+        self.failIf(self.search.column_changed(5, 5, None))
+
+        # Stored again with a wall across the way
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+        for z in range(16):
+            for y in (64, 65):
+                self.world.on_block_change(6, y, z, 1, 0)
+        self.failUnless(self.search.column_changed(0, 0, None))
+        self.failUnless(self.search.step())
+        self.check_route(self.start, self.search.route)
+        self.failUnless(max(p.y for p in self.search.route) >= 66)
@@ -0,0 +1,114 @@
+import unittest
+
+from pubbot import astar
+from pubbot.flowfield import FlowField
+from pubbot.vector import Vector, BlockPos, unpack
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
+
+
+class TestFlowField(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+        self.target = Vector(12, 64, 12)
+
+    def follow(self, field, pos):
+        """ Walk down the field from pos, returning the points moved through """
+        route = []
+        while True:
+            points = field.next(pos)
+            if not points:
+                return route
+            route.extend(points)
+            pos = points[-1]
+
+    def test_distances(self):
+        field = self.world.flow_field("bob", self.target)
+        self.failUnless(field.step())
+
+        self.failUnlessEqual(field.distance(self.target), 0)
+        self.failUnlessEqual(field.next(self.target), [])
+        self.failUnlessEqual(field.distance(Vector(1, 64, 1)), 22)
+
+        # The same length as searching for it
+        route = self.follow(field, Vector(1, 64, 1))
+        self.failUnlessEqual(route[-1], BlockPos(12, 64, 12))
+        self.failUnlessEqual(len(route), len(astar.path(self.world, Vector(1, 64, 1), [self.target])))
+
+        # Outside the column, so not in the field
+        self.failUnlessEqual(field.next(Vector(20, 64, 1)), None)
+
+    def test_shared(self):
+        field = self.world.flow_field("bob", self.target)
+        self.failUnless(self.world.flow_field("bob", self.target) is field)
+        self.failIf(self.world.flow_field("alice", self.target) is field)
+
+        self.world.forget_field("bob")
+        self.failIf(field.column_changed in self.world.watchers)
+
+    def test_slack(self):
+        field = self.world.flow_field("bob", self.target)
+        field.step()
+
+        # A couple of steps doesn't need a new field
+        self.world.flow_field("bob", Vector(12, 64, 10))
+        self.failUnlessEqual(field.builds, 1)
+        self.failUnless(field.step())
+
+        # Further does, and the old one is used until it's built
+        self.world.flow_field("bob", Vector(4, 64, 4))
+        self.failUnlessEqual(field.builds, 2)
+        self.failIf(field.step(nodes=10))
+        self.failUnlessEqual(field.distance(self.target), 0)
+
+        self.failUnless(field.step())
+        self.failUnlessEqual(field.distance(Vector(4, 64, 4)), 0)
+
+    def test_sliced(self):
+        field = FlowField(self.world, self.target)
+        slices = 1
+        while not field.step(nodes=100):
+            self.failIf(field.ready)
+            slices += 1
+        self.failUnless(slices > 1)
+        self.failUnlessEqual(field.distance(Vector(1, 64, 1)), 22)
+
+    def test_block_changes(self):
+        field = self.world.flow_field("bob", self.target)
+        field.step()
+
+        # Somewhere the field never went doesn't matter
+        self.world.on_block_change(5, 10, 5, 0, 0)
+        self.failIf(field.stale)
+
+        # A wall across the column does
+        for x in range(16):
+            for y in (64, 65):
+                self.world.on_block_change(x, y, 8, 1, 0)
+        self.failUnless(field.stale)
+
+        self.world.flow_field("bob", self.target)
+        self.failUnlessEqual(field.builds, 2)
+        field.step()
+        self.failUnlessEqual(field.distance(Vector(12, 64, 6)), 10)
+
+    def test_pruned(self):
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        for cx in range(1, 5):
+            self.world.on_chunk(cx, 0, True, primary, 0, data)
+        field = self.world.flow_field("bob", self.target)
+        field.step()
+        self.failUnless(field.open)
+
+        # Far enough that nothing looked up before is any use
+        self.world.flow_field("bob", Vector(76, 64, 12))
+        self.failUnlessEqual(field.open, {})
+        self.failUnlessEqual(field.columns, {})
+
+        field.step()
+        for node in field.open:
+            x, y, z = unpack(node)
+            self.failUnless(abs(x - 76) + abs(y - 64) + abs(z - 12) <= field.radius)
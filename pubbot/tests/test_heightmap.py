@@ -0,0 +1,91 @@
+import unittest
+
+from mock import Mock
+
+from pubbot import activity
+from pubbot.heightmap import Heightmap
+from pubbot.vector import Vector
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
+
+
+class TestHeightmap(unittest.TestCase):
+
+    def setUp(self):
+        # Stone up to y=64, and nothing above
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+        self.world.on_chunk(1, 0, True, primary, 0, data)
+
+    def heights(self, x, z):
+        heightmap = self.world.heights.get(x >> 4, z >> 4)
+        i = ((z & 15) << 4) | (x & 15)
+        return heightmap.solid[i], heightmap.non_air[i], heightmap.liquid[i]
+
+    def test_built(self):
+        self.failUnlessEqual(self.heights(3, 3), (63, 63, -1))
+        self.failUnlessEqual(self.world.heights.built, 2)
+        self.failUnlessEqual(self.world.surface(20, 5), 63)
+        self.failUnlessEqual(self.world.surface(40, 5), None)
+
+    def test_empty(self):
+        self.failUnlessEqual(Heightmap([None] * 16).solid[0], -1)
+
+    def test_patched(self):
+        # A pillar, a pond and a torch
+        self.world.on_block_change(3, 64, 3, 1, 0)
+        self.world.on_block_change(3, 65, 3, 1, 0)
+        self.world.on_block_change(5, 63, 5, 9, 0)
+        self.world.on_block_change(7, 64, 7, 50, 0)
+        self.failUnlessEqual(self.heights(3, 3), (65, 65, -1))
+        self.failUnlessEqual(self.heights(5, 5), (62, 63, 63))
+        self.failUnlessEqual(self.heights(7, 7), (64, 64, -1))
+
+        # Knocked down, and dug out
+        self.world.on_block_change(3, 65, 3, 0, 0)
+        self.world.on_block_change(5, 63, 5, 0, 0)
+        self.world.on_block_change(5, 62, 5, 0, 0)
+        self.failUnlessEqual(self.heights(3, 3), (64, 64, -1))
+        self.failUnlessEqual(self.heights(5, 5), (61, 61, -1))
+        self.failUnlessEqual(self.world.heights.built, 2)
+
+    def test_matches_scan(self):
+        self.world.on_block_change(9, 100, 2, 1, 0)
+        self.world.on_block_change(9, 120, 2, 8, 0)
+        for x in range(16):
+            for z in range(16):
+                y = 255
+                while y >= 0 and not self.world.get_block(Vector(x, y, z)).solid:
+                    y -= 1
+                self.failUnlessEqual(self.world.surface(x, z), y)
+
+    def test_unload(self):
+        self.world.surface(3, 3)
+        self.world.unload(0, 0)
+        self.failUnlessEqual(self.world.surface(3, 3), None)
+
+    def test_landing(self):
+        self.failUnlessEqual(self.world.landing(3, 3), 64)
+        self.world.on_block_change(5, 64, 5, 9, 0)
+        self.failUnlessEqual(self.world.landing(5, 5), None)
+        self.failUnlessEqual(self.world.landing(40, 5), None)
+
+    def test_cruise_height(self):
+        self.failUnlessEqual(self.world.cruise_height(Vector(1, 64, 1), Vector(30, 64, 10)), 66)
+
+        # A tower on the way
+        for y in range(64, 80):
+            self.world.on_block_change(20, y, 7, 1, 0)
+        self.failUnlessEqual(self.world.cruise_height(Vector(1, 64, 1), Vector(30, 64, 10)), 82)
+        self.failUnlessEqual(self.world.cruise_height(Vector(1, 64, 1), Vector(30, 64, 1)), 66)
+
+        # Off the edge of what's loaded
+        self.failUnlessEqual(self.world.cruise_height(Vector(1, 64, 1), Vector(40, 64, 1)), None)
+
+    def test_flyto(self):
+        bot = Mock()
+        bot.pos = Vector(1.5, 64, 1.5)
+        bot.protocol.world = self.world
+        acts = activity.flyto(bot, Vector(30.5, 64, 1.5))
+        self.failUnlessEqual([a.pos.y for a in acts[:3]], [66, 66, 64])
@@ -0,0 +1,67 @@
+import unittest
+
+from pubbot.vector import Vector, BlockPos
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
+
+
+class TestKindIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Stone up to y=64, across four columns
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        for cx in (0, 1):
+            for cz in (0, 1):
+                self.world.on_chunk(cx, cz, True, primary, 0, data)
+        self.kinds = self.world.kinds
+
+        # Some gold ore, and a dirt block
+        for pos in ((3, 20, 3), (4, 20, 3), (25, 40, 25), (30, 62, 2)):
+            self.world.on_block_change(pos[0], pos[1], pos[2], 0x0E, 0)
+        self.world.on_block_change(20, 10, 20, 3, 0)
+
+    def test_histogram(self):
+        self.kinds.refresh()
+        self.failUnlessEqual(self.kinds.histograms[(0, 1, 0)], {1: 4094, 0x0E: 2})
+        self.failUnlessEqual(self.kinds.histograms[(1, 0, 1)], {1: 4095, 3: 1})
+        self.failUnlessEqual(sorted(self.kinds.holding[0x0E]), [(0, 1, 0), (1, 2, 1), (1, 3, 0)])
+
+    def test_find_nearest(self):
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(1, 30, 1)), BlockPos(3, 20, 3))
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(1, 64, 1)), BlockPos(30, 62, 2))
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(30, 64, 2)), BlockPos(30, 62, 2))
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(30, 64, 30)), BlockPos(25, 40, 25))
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(1, 64, 1), radius=20), None)
+
+        # Not an interesting kind, so found by scanning its one section
+        self.failUnlessEqual(self.world.find_nearest(3, Vector(1, 64, 1)), BlockPos(20, 10, 20))
+        self.failUnlessEqual(self.kinds.scanned, 1)
+
+        # Nothing to find
+        self.failUnlessEqual(self.world.find_nearest(0x38, Vector(1, 64, 1)), None)
+
+    def test_count(self):
+        self.failUnlessEqual(self.world.count(0x0E, (BlockPos(0, 0, 0), BlockPos(31, 255, 31))), 4)
+        self.failUnlessEqual(self.world.count(0x0E, (BlockPos(0, 0, 0), BlockPos(3, 30, 3))), 1)
+        self.failUnlessEqual(self.world.count(0x0E, (BlockPos(31, 255, 31), BlockPos(16, 0, 0))), 2)
+        self.failUnlessEqual(self.world.count(1, (BlockPos(0, 0, 0), BlockPos(15, 15, 15))), 4096)
+        self.failUnlessEqual(self.world.count(1, (BlockPos(0, 16, 0), BlockPos(15, 31, 15))), 4094)
+
+    def test_changes(self):
+        self.world.find_nearest(0x0E, Vector(1, 30, 1))
+        indexed = self.kinds.indexed
+
+        # Mined out
+        self.world.on_block_change(3, 20, 3, 0, 0)
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(1, 30, 1)), BlockPos(4, 20, 3))
+        self.failUnlessEqual(self.kinds.indexed, indexed + 1)
+
+        # Placed
+        self.world.on_block_change(1, 35, 1, 0x0E, 0)
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(1, 30, 1)), BlockPos(1, 35, 1))
+
+    def test_unload(self):
+        self.world.unload(0, 0)
+        self.failUnlessEqual(self.world.find_nearest(0x0E, Vector(1, 30, 1)), BlockPos(25, 40, 25))
+        self.failIf((0, 1, 0) in self.kinds.histograms)
@@ -0,0 +1,112 @@
+import unittest
+
+from pubbot.navgraph import ChunkGraph, X_BORDER, Z_BORDER, column_of
+from pubbot.vector import Vector, BlockPos, pack, unpack
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
+
+
+class TestChunkGraph(unittest.TestCase):
+
+    def setUp(self):
+        # A flat stone floor five columns long, standing height y=64
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        for cx in range(5):
+            self.world.on_chunk(cx, 0, True, primary, 0, data)
+        self.graph = self.world.graph
+
+    def test_column_of(self):
+        self.failUnlessEqual(column_of(pack(-1, 64, 16)), (-1, 1))
+        self.failUnlessEqual(column_of(pack(31, 0, -17)), (1, -2))
+
+    def test_border(self):
+        entrances = self.graph.border(0, 0, X_BORDER)
+        self.failUnlessEqual(len(entrances), 1)
+        near, far = [unpack(key) for key in entrances[0]]
+        self.failUnlessEqual(near.x, 15)
+        self.failUnlessEqual(far.x, 16)
+        self.failUnlessEqual(near.y, 64)
+        self.failUnlessEqual(near.z, far.z)
+
+        # No neighbour loaded to the south
+        self.failUnlessEqual(self.graph.border(0, 0, Z_BORDER), [])
+
+    def test_wall_splits_border(self):
+        # A wall up the middle of the border leaves two patches
+        for y in range(64, 256):
+            self.world.on_block_change(15, y, 8, 1, 0)
+        self.failUnlessEqual(len(self.graph.border(0, 0, X_BORDER)), 2)
+
+    def test_plan(self):
+        start, goal = BlockPos(1, 64, 1), BlockPos(75, 64, 1)
+        route = self.graph.plan(start, goal)
+        self.failUnlessEqual(route[-1], goal)
+
+        # Waypoints cross each border in turn
+        crossings = [p.x for p in route[:-1]]
+        self.failUnlessEqual(crossings, [15, 16, 31, 32, 47, 48, 63, 64])
+
+        waypoint = self.graph.next_waypoint(Vector(1.5, 64, 1.5), goal)
+        self.failUnless((waypoint - start).manhattan_length() <= 64)
+        self.failUnlessEqual(waypoint.x, 48)
+
+    def test_same_column(self):
+        self.failUnlessEqual(self.graph.plan(BlockPos(1, 64, 1), BlockPos(9, 64, 9)), [BlockPos(9, 64, 9)])
+
+    def test_missing_column(self):
+        self.world.unload(2, 0)
+        self.failUnlessEqual(self.graph.plan(BlockPos(1, 64, 1), BlockPos(75, 64, 1)), None)
+
+    def test_invalidate(self):
+        self.graph.plan(BlockPos(1, 64, 1), BlockPos(75, 64, 1))
+        self.failUnless((1, 0) in self.graph.edges)
+        self.failUnless((1, 0, X_BORDER) in self.graph.borders)
+
+        # Up in the air, nothing depends on it
+        self.world.on_block_change(20, 70, 3, 1, 0)
+        self.failUnless((1, 0) in self.graph.edges)
+        self.failUnless((0, 0) in self.graph.edges)
+
+        # On a border, but the entrances stay where they were
+        self.world.on_block_change(31, 200, 3, 1, 0)
+        self.failUnless((1, 0) in self.graph.edges)
+        self.failUnless((2, 0) in self.graph.edges)
+
+        # On the local route across column 1
+        self.world.on_block_change(20, 64, 7, 1, 0)
+        self.failIf((1, 0) in self.graph.edges)
+        self.failUnless((0, 0) in self.graph.edges)
+        self.failUnless((2, 0) in self.graph.edges)
+
+        # Moves the entrance between columns 2 and 3
+        self.world.on_block_change(47, 64, 7, 1, 0)
+        self.failIf((2, 0) in self.graph.edges)
+        self.failIf((3, 0) in self.graph.edges)
+        self.failUnless((4, 0) in self.graph.edges)
+
+        # A whole column
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(4, 0, True, primary, 0, data)
+        self.failIf((4, 0) in self.graph.edges)
+        self.failIf((3, 0, X_BORDER) in self.graph.borders)
+
+    def test_slices(self):
+        start, goal = BlockPos(1, 64, 1), BlockPos(75, 64, 1)
+        plan = self.graph.begin(start, goal)
+        steps = 1
+        while not plan.step(nodes=20):
+            steps += 1
+        self.failUnless(steps > 1)
+        self.failUnlessEqual(plan.slices, steps)
+        self.failUnlessEqual(plan.route, ChunkGraph(self.world).plan(start, goal))
+        self.failUnlessEqual(plan.waypoint(Vector(1.5, 64, 1.5)).x, 48)
+
+    def test_changed_while_linking(self):
+        plan = self.graph.begin(BlockPos(1, 64, 1), BlockPos(75, 64, 1))
+        plan.step(nodes=1)
+        self.failUnless(plan.search is not None)
+        self.world.unload(0, 0)
+        plan.step()
+        # The plan carries on with what it had, but doesn't keep it
+        self.failIf((0, 0) in self.graph.edges)
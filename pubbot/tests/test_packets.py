@@ -0,0 +1,77 @@
+import os, unittest
+
+from construct import Container
+
+from pubbot import packets
+from pubbot.packets import PacketBuffer, LazyPacket, make_packet
+
+
+class TestPacketBuffer(unittest.TestCase):
+
+    def test_byte_at_a_time(self):
+        data = make_packet("ping", pid=5) + make_packet("chat", message=u"hello")
+        b = PacketBuffer()
+        received = []
+        for c in data:
+            b.feed(c)
+            received.extend(b)
+
+        self.failUnlessEqual([h for h, p in received], [0, 3])
+        self.failUnlessEqual(received[0][1].pid, 5)
+        self.failUnlessEqual(received[1][1].message, u"hello")
+        self.failUnlessEqual(b.pending(), 0)
+
+    def test_waits_for_whole_chunk(self):
+        # Random data so it doesn't compress away to nothing
+        payload = os.urandom(5000)
+        data = make_packet("chunk", x=1, z=2, continuous=True, primary=1, secondary=0, data=payload)
+        b = PacketBuffer()
+        b.feed(data[:100])
+        self.failUnlessEqual(list(b), [])
+
+        # The length prefix has been seen, so we know how much to wait for
+        self.failUnlessEqual(b.wanted, len(data))
+
+        b.feed(data[100:-1])
+        self.failUnlessEqual(list(b), [])
+        b.feed(data[-1:])
+
+        packets = list(b)
+        self.failUnlessEqual(len(packets), 1)
+        self.failUnlessEqual(packets[0][1].data, payload)
+
+    def test_transform_tail(self):
+        def rot(data, n):
+            return "".join(chr((ord(c) + n) % 256) for c in data)
+
+        b = PacketBuffer()
+        b.feed(make_packet("ping", pid=1) + rot(make_packet("ping", pid=2), 1))
+        it = iter(b)
+        self.failUnlessEqual(it.next()[1].pid, 1)
+        b.transform(lambda data: rot(data, -1))
+        self.failUnlessEqual(it.next()[1].pid, 2)
+
+    def test_unhandled_packets_are_lazy(self):
+        b = PacketBuffer(handled=set([0]))
+        b.feed(make_packet("chat", message=u"hello") + make_packet("ping", pid=3))
+        (chat_id, chat), (ping_id, ping) = list(b)
+
+        self.failUnless(isinstance(chat, LazyPacket))
+        self.failIf(isinstance(ping, LazyPacket))
+        self.failUnlessEqual(chat._payload, None)
+        self.failUnlessEqual(chat.message, u"hello")
+        self.failUnlessEqual(ping.pid, 3)
+
+
+class TestLocationPackets(unittest.TestCase):
+
+    def test_matches_make_packet(self):
+        p = Container(x=1.5, y=64.0, stance=65.62, z=-7.25)
+        o = Container(rotation=90.0, pitch=-10.0)
+        g = Container(grounded=1)
+
+        self.failUnlessEqual(packets.make_grounded_packet(1), make_packet("grounded", g))
+        self.failUnlessEqual(packets.make_position_packet(1.5, 64.0, 65.62, -7.25, 1), make_packet("position", position=p, grounded=g))
+        self.failUnlessEqual(packets.make_orientation_packet(90.0, -10.0, 1), make_packet("orientation", orientation=o, grounded=g))
+        self.failUnlessEqual(packets.make_location_packet(1.5, 64.0, 65.62, -7.25, 90.0, -10.0, 1),
+            make_packet("location", position=p, orientation=o, grounded=g))
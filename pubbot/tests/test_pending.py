@@ -0,0 +1,47 @@
+import unittest
+
+from pubbot.pending import PendingChanges
+
+
+class TestPendingChanges(unittest.TestCase):
+
+    def test_coalesce(self):
+        p = PendingChanges()
+        p.add("k", 1, 1, 2, 3, 4, 0)
+        p.add("k", 2, 1, 2, 3, 5, 1)
+        self.failUnlessEqual(len(p), 1)
+        self.failUnlessEqual((p.queued, p.coalesced), (1, 1))
+        self.failUnlessEqual(p.take("k", 0), [(1, 2, 3, 5, 1)])
+        self.failIf("k" in p)
+
+    def test_replay_order(self):
+        p = PendingChanges()
+        p.add("k", 5, 0, 0, 0, 1, 0)
+        p.add("k", 3, 1, 0, 0, 2, 0)
+        p.add("k", 4, 2, 0, 0, 3, 0)
+        self.failUnlessEqual([c[0] for c in p.take("k", 0)], [1, 2, 0])
+
+    def test_stale(self):
+        p = PendingChanges()
+        p.add("k", 1, 0, 0, 0, 1, 0)
+        p.add("k", 1, 0, 40, 0, 1, 0)
+        p.add("k", 3, 1, 0, 0, 2, 0)
+
+        # A partial update to section 0 only supersedes changes in section 0
+        self.failUnlessEqual(p.take("k", 2, covered=set([0])), [(0, 40, 0, 1, 0), (1, 0, 0, 2, 0)])
+        self.failUnlessEqual(p.stale, 1)
+
+    def test_wait_for_next_payload(self):
+        p = PendingChanges()
+        p.add("k", 2, 0, 0, 0, 1, 0)
+        p.add("k", 4, 1, 0, 0, 2, 0)
+        self.failUnlessEqual(p.take("k", 1, before=3), [(0, 0, 0, 1, 0)])
+        self.failUnless("k" in p)
+
+    def test_bounded(self):
+        p = PendingChanges(per_column=2, columns=1)
+        p.add("k", 1, 0, 0, 0, 1, 0)
+        p.add("k", 1, 1, 0, 0, 1, 0)
+        p.add("k", 1, 2, 0, 0, 1, 0)
+        p.add("j", 1, 0, 0, 0, 1, 0)
+        self.failUnlessEqual((len(p), p.dropped), (2, 2))
@@ -0,0 +1,114 @@
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+from mock import Mock
+
+from pubbot.protocol import BaseMinecraftClientProtocol
+from pubbot.packets import make_packet
+
+
+class PingOnlyProtocol(BaseMinecraftClientProtocol):
+
+    def __init__(self):
+        BaseMinecraftClientProtocol.__init__(self, "pubbot", "", None)
+        self.pings = []
+
+    def on_ping(self, packet):
+        self.pings.append(packet.pid)
+
+
+class TestDispatch(TestCase):
+
+    def test_handlers(self):
+        p = PingOnlyProtocol()
+        self.failUnlessEqual(p.handlers[0], p.on_ping)
+        self.failIf(0x03 in p.handlers)
+
+    def test_dispatch(self):
+        p = PingOnlyProtocol()
+        p.dataReceived(make_packet("chat", message=u"hi") + make_packet("ping", pid=7)[:2])
+        p.dataReceived(make_packet("ping", pid=7)[2:])
+        self.failUnlessEqual(p.pings, [7])
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+
+class TestOutgoing(TestCase):
+
+    def setUp(self):
+        self.p = PingOnlyProtocol()
+        self.p.clock = task.Clock()
+        self.p.transport = FakeTransport()
+
+    def test_coalesce(self):
+        self.p.send("ping", pid=1)
+        self.p.send_player(True)
+        self.p.send_arm_animation(0, 1)
+        self.failUnlessEqual(self.p.transport.writes, [])
+
+        self.p.clock.advance(0)
+        expected = make_packet("ping", pid=1) + make_packet("grounded", grounded=1) + \
+            make_packet("animate", eid=0, animation="arm")
+        self.failUnlessEqual(self.p.transport.writes, [expected])
+
+        self.failUnlessEqual(self.p.sent.packets, 3)
+        self.failUnlessEqual(self.p.sent.writes, 1)
+        self.failUnlessEqual(self.p.sent.bytes, len(expected))
+
+    def test_encrypt_once(self):
+        self.p.encryptor = Mock()
+        self.p.encryptor.encrypt.side_effect = lambda data: data[::-1]
+        self.p.encryption_on = True
+
+        self.p.send_player_digging(0, 1, 64, -1, 1)
+        self.p.send_player_digging(2, 1, 64, -1, 1)
+        self.p.clock.advance(0)
+
+        self.failUnlessEqual(self.p.encryptor.encrypt.call_count, 1)
+        expected = make_packet("digging", state="started", x=1, y=64, z=-1, face="+y") + \
+            make_packet("digging", state="stopped", x=1, y=64, z=-1, face="+y")
+        self.failUnlessEqual(self.p.transport.writes, [expected[::-1]])
+
+    def test_plaintext_flushed_before_encryption(self):
+        self.p.encryptor = Mock()
+        self.p.encryptor.encrypt.side_effect = lambda data: data[::-1]
+
+        self.p.send("ping", pid=1)
+        self.p.on_encryption_key_response(None)
+        self.p.clock.advance(0)
+
+        self.failUnlessEqual(self.p.transport.writes, [
+            make_packet("ping", pid=1),
+            make_packet("client-status", status=0)[::-1],
+            ])
+
+    def test_tick(self):
+        self.p.send("ping", pid=1)
+        self.p.flush()
+        self.p.sent.tick()
+        self.failUnlessEqual((self.p.sent.last_packets, self.p.sent.last_writes), (1, 1))
+        self.p.sent.tick()
+        self.failUnlessEqual((self.p.sent.last_packets, self.p.sent.last_writes), (0, 0))
+
+
+class TestEntityDestroy(TestCase):
+
+    def test_forgets_field(self):
+        from pubbot.protocol import MinecraftClientProtocol
+        from pubbot.vector import Vector
+        p = MinecraftClientProtocol("pubbot", "", None)
+        p.entities.on_spawn_named_entity(7, "bob", 0, 2048, 0, 0, 0, 0)
+        p.world.flow_field(7, Vector(0, 64, 0))
+        p.world.flow_field(8, Vector(0, 64, 0))
+
+        p.on_entity_destroy(Mock(count=1, eids=[7]))
+        self.failIf(7 in p.entities.entities)
+        self.failIf("bob" in p.entities.names)
+        self.failUnlessEqual(p.world.fields.keys(), [8])
@@ -0,0 +1,107 @@
+import unittest
+
+from pubbot.reach import label_section
+from pubbot.vector import Vector
+from pubbot.world import World
+from pubbot import astar
+from pubbot.tests.test_world import make_column
+
+
+class TestReachIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Two columns of stone up to y=64
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+        self.world.on_chunk(1, 0, True, primary, 0, data)
+        self.reach = self.world.reach
+
+    def box(self, x, z):
+        """ Wall in the block at x, 64, z """
+        for y in (64, 65, 66):
+            for bx, bz in ((x - 1, z), (x + 1, z), (x, z - 1), (x, z + 1)):
+                self.world.on_block_change(bx, y, bz, 1, 0)
+        self.world.on_block_change(x, 66, z, 1, 0)
+
+    def test_labels(self):
+        c = self.world.chunks[(0, 0, 0)]
+        self.failUnlessEqual(label_section(c, 3)[0], 0)
+        self.failUnlessEqual(label_section(c, 5)[0], 1)
+
+        # The surface layer has head room, the rest of section 4 too
+        count, labels = label_section(c, 4)
+        self.failUnlessEqual(count, 1)
+        self.failUnless(all(labels))
+
+    def test_open_ground(self):
+        self.failUnless(self.reach.reachable(Vector(1, 64, 1), Vector(30, 64, 12)))
+        self.failUnless(self.reach.reachable(Vector(1, 64, 1), Vector(20, 120, 3)))
+
+    def test_walled_off(self):
+        self.box(20, 5)
+        self.failIf(self.reach.reachable(Vector(1, 64, 1), Vector(20, 64, 5)))
+        self.failIf(self.reach.reachable(Vector(20, 64, 5), Vector(1, 64, 1)))
+        self.failUnless(self.reach.reachable(Vector(1, 64, 1), Vector(21, 67, 5)))
+
+        # No search at all
+        self.failUnlessEqual(astar.begin(self.world, Vector(1, 64, 1), [Vector(20, 64, 5)]), None)
+
+        # Knocking a hole in the wall is noticed
+        self.world.on_block_change(19, 64, 5, 0, 0)
+        self.world.on_block_change(19, 65, 5, 0, 0)
+        self.failUnless(self.reach.reachable(Vector(1, 64, 1), Vector(20, 64, 5)))
+
+    def test_walled_off_on_border(self):
+        # The box straddles the border between the two columns
+        self.box(16, 8)
+        self.failIf(self.reach.reachable(Vector(1, 64, 1), Vector(16, 64, 8)))
+
+        # A doorway in the west wall, in the other column
+        self.world.on_block_change(15, 64, 8, 0, 0)
+        self.world.on_block_change(15, 65, 8, 0, 0)
+        self.failUnless(self.reach.reachable(Vector(1, 64, 1), Vector(16, 64, 8)))
+
+    def test_climb_between_sections(self):
+        # A shaft one block wide, too narrow to climb out of, down through
+        # a section of stone
+        for x in range(16):
+            for z in range(16):
+                for y in range(64, 80):
+                    if (x, z) != (5, 0):
+                        self.world.on_block_change(x, y, z, 1, 0)
+        self.failIf(self.reach.reachable(Vector(5, 64, 0), Vector(5, 80, 9)))
+
+        # Cut steps out of the side of the shaft, up into the next section
+        for i in range(1, 16):
+            self.world.on_block_change(5, 64 + i, i, 0, 0)
+            self.world.on_block_change(5, 65 + i, i, 0, 0)
+        self.failUnless(self.reach.reachable(Vector(5, 64, 0), Vector(5, 80, 9)))
+        self.failUnless(astar.path(self.world, Vector(5, 64, 0), [Vector(5, 80, 9)]))
+
+    def test_remembered(self):
+        self.box(20, 5)
+        self.reach.reachable(Vector(1, 64, 1), Vector(20, 64, 5))
+        self.reach.reachable(Vector(2, 64, 1), Vector(20, 64, 5))
+        self.failUnlessEqual(self.reach.remembered, 1)
+
+    def test_unknown(self):
+        # Inside the ground, so there is no saying
+        self.failUnless(self.reach.reachable(Vector(1, 20, 1), Vector(20, 64, 5)))
+
+    def test_long_wall(self):
+        # A wall far longer than the columns a query looks at, with a way
+        # round beyond them
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        for cx in range(-1, 2):
+            for cz in range(-2, 3):
+                self.world.on_chunk(cx, cz, True, primary, 0, data)
+        for cz in range(-2, 3):
+            indexes = [(y << 8) | ((z & 15) << 4) | 8 for y in range(64, 256)
+                       for z in range(cz * 16, cz * 16 + 16) if -30 <= z <= 45]
+            self.world.apply_changes((0, 0, cz), indexes, [1] * len(indexes), [0] * len(indexes))
+
+        self.failUnless(self.reach.reachable(Vector(5, 64, 5), Vector(10, 64, 5)))
+        route = astar.path(self.world, Vector(5, 64, 5), [Vector(10, 64, 5)])
+        self.failUnlessEqual(route[-1], Vector(10, 64, 5))
+        self.failUnless(len(route) > 60)
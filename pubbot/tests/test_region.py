@@ -0,0 +1,97 @@
+import unittest
+
+from mock import Mock
+
+from pubbot import activity, actions, astar, blocks
+from pubbot.vector import Vector, BlockPos
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
+
+
+class TestGetRegion(unittest.TestCase):
+
+    def setUp(self):
+        # Stone up to y=64 with metadata 2, across four columns
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 2)) for sy in range(4)))
+        for cx in (0, 1):
+            for cz in (0, 1):
+                self.world.on_chunk(cx, cz, True, primary, 0, data)
+
+        self.world.on_block_change(15, 63, 16, 14, 5)
+        self.world.on_block_change(16, 64, 15, 4, 3)
+
+    def test_matches_get_block(self):
+        low, high = BlockPos(10, 58, 11), BlockPos(20, 70, 21)
+        region = self.world.get_region(high, low, metadata=True)
+        self.failUnlessEqual(region.low, low)
+        self.failUnlessEqual(len(region.blocks), 11 * 13 * 11)
+
+        for x in range(10, 21):
+            for y in range(58, 71):
+                for z in range(11, 22):
+                    block = self.world.get_block(Vector(x, y, z))
+                    i = region.index(x, y, z)
+                    self.failUnlessEqual(region.blocks[i], block.kind)
+                    self.failUnlessEqual(region.metadata[i], block.metadata)
+                    self.failUnlessEqual(region.position(i), BlockPos(x, y, z))
+
+    def test_outside_world(self):
+        region = self.world.get_region(BlockPos(0, -5, 0), BlockPos(1, 2, 1))
+        self.failUnlessEqual(region.kind_at(0, -1, 0), 0)
+        self.failUnlessEqual(region.kind_at(0, 0, 0), 1)
+        self.failUnlessEqual(region.metadata, None)
+
+    def test_not_loaded(self):
+        self.failUnlessRaises(KeyError, self.world.get_region, BlockPos(20, 60, 20), BlockPos(40, 64, 20))
+
+    def test_where(self):
+        region = self.world.get_region(BlockPos(14, 62, 14), BlockPos(17, 66, 17))
+        self.failUnlessEqual(region.where(blocks.diggable)[-1], BlockPos(16, 64, 15))
+        self.failUnlessEqual(len(region.where(blocks.diggable)), 4 * 4 * 2 + 1)
+        found = [False] * blocks.BLOCK_IDS
+        found[14] = True
+        self.failUnlessEqual(region.where(found), [BlockPos(15, 63, 16)])
+
+    def test_view(self):
+        start, goal = Vector(1, 64, 1), Vector(8, 64, 1)
+        self.failUnlessEqual(len(astar.path(self.world, start, [goal])), 7)
+
+        # Plan against a copy with a wall in it
+        region = self.world.get_region(BlockPos(0, 60, 0), BlockPos(15, 70, 15))
+        for z in range(16):
+            for y in (64, 65, 66, 67):
+                region.set_kind(5, y, z, 1)
+        self.failUnlessEqual(self.world.set_region_view(region), None)
+        self.failUnlessEqual(self.world.kind_at(5, 64, 3), 1)
+        self.failUnless(len(astar.path(self.world, start, [goal])) > 7)
+
+        # Back to the real thing
+        self.world.set_region_view(None)
+        self.failUnlessEqual(self.world.kind_at(5, 64, 3), 0)
+        self.failUnlessEqual(self.world.get_block(Vector(5, 64, 3)).kind, 0)
+
+
+class TestRegionUsers(unittest.TestCase):
+
+    def setUp(self):
+        world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        world.on_chunk(0, 0, True, primary, 0, data)
+        world.on_block_change(4, 62, 4, 7, 0)
+
+        self.bot = Mock()
+        self.bot.pos = Vector(5.5, 64, 5.5)
+        self.bot.eyepos = Vector(5.5, 65.65, 5.5)
+        self.bot.protocol.world = world
+
+    def test_grief(self):
+        # Only the stone, not the air or bedrock
+        acts = activity.grief(self.bot)
+        self.failUnlessEqual(len(acts), 6 * 6 * 3 - 1)
+        self.failIf(BlockPos(4, 62, 4) in [a.pos for a in acts])
+
+    def test_mine_grid(self):
+        acts = actions.MineGrid(self.bot, BlockPos(5, 63, 5), BlockPos(6, 65, 6)).do()
+        self.failUnlessEqual(sorted(a.pos for a in acts), [BlockPos(5, 63, 5), BlockPos(5, 63, 6), BlockPos(6, 63, 5), BlockPos(6, 63, 6)])
+        self.failUnlessEqual(acts[0].pos, BlockPos(5, 63, 5))
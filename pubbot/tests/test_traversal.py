@@ -1,22 +1,74 @@
 import unittest
 
-from pubbot.vector import Vector
-from pubbot.traversal import walk
+from pubbot.vector import Vector, BlockPos
+from pubbot.traversal import raycast, raycast_many, INSIDE
+from pubbot.world import World
+from pubbot.tests.test_world import make_column
 
-class TestTraversal(unittest.TestCase):
+class TestRaycast(unittest.TestCase):
 
-    def test_foo(self):
-        start = Vector(0, 0, 0)
-        finish = Vector(4, 6, 0)
+    def setUp(self):
+        # Stone up to y=64
+        self.world = World()
+        primary, data = make_column(dict((sy, (1, 0)) for sy in range(4)))
+        self.world.on_chunk(0, 0, True, primary, 0, data)
+        self.world.on_chunk(1, 0, True, primary, 0, data)
 
-        dir = (finish - start).normalize()
+    def test_down(self):
+        hit = raycast(self.world, Vector(3.5, 70.5, 3.5), Vector(0, -1, 0))
+        self.failUnlessEqual(hit.pos, BlockPos(3, 63, 3))
+        self.failUnlessEqual(hit.face, 1)
+        self.failUnlessAlmostEqual(hit.distance, 6.5)
+        self.failUnlessEqual(hit.kind, 1)
 
-        stepper = walk(start, dir)
+    def test_wall(self):
+        self.world.on_block_change(20, 66, 4, 4, 0)
+        hit = raycast(self.world, Vector(2.5, 66.5, 4.5), Vector(1, 0, 0))
+        self.failUnlessEqual(hit.pos, BlockPos(20, 66, 4))
+        self.failUnlessEqual(hit.face, 4)
+        self.failUnlessAlmostEqual(hit.distance, 17.5)
 
-        self.failUnlessEqual(stepper.next(), Vector(0,0,0))
-        self.failUnlessEqual(stepper.next(), Vector(0,1,0))
-        self.failUnlessEqual(stepper.next(), Vector(1,1,0))
-        self.failUnlessEqual(stepper.next(), Vector(1,2,0))
-        self.failUnlessEqual(stepper.next(), Vector(2,2,0))
-        self.failUnlessEqual(stepper.next(), Vector(2,3,0))
+        # From the other side, and from an angle
+        hit = raycast(self.world, Vector(30.5, 66.5, 4.5), Vector(-1, 0, 0))
+        self.failUnlessEqual((hit.pos, hit.face), (BlockPos(20, 66, 4), 5))
+        hit = raycast(self.world, Vector(20.5, 66.5, 12.5), Vector(0, 0, -1))
+        self.failUnlessEqual((hit.pos, hit.face), (BlockPos(20, 66, 4), 3))
 
+        # Only as far as asked
+        self.failUnlessEqual(raycast(self.world, Vector(2.5, 66.5, 4.5), Vector(1, 0, 0), max_distance=10), None)
+
+    def test_diagonal(self):
+        # Agrees with looking up points a short way apart along the ray
+        start, direction = Vector(1.3, 70.2, 2.9), Vector(7, -3, 5)
+        step = direction.normalize() * 0.01
+        pos = start
+        while not self.world.get_block(pos).solid:
+            pos = pos + step
+        hit = raycast(self.world, start, direction)
+        self.failUnlessEqual(hit.pos, pos.floor())
+
+    def test_misses(self):
+        # Up into the sky, and off into columns that aren't loaded
+        self.failUnlessEqual(raycast(self.world, Vector(3.5, 70.5, 3.5), Vector(0, 1, 0)), None)
+        self.failUnlessEqual(raycast(self.world, Vector(3.5, 70.5, 3.5), Vector(0, 0, -1)), None)
+
+    def test_inside(self):
+        hit = raycast(self.world, Vector(3.5, 60.5, 3.5), Vector(1, 0, 0))
+        self.failUnlessEqual((hit.pos, hit.face, hit.distance), (BlockPos(3, 60, 3), INSIDE, 0))
+
+    def test_many(self):
+        eye = Vector(8.5, 66.5, 8.5)
+        hits = raycast_many(self.world, [(eye, Vector(0, -1, 0)), (eye, Vector(0, 1, 0)), (eye, Vector(2, -1, 0))])
+        self.failUnlessEqual(hits[0].pos, BlockPos(8, 63, 8))
+        self.failUnlessEqual(hits[1], None)
+        self.failUnlessEqual(hits[2].pos, BlockPos(13, 63, 8))
+
+    def test_can_see(self):
+        self.world.on_block_change(8, 66, 12, 1, 0)
+        eye = Vector(8.5, 66.5, 8.5)
+        self.failUnlessEqual(
+            self.world.can_see(eye, [Vector(8.5, 66.5, 11.5), Vector(8.5, 66.5, 14.5), Vector(8.5, 66.5, 12.5)]),
+            [True, False, True])
+
+    def test_trace(self):
+        self.failUnlessEqual(self.world.trace(Vector(3.5, 70.5, 3.5), Vector(0, -1, 0)), BlockPos(3, 64, 3))
@@ -1,6 +1,6 @@
 import unittest
 
-from pubbot.vector import Vector
+from pubbot.vector import Vector, BlockPos, pack, unpack
 
 class TestVector(unittest.TestCase):
 
@@ -15,3 +15,33 @@ class TestVector(unittest.TestCase):
     def test_subtract(self):
         self.failUnlessEqual(Vector(2,2,2) - Vector(1,1,1), Vector(1,1,1))
 
+
+
+class TestBlockPos(unittest.TestCase):
+
+    def test_floor(self):
+        p = Vector(1.5, -0.5, -2.0).floor()
+        self.failUnless(isinstance(p, BlockPos))
+        self.failUnlessEqual(p, BlockPos(1, -1, -2))
+        self.failUnless(p.floor() is p)
+
+    def test_interop(self):
+        self.failUnlessEqual(BlockPos(1, 2, 3), Vector(1, 2, 3))
+        self.failUnlessEqual(Vector(1, 2, 3), BlockPos(1, 2, 3))
+        self.failIf(BlockPos(1, 2, 3) != Vector(1, 2, 3))
+        self.failUnlessEqual(len(set([BlockPos(1, 2, 3), Vector(1, 2, 3)])), 1)
+        self.failUnless(Vector(1, 2, 3) in set([BlockPos(1, 2, 3)]))
+
+    def test_arithmetic(self):
+        p = BlockPos(1, 2, 3)
+        self.failUnless(isinstance(p + BlockPos(0, 1, 0), BlockPos))
+        self.failUnlessEqual(p.offset(-1, 0, 1), BlockPos(0, 2, 4))
+        self.failUnlessEqual(p - BlockPos(1, 1, 1), BlockPos(0, 1, 2))
+        self.failUnlessEqual(p + Vector(0.5, 0.5, 0.5), Vector(1.5, 2.5, 3.5))
+        self.failUnlessEqual(p.manhattan_length(), 6)
+        self.failUnlessEqual((p.x, p.y, p.z), (1, 2, 3))
+
+    def test_pack(self):
+        for p in (BlockPos(0, 0, 0), BlockPos(-30000000, 255, 30000000), BlockPos(5, -1, -7)):
+            self.failUnlessEqual(unpack(p.key()), p)
+        self.failIfEqual(pack(1, 0, 0), pack(0, 0, 1))
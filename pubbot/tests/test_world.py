@@ -0,0 +1,169 @@
+import struct, unittest
+
+from construct import Container
+
+from pubbot.world import World
+from pubbot.vector import Vector
+
+
+def make_column(sections, skylight=True, continuous=True):
+    """
+    Build an uncompressed protocol 39 column. sections maps a section y to a
+    (kind, metadata) pair that fills that whole section.
+    """
+    present = sorted(sections)
+    data = ""
+    for sy in present:
+        data += chr(sections[sy][0]) * 4096
+    for sy in present:
+        data += chr(sections[sy][1] | (sections[sy][1] << 4)) * 2048
+    data += "\x00" * 2048 * len(present)
+    if skylight:
+        data += "\xff" * 2048 * len(present)
+    if continuous:
+        data += "\x01" * 256
+    primary = sum(1 << sy for sy in present)
+    return primary, data
+
+
+class TestChunkDecoding(unittest.TestCase):
+
+    def test_chunk(self):
+        w = World()
+        primary, data = make_column({0: (7, 0), 3: (1, 2)})
+        w.on_chunk(2, -1, True, primary, 0, data)
+
+        self.failUnless(w.has_chunk(Vector(32, 0, -16)))
+        self.failUnlessEqual(w.get_block(Vector(32, 0, -16)).kind, 7)
+        self.failUnlessEqual(w.get_block(Vector(40, 50, -10)).kind, 1)
+        self.failUnlessEqual(w.get_block(Vector(40, 50, -10)).metadata, 2)
+        self.failUnlessEqual(w.get_block(Vector(40, 20, -10)).kind, 0)
+
+    def test_chunk_without_skylight(self):
+        w = World()
+        primary, data = make_column({1: (87, 0)}, skylight=False)
+        w.on_chunk(0, 0, True, primary, 0, data)
+        self.failUnlessEqual(w.get_block(Vector(0, 16, 0)).kind, 87)
+
+    def test_partial_update(self):
+        w = World()
+        primary, data = make_column({0: (7, 0), 1: (1, 0)})
+        w.on_chunk(0, 0, True, primary, 0, data)
+
+        primary, data = make_column({1: (3, 0)}, continuous=False)
+        w.on_chunk(0, 0, False, primary, 0, data)
+
+        self.failUnlessEqual(w.get_block(Vector(0, 0, 0)).kind, 7)
+        self.failUnlessEqual(w.get_block(Vector(0, 16, 0)).kind, 3)
+
+    def test_map_chunk_bulk(self):
+        w = World()
+        p1, d1 = make_column({0: (7, 0)})
+        p2, d2 = make_column({0: (1, 0), 15: (2, 0)})
+        metadata = [
+            Container(x=0, z=0, primary=p1, secondary=0),
+            # Bitmasks are signed shorts on the wire
+            Container(x=1, z=0, primary=p2 - 0x10000, secondary=0),
+            ]
+        w.on_map_chunk_bulk(2, d1 + d2, metadata)
+
+        self.failUnlessEqual(w.get_block(Vector(5, 5, 5)).kind, 7)
+        self.failUnlessEqual(w.get_block(Vector(20, 5, 5)).kind, 1)
+        self.failUnlessEqual(w.get_block(Vector(20, 255, 5)).kind, 2)
+        self.failUnlessEqual(w.get_block(Vector(20, 100, 5)).kind, 0)
+
+
+class TestUnloading(unittest.TestCase):
+
+    def test_empty_continuous_chunk_unloads(self):
+        w = World()
+        primary, data = make_column({0: (7, 0)})
+        w.on_chunk(0, 0, True, primary, 0, data)
+        w.on_chunk(0, 0, True, 0, 0, "")
+        self.failIf(w.has_chunk(Vector(0, 0, 0)))
+        self.failUnlessEqual(w.memory_usage()["resident"], 0)
+
+    def test_pre_chunk(self):
+        w = World()
+        primary, data = make_column({0: (7, 0)})
+        w.on_chunk(0, 0, True, primary, 0, data)
+        w.on_pre_chunk(0, 0, 1)
+        self.failUnless(w.has_chunk(Vector(0, 0, 0)))
+        w.on_pre_chunk(0, 0, 0)
+        self.failIf(w.has_chunk(Vector(0, 0, 0)))
+        self.failUnlessRaises(KeyError, w.get_block, Vector(0, 0, 0))
+
+    def test_budget(self):
+        primary, data = make_column({0: (7, 0)})
+        # One section of block ids and metadata
+        column = 4096 + 2048
+
+        w = World(budget=column * 3)
+        for x in range(4):
+            w.on_chunk(x, 0, True, primary, 0, data)
+
+        usage = w.memory_usage()
+        self.failUnlessEqual(usage["columns"], 2)
+        self.failUnlessEqual(usage["packed_columns"], 2)
+        self.failUnless(0 < usage["compressed"] < column)
+        self.failUnlessEqual(sorted(w.packed), [(0, 0, 0), (1, 0, 0)])
+
+        # Evicted columns come back on demand
+        self.failUnlessEqual(w.get_block(Vector(5, 5, 5)).kind, 7)
+        self.failIf((0, 0, 0) in w.packed)
+
+
+def record(x, y, z, kind, meta):
+    return struct.pack(">I", (x << 28) | (z << 24) | (y << 16) | (kind << 4) | meta)
+
+
+class TestBulkChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.w = World()
+        primary, data = make_column({0: (1, 0)})
+        self.w.on_chunk(0, 0, True, primary, 0, data)
+        self.w.on_chunk(1, 0, True, primary, 0, data)
+
+    def test_block_batch(self):
+        data = record(1, 2, 3, 4, 5) + record(15, 200, 0, 89, 0) + record(0, 0, 0, 0, 0)
+        self.w.on_block_batch(1, 0, 3, data)
+
+        block = self.w.get_block(Vector(17, 2, 3))
+        self.failUnlessEqual((block.kind, block.metadata), (4, 5))
+        self.failUnlessEqual(self.w.get_block(Vector(31, 200, 0)).kind, 89)
+        self.failUnlessEqual(self.w.get_block(Vector(16, 0, 0)).kind, 0)
+        self.failUnlessEqual(self.w.get_block(Vector(16, 1, 0)).kind, 1)
+
+    def test_block_change(self):
+        self.w.on_block_change(-1, 10, 5, 3, 0)
+        self.failUnlessEqual(len(self.w.pending), 1)
+        self.w.on_block_change(17, 10, 5, 3, 2)
+        self.failUnlessEqual(self.w.get_block(Vector(17, 10, 5)).metadata, 2)
+
+    def test_explosion(self):
+        offsets = [(0, 0, 0), (-1, 0, 0), (1, -1, 0), (0, 0, 1)]
+        records = "".join(struct.pack(">bbb", *o) for o in offsets)
+        self.w.on_explosion(15.5, 5.9, 7.2, len(offsets), records)
+
+        for pos in (Vector(15, 5, 7), Vector(14, 5, 7), Vector(16, 4, 7), Vector(15, 5, 8)):
+            self.failUnlessEqual(self.w.get_block(pos).kind, 0)
+        self.failUnlessEqual(self.w.get_block(Vector(16, 5, 7)).kind, 1)
+
+    def test_watchers(self):
+        seen = []
+        watcher = lambda cx, cz, positions: seen.append((cx, cz, positions))
+        self.w.watch(watcher)
+
+        self.w.on_block_change(17, 10, 5, 3, 0)
+        self.w.on_block_change(-1, 10, 5, 3, 0)
+        primary, data = make_column({0: (1, 0)})
+        self.w.on_chunk(1, 0, True, primary, 0, data)
+        self.w.unload(0, 0)
+
+        # Parked changes are only announced with the column that takes them
+        self.failUnlessEqual(seen, [(1, 0, [(17, 10, 5)]), (1, 0, None), (0, 0, None)])
+
+        self.w.unwatch(watcher)
+        self.w.on_block_change(17, 10, 5, 3, 0)
+        self.failUnlessEqual(len(seen), 3)
@@ -15,6 +15,7 @@
 # Maths stuff. Totally a NIH, to try and learn stuff.
 
 from math import atan2, cos, sin, sqrt, pi, floor, degrees, radians
+from operator import itemgetter
 
 
 class Vector(object):
@@ -57,7 +58,7 @@ class Vector(object):
         return (yaw, pitch)
 
     def floor(self):
-        return Vector(int(floor(self.x)), int(floor(self.y)), int(floor(self.z)))
+        return BlockPos(int(floor(self.x)), int(floor(self.y)), int(floor(self.z)))
 
     def copy(self):
         return Vector(self.x, self.y, self.z)
@@ -65,6 +66,9 @@ class Vector(object):
     def __eq__(self, other):
         return self.x == other.x and self.y == other.y and self.z == other.z
 
+    def __ne__(self, other):
+        return not self == other
+
     def __add__(self, other):
         return Vector(self.x+other.x, self.y+other.y, self.z+other.z)
 
@@ -108,7 +112,82 @@ class Vector(object):
         return "Vector(%s, %s, %s)" % (self.x, self.y, self.z)
 
     def __hash__(self):
-        return id(",".join(str(x) for x in (self.x, self.y, self.z)))
+        # The same as an equal BlockPos, so the two can share sets and dicts
+        return hash((self.x, self.y, self.z))
+
+
+class BlockPos(tuple):
+
+    """
+    I am the integer coordinates of a block.
+
+    I am an immutable (x, y, z) tuple, so I hash and compare at C speed, and
+    I am equal to (and hash the same as) a Vector with the same coordinates.
+    Adding another BlockPos gives a BlockPos, anything else gives a Vector.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, x, y, z):
+        return tuple.__new__(cls, (x, y, z))
+
+    x = property(itemgetter(0))
+    y = property(itemgetter(1))
+    z = property(itemgetter(2))
+
+    def offset(self, dx, dy, dz):
+        return tuple.__new__(BlockPos, (self[0] + dx, self[1] + dy, self[2] + dz))
+
+    def key(self):
+        """ Pack me into a single int, see pack() """
+        return pack(self[0], self[1], self[2])
+
+    def length(self):
+        return sqrt(self[0]*self[0] + self[1]*self[1] + self[2]*self[2])
+
+    def manhattan_length(self):
+        return abs(self[0]) + abs(self[1]) + abs(self[2])
+
+    def floor(self):
+        return self
+
+    def copy(self):
+        return self
+
+    def __add__(self, other):
+        if isinstance(other, BlockPos):
+            return tuple.__new__(BlockPos, (self[0] + other[0], self[1] + other[1], self[2] + other[2]))
+        return Vector(self[0] + other.x, self[1] + other.y, self[2] + other.z)
+
+    def __sub__(self, other):
+        if isinstance(other, BlockPos):
+            return tuple.__new__(BlockPos, (self[0] - other[0], self[1] - other[1], self[2] - other[2]))
+        return Vector(self[0] - other.x, self[1] - other.y, self[2] - other.z)
+
+    def __mul__(self, other):
+        return Vector(self[0] * other, self[1] * other, self[2] * other)
+
+    def __div__(self, other):
+        return Vector(self[0] / other, self[1] / other, self[2] / other)
+
+    def __repr__(self):
+        return "BlockPos(%d, %d, %d)" % self
+
+
+# Block coordinates packed into one int: 26 bits each of x and z, 12 of y, all
+# offset so they are never negative
+XZ_OFFSET = 1 << 25
+Y_OFFSET = 1 << 11
+
+def pack(x, y, z):
+    return ((x + XZ_OFFSET) << 38) | ((z + XZ_OFFSET) << 12) | (y + Y_OFFSET)
+
+def unpack(key):
+    return BlockPos(
+        (key >> 38) - XZ_OFFSET,
+        (key & 0xFFF) - Y_OFFSET,
+        ((key >> 12) & 0x3FFFFFF) - XZ_OFFSET,
+        )
 
 
 def dot_product(a, b):
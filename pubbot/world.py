@@ -15,30 +15,210 @@
 # Provides a world object which provides access to block data, which is segmented
 # by minecraft in to chunks
 
-import os, zlib, math
+import zlib, math, struct
+from collections import OrderedDict
+from itertools import izip
 
-from twisted.internet import threads, defer
-from twisted.python import log
+from pubbot.blocks import solid
+from pubbot.chunk import Chunk, column_size, CHUNK_HEIGHT, read_sections, pack_sections, unpack_sections
+from pubbot.chunkpool import DecodePool
+from pubbot.flowfield import FlowField
+from pubbot.heightmap import Heightmaps
+from pubbot.kinds import KindIndex
+from pubbot.navgraph import ChunkGraph
+from pubbot.moves import NORTH, EAST, SOUTH, WEST, UP, DOWN, MOVES
+from pubbot.pending import PendingChanges
+from pubbot.reach import ReachIndex
+from pubbot.region import copy_region
+from pubbot.vector import pack, unpack, XZ_OFFSET, Y_OFFSET
+from pubbot.traversal import raycast, raycast_many, INSIDE
 
-from pubbot.chunk import Chunk
-from pubbot.vector import Vector
-from pubbot.traversal import walk
 
+# The block on the other side of each face, numbered as Block.faces
+FACE_NORMALS = (DOWN, UP, EAST, WEST, NORTH, SOUTH)
+
+# Once over budget, evict down to this fraction of it so eviction doesn't run
+# for every column that arrives
+LOW_WATER = 0.9
+
+# How many unloaded columns to keep out of the cache. Past this the longest
+# ago unloaded are trusted again, as they would be after a restart.
+FORGOTTEN_LIMIT = 4096
 
-NORTH = Vector(-1, 0, 0)
-EAST = Vector(0, 0, -1)
-SOUTH = Vector(1, 0, 0)
-WEST = Vector(0, 0, 1)
-UP = Vector(0, 1, 0)
-DOWN = Vector(0, -1, 0)
 
 class World(object):
 
-    def __init__(self):
+    def __init__(self, budget=None):
         self.dump_map_chunks = True
         self.dump_serial = 0
 
         self.chunks = {}
+        self.pool = DecodePool(self)
+
+        # Optional ChunkCache. Columns missing from self.chunks are looked for
+        # there, and everything the server sends is written back to it.
+        self.cache = None
+        self.dirty = set()
+
+        # Bytes of decoded sections to keep in self.chunks, None for no limit.
+        # The least recently used columns over it are written to the cache,
+        # or zlib compressed into self.packed if there isn't one.
+        self.budget = budget
+        self.resident = 0
+        self.packed = {}
+        self.generation = 0
+
+        # Columns the server has unloaded, oldest first. They aren't brought
+        # back from the cache until the server sends them again.
+        self.forgotten = OrderedDict()
+
+        self.evicted = 0
+        self.unloaded = 0
+
+        # Chunk payloads and block changes are numbered as they arrive, so
+        # changes parked in self.pending can be told apart from map data
+        # that supersedes them
+        self.seq = 0
+        self.pending = PendingChanges()
+
+        # Callables told about every change, as (cx, cz, positions).
+        # positions lists the blocks changed, or is None when the whole
+        # column was stored or unloaded.
+        self.watchers = []
+
+        # Entrances between columns for long distance planning, kept up to
+        # date as columns change
+        self.graph = ChunkGraph(self)
+        self.watch(self.graph.column_changed)
+
+        # Which points are connected, to rule out searches that can't succeed
+        self.reach = ReachIndex(self)
+        self.watch(self.reach.column_changed)
+
+        # Where the ground is
+        self.heights = Heightmaps(self)
+        self.watch(self.heights.column_changed)
+
+        # Which sections hold which kinds of block
+        self.kinds = KindIndex(self)
+        self.watch(self.kinds.column_changed)
+
+        # A Region that allowed_at and kind_at read from instead, see
+        # set_region_view
+        self.view = None
+
+        # FlowFields towards things being followed, by whatever names them
+        self.fields = {}
+
+    def watch(self, callback):
+        self.watchers.append(callback)
+
+    def unwatch(self, callback):
+        if callback in self.watchers:
+            self.watchers.remove(callback)
+
+    def get_region(self, low, high, metadata=False):
+        """
+        Copy the blocks from low to high, opposite corners, into a Region.
+        Raises KeyError if they aren't all loaded.
+        """
+        return copy_region(self, low, high, metadata)
+
+    def set_region_view(self, region):
+        """
+        Have allowed_at and kind_at read blocks inside region from it rather
+        than from the chunks, so a planner can try out changes on a copy from
+        get_region. None goes back to the chunks. Returns the old view.
+        """
+        old, self.view = self.view, region
+        return old
+
+    def surface(self, x, z):
+        """
+        Height of the highest solid block at x, z, -1 if there are none, or
+        None if the column isn't loaded.
+        """
+        heightmap = self.heights.get(x >> 4, z >> 4)
+        if heightmap is None:
+            return None
+        return heightmap.solid[((z & 15) << 4) | (x & 15)]
+
+    def landing(self, x, z):
+        """
+        The y to stand at on the highest solid block at x, z, or None if
+        coming down there means landing in a liquid, or it isn't loaded.
+        """
+        heightmap = self.heights.get(x >> 4, z >> 4)
+        if heightmap is None:
+            return None
+        i = ((z & 15) << 4) | (x & 15)
+        top = heightmap.solid[i]
+        if top < 0 or heightmap.liquid[i] > top:
+            return None
+        return top + 1
+
+    def cruise_height(self, start, end, clearance=2):
+        """
+        A height to fly from start to end at, in a straight line over
+        everything on the way, or None if not all of the way is loaded.
+        """
+        dx, dz = end.x - start.x, end.z - start.z
+        steps = int(max(abs(dx), abs(dz))) + 1
+        top = -1
+        for i in xrange(steps + 1):
+            t = float(i) / steps
+            x, z = int(math.floor(start.x + dx * t)), int(math.floor(start.z + dz * t))
+            heightmap = self.heights.get(x >> 4, z >> 4)
+            if heightmap is None:
+                return None
+            top = max(top, heightmap.non_air[((z & 15) << 4) | (x & 15)])
+        return top + 1 + clearance
+
+    def find_nearest(self, kind, origin, radius=None):
+        """ The nearest block of kind to origin within radius, or None """
+        return self.kinds.find_nearest(kind, origin, radius)
+
+    def count(self, kind, box):
+        """ How many blocks of kind are in box, a pair of opposite corners """
+        return self.kinds.count(kind, box)
+
+    def flow_field(self, key, pos):
+        """
+        The FlowField towards whatever key names, which is now at pos. It is
+        shared by everything following the same thing.
+        """
+        field = self.fields.get(key)
+        if field is None:
+            field = self.fields[key] = FlowField(self, pos)
+            self.watch(field.column_changed)
+        else:
+            field.move(pos)
+        return field
+
+    def forget_field(self, key):
+        field = self.fields.pop(key, None)
+        if field is not None:
+            self.unwatch(field.column_changed)
+
+    def release_field(self, key, field):
+        """
+        A follower is done with field, the FlowField towards key. Once no
+        followers are left it is forgotten.
+        """
+        field.users -= 1
+        if field.users <= 0 and self.fields.get(key) is field:
+            self.forget_field(key)
+
+    def changed(self, cx, cz, indexes=None):
+        """ Tell the watchers about blocks changed in a column """
+        if not self.watchers:
+            return
+        positions = None
+        if indexes is not None:
+            bx, bz = cx * 16, cz * 16
+            positions = [(bx + (i & 15), i >> 8, bz + ((i >> 4) & 15)) for i in indexes]
+        for callback in list(self.watchers):
+            callback(cx, cz, positions)
 
     def get_block(self, pos):
         return self.get_chunk(pos).get_absolute_block(pos)
@@ -46,107 +226,407 @@ class World(object):
     def has_chunk(self, pos):
         pos = pos.floor()
         key = (pos.x // 16, 0, pos.z // 16)
-        return key in self.chunks
+        return key in self.chunks or self.load_cached(key) is not None
 
     def get_chunk(self, pos):
         pos = pos.floor()
         key = (pos.x // 16, 0, pos.z // 16)
         try:
-            return self.chunks[key]
+            c = self.chunks[key]
         except KeyError:
-            raise KeyError("No chunk for region %s" % pos)
+            c = self.load_cached(key)
+            if c is None:
+                raise KeyError("No chunk for region %s" % (pos, ))
+        c.last_used = self.generation
+        return c
+
+    def open_cache(self, cache):
+        self.close_cache()
+        self.cache = cache
+
+    def close_cache(self):
+        if self.cache is None:
+            return
+        self.flush_cache()
+        self.cache.close()
+        self.cache = None
+        self.forgotten.clear()
+
+    def flush_cache(self):
+        """ Write columns changed by block updates back to the cache """
+        if self.cache is None:
+            return
+        for key in self.dirty:
+            if key in self.chunks:
+                self.cache.write(self.chunks[key])
+        self.dirty.clear()
+
+    def load_cached(self, key):
+        """ Bring back a column that was evicted or is in the cache """
+        if key in self.forgotten:
+            return None
+        packed = self.packed.pop(key, None)
+        if packed is not None:
+            mask, data = packed
+            sections = unpack_sections(mask, zlib.decompress(data))
+        elif self.cache is not None:
+            sections = self.cache.read(key[0], key[2])
+            if sections is None:
+                return None
+        else:
+            return None
+
+        c = self.chunks[key] = Chunk(key[0], 0, key[2])
+        c.set_sections(sections, True)
+        c.last_used = self.generation
+        self.resident += c.nbytes()
+        return c
+
+    def memory_usage(self):
+        """ Gauge of how much chunk data is held, and in what form """
+        return dict(
+            resident = sum(c.nbytes() for c in self.chunks.itervalues()),
+            compressed = sum(len(data) for mask, data in self.packed.itervalues()),
+            columns = len(self.chunks),
+            packed_columns = len(self.packed),
+            )
+
+    def evict(self, key):
+        """ Drop a column from memory, keeping it in the cache or packed """
+        c = self.chunks.pop(key)
+        self.resident -= c.nbytes()
+        if self.cache is not None:
+            if key in self.dirty:
+                self.cache.write(c)
+                self.dirty.discard(key)
+        else:
+            mask, data = pack_sections(c.sections)
+            self.packed[key] = (mask, zlib.compress(data, 1))
+        self.evicted += 1
+
+    def enforce_budget(self):
+        if self.budget is None or self.resident <= self.budget:
+            return
+
+        # Block changes can add sections without going through here, so
+        # recount before throwing anything away
+        self.resident = sum(c.nbytes() for c in self.chunks.itervalues())
+
+        low = self.budget * LOW_WATER
+        if self.resident <= low:
+            return
+
+        by_age = sorted(self.chunks.iteritems(), key=lambda item: item[1].last_used)
+        for key, c in by_age:
+            if self.resident <= low:
+                break
+            self.evict(key)
+
+    def unload(self, cx, cz):
+        """ The server has stopped sending updates for this column, forget it """
+        key = (cx, 0, cz)
+        c = self.chunks.pop(key, None)
+        if c is not None:
+            self.resident -= c.nbytes()
+            if self.cache is not None and key in self.dirty:
+                self.cache.write(c)
+        self.packed.pop(key, None)
+        self.pending.discard(key)
+        self.dirty.discard(key)
+        if self.cache is not None:
+            self.forgotten.pop(key, None)
+            self.forgotten[key] = None
+            if len(self.forgotten) > FORGOTTEN_LIMIT:
+                self.forgotten.popitem(last=False)
+        self.unloaded += 1
+        self.changed(cx, cz)
+
+    def raycast(self, start, direction, max_distance=64):
+        """ The first solid block along a ray, as a traversal.Hit, or None """
+        return raycast(self, start, direction, max_distance)
+
+    def raycast_many(self, rays, max_distance=64):
+        """ raycast() for each of rays, a sequence of (start, direction) """
+        return raycast_many(self, rays, max_distance)
+
+    def can_see(self, eye, targets):
+        """
+        Whether there is a clear line from eye to each of targets. A target
+        inside a solid block can still be seen if nothing else is in the way.
+        """
+        rays = [(eye, target - eye) for target in targets]
+        hits = raycast_many(self, rays, max(ray[1].length() for ray in rays) if rays else 0)
+        return [
+            hit is None or hit.pos == target.floor() or hit.distance >= ray[1].length()
+            for hit, ray, target in zip(hits, rays, targets)
+            ]
 
     def trace(self, start, direction, max_distance=64):
         """
-        This is a cheapISH and FLAWED traceline implementation for where accuracy isnt that important.
+        The block in front of the face of the first solid block along a ray,
+        where something would be built against it, or None if nothing is
+        hit.
         """
-        count = max_distance
-        prev = start.copy()
-        for vec in walk(start, direction):
-            if self.get_block(vec).solid:
-                return prev
-            prev = vec
+        hit = raycast(self, start, direction, max_distance)
+        if hit is None:
+            return None
+        if hit.face == INSIDE:
+            return hit.pos
+        return hit.pos + FACE_NORMALS[hit.face]
 
-            count -= 1
-            if count <= 0:
-                break
+    def available(self, pos):
+        """
+        Yield the moves that can be made from pos, each as a tuple of the
+        points passed through, ending with where the move finishes.
+        """
+        pos = pos.floor()
+        for key, steps in self.successors(pack(pos.x, pos.y, pos.z)):
+            yield tuple(unpack(k) for k in steps) + (unpack(key), )
+
+    def successors(self, key):
+        """
+        The same as available, for a packed position. Returns a list of
+        (packed destination, tuple of packed intermediate points).
+        """
+        x = (key >> 38) - XZ_OFFSET
+        y = (key & 0xFFF) - Y_OFFSET
+        z = ((key >> 12) & 0x3FFFFFF) - XZ_OFFSET
 
-        return prev            
+        allowed_at = self.allowed_at
+        result = []
+        for (dx, dy, dz), delta, steps in MOVES:
+            #FIXME: Do i have to check every step in path?
+            if allowed_at(x + dx, y + dy, z + dz):
+                result.append((key + delta, tuple([key + step for step in steps])))
+        return result
 
-    def available(self, pos):
-        transforms = (
-            (NORTH,), (EAST,), (SOUTH,), (WEST,), #(DOWN,), (UP,),
-            (NORTH,DOWN), (EAST,DOWN), (SOUTH,DOWN), (WEST,DOWN),
-            (UP, NORTH), (UP, EAST), (UP, SOUTH), (UP, WEST),
-            )
+    def allowed_at(self, x, y, z):
+        """
+        allowed() for integer coordinates. Unloaded columns and anywhere
+        outside the height of the world aren't allowed.
+        """
+        if y < 0 or y >= CHUNK_HEIGHT:
+            return False
+
+        view = self.view
+        if view is not None and view.contains(x, y, z) and view.contains(x, y + 1, z):
+            i = view.index(x, y, z)
+            blocks = view.blocks
+            return not (solid[blocks[i]] or solid[blocks[i + view.width * view.depth]])
 
-        for transform in transforms:
-            effect = reduce(lambda x, y: x+y, transform)
-            if self.allowed(pos.floor()+effect):
-                #FIXME: Do i have to check every step in path?
-                yield tuple(pos.floor()+t for t in transform)
+        c = self.chunks.get((x >> 4, 0, z >> 4))
+        if c is None:
+            c = self.load_cached((x >> 4, 0, z >> 4))
+            if c is None:
+                return False
+
+        x, z = x & 15, z & 15
+        return not (c.is_solid(x, y, z) or c.is_solid(x, y + 1, z))
+
+    def kind_at(self, x, y, z):
+        """
+        The block id at integer coordinates, or None if the column isn't
+        loaded. Outside the height of the world is air.
+        """
+        view = self.view
+        if view is not None and view.contains(x, y, z):
+            return view.kind_at(x, y, z)
+
+        c = self.chunks.get((x >> 4, 0, z >> 4))
+        if c is None:
+            c = self.load_cached((x >> 4, 0, z >> 4))
+            if c is None:
+                return None
+        return c.get_relative(x & 15, y, z & 15)[0]
 
     def allowed(self, pos, allow_fly=True):
         pos = pos.floor()
 
-        block = self.get_block(pos)
-        if block.solid:
-            log.msg("%s is solid" % pos)
+        c = self.get_chunk(pos)
+        x, y, z = pos.x - c.x * 16, pos.y, pos.z - c.z * 16
+
+        if c.is_solid(x, y, z):
             return False
 
         # Check block above (for head clearance)
-        above_pos = pos.copy() + Vector(0, 1, 0)
-        if above_pos.y < 127:
-            above = self.get_block(above_pos)
-            if above.solid:
-                log.msg("above %s is solid" % pos)
-                return False
+        if c.is_solid(x, y + 1, z):
+            return False
 
         # Stick to the ground
         if not allow_fly:
-            below_pos = pos.copy() - Vector(0, 1, 0)
-            below = self.get_block(below_pos)
-            if not below.solid and not below.liquid:
-                 log.msg("below %s is not solid or liquid" % pos)
+            if not c.is_solid(x, y - 1, z) and not c.is_liquid(x, y - 1, z):
                  return False
 
         return True
 
     def on_pre_chunk(self, x, z, mode):
-        #if mode and not (x, 0, z) in self.chunks:
-        #    c = Chunk(x, 0, z)
-        #    self.chunks[(x, 0, z)] = c
-        #    log.msg("PRECHUNK", x, 0, z)
-        #FIXME: Chunk unloading and reloading!!
-        pass
-
-    def on_map_chunk(self, x, y, z, sx, sy, sz, compressed_chunk_size, compressed_chunk):
-        # x,y,z is the start position of the region, in world block coordinates.
-        # To find which chunk is affected, in the same coordinates given by packet 0x32, we shift
-        # Whats left is the offset within a chunk
-        cx, stx = x >> 4, x & 15
-        cy, sty = y >> 7, y & 127
-        cz, stz = z >> 4, z & 15
-
-        c = Chunk(cx, cy, cz)
-        c.set_compressed(stx, sty, stz, sx, sy, sz, compressed_chunk)
-        self.chunks[(cx, cy, cz)] = c
+        # Protocol 39 has no pre-chunk packet any more, an empty continuous
+        # chunk means the same as mode 0 did
+        if not mode:
+            self.unload(x, z)
 
-    def on_multi_block_change(self, chunk_x, chunk_z, array_size, coord_array, type_array, metadata_array):
-        key = (chunk_x, 0, chunk_z)
+    def get_or_create_chunk(self, cx, cz):
+        key = (cx, 0, cz)
+        try:
+            return self.chunks[key]
+        except KeyError:
+            c = self.load_cached(key)
+            if c is None:
+                c = self.chunks[key] = Chunk(cx, 0, cz)
+            return c
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
 
-        if not key in self.chunks:
-            #FIXME: Queue these somewhre (VERIFY THEY DONT PREDATE THE MAP CHUNK!!)
+    def store_sections(self, cx, cz, sections, continuous, seq=None):
+        """
+        Store freshly decoded sections from the server, then replay any block
+        changes that arrived after them.
+        """
+        if seq is None:
+            seq = self.next_seq()
+
+        if continuous and not sections:
+            self.unload(cx, cz)
             return
 
-        c = self.chunks[(chunk_x, 0, chunk_z)]
-        c.multi_change(array_size, coord_array, type_array, metadata_array)
+        self.generation += 1
+
+        key = (cx, 0, cz)
+        self.forgotten.pop(key, None)
+        c = self.chunks.get(key)
+        if c is None and continuous:
+            # Everything is being replaced, no point bringing back the old copy
+            self.packed.pop(key, None)
+            c = self.chunks[key] = Chunk(cx, 0, cz)
+        elif c is None:
+            c = self.get_or_create_chunk(cx, cz)
+        before = c.nbytes()
+        c.set_sections(sections, continuous)
+        c.last_used = self.generation
+
+        if key in self.pending:
+            covered = None if continuous else set(sy for sy, section in sections)
+            changes = self.pending.take(key, seq, covered, self.pool.waiting((cx, cz)))
+            for x, y, z, kind, metadata in changes:
+                c.set_relative(x, y, z, kind, metadata)
+
+        self.resident += c.nbytes() - before
+        self.changed(cx, cz)
+
+        if self.cache is not None:
+            self.cache.write(c)
+            self.dirty.discard(key)
+
+        self.enforce_budget()
+
+    def on_chunk(self, x, z, continuous, primary, secondary, data):
+        primary &= 0xFFFF
+        secondary &= 0xFFFF
+
+        # Single column packets don't say whether sky light is included, but
+        # it is the only thing that can account for any extra bytes
+        skylight = len(data) > column_size(primary, secondary, False, continuous)
+
+        sections, end = read_sections(data, 0, primary, secondary, skylight, continuous)
+        self.store_sections(x, z, sections, continuous)
+
+    def on_map_chunk_bulk(self, count, data, metadata):
+        # Columns are packed back to back, in the same order as the metadata.
+        # Bulk columns always carry sky light and biomes.
+        offset = 0
+        for column in metadata[:count]:
+            sections, offset = read_sections(data, offset, column.primary & 0xFFFF, column.secondary & 0xFFFF, True, True)
+            self.store_sections(column.x, column.z, sections, True)
+
+    def load_chunk(self, x, z, continuous, primary, secondary, data):
+        """
+        Like on_chunk, but data is still compressed. It is decoded in the
+        background, and the Deferred returned fires once it is stored.
+        """
+        return self.pool.submit(self.next_seq(), data, [(x, z, primary & 0xFFFF, secondary & 0xFFFF, None, continuous)])
+
+    def load_map_chunk_bulk(self, count, data, metadata):
+        """ Like on_map_chunk_bulk, but data is still compressed """
+        return self.pool.submit(self.next_seq(), data, [
+            (column.x, column.z, column.primary & 0xFFFF, column.secondary & 0xFFFF, True, True)
+            for column in metadata[:count]
+            ])
+
+    def writable_chunk(self, key):
+        """
+        Return the column block changes for key can be applied to straight
+        away, or None if they have to wait in self.pending.
+        """
+        if self.pool.waiting((key[0], key[2])) is not None:
+            # Older map data is still being decoded and would overwrite them
+            return None
+        c = self.chunks.get(key)
+        if c is None:
+            c = self.load_cached(key)
+        return c
+
+    def apply_changes(self, key, indexes, kinds, metadatas):
+        """
+        Write a batch of blocks into one column, or park them in
+        self.pending if the column isn't ready. indexes are positions within
+        the column, y*256 + z*16 + x.
+        """
+        c = self.writable_chunk(key)
+        if c is not None:
+            c.scatter(indexes, kinds, metadatas)
+            self.dirty.add(key)
+            self.changed(key[0], key[2], indexes)
+            return
+
+        seq = self.next_seq()
+        for index, kind, metadata in izip(indexes, kinds, metadatas):
+            self.pending.add(key, seq, index & 15, index >> 8, (index >> 4) & 15, kind, metadata)
+
+    def on_block_batch(self, chunk_x, chunk_z, count, data):
+        """ Apply a block-batch-change payload of packed 32 bit records """
+        records = struct.unpack(">%dI" % count, data[:count * 4])
+        self.apply_changes(
+            (chunk_x, 0, chunk_z),
+            [((r >> 8) & 0xFF00) | ((r >> 20) & 0xF0) | (r >> 28) for r in records],
+            [(r >> 4) & 0xFFF for r in records],
+            [r & 0xF for r in records],
+            )
+
+    def on_multi_block_change(self, chunk_x, chunk_z, array_size, coord_array, type_array, metadata_array):
+        # coord is a short comprised of 4 bits of X, 4 bits of Z and 8 bits of Y
+        self.apply_changes(
+            (chunk_x, 0, chunk_z),
+            [((c & 0xFF) << 8) | (c & 0x0F00) >> 4 | (c >> 12) for c in coord_array[:array_size]],
+            type_array[:array_size],
+            metadata_array[:array_size],
+            )
 
     def on_block_change(self, x, y, z, type, metadata):
-        key = (x // 16, 0, z // 16)
-        if not key in self.chunks:
-            #FIXME: Queue these somewhere (VERIFY THEY DONT PREDATE THE MAP CHUNK!!)
+        if y < 0 or y >= 256:
             return
+        self.apply_changes((x >> 4, 0, z >> 4), [(y << 8) | ((z & 15) << 4) | (x & 15)], [type], [metadata])
+
+    def on_explosion(self, x, y, z, count, records):
+        """
+        Clear the blocks an explosion destroyed. records holds signed byte
+        offsets from the centre, which may reach into neighbouring columns.
+        """
+        offsets = struct.unpack(">%db" % (count * 3), records[:count * 3])
+
+        # Offsets are from the centre truncated towards zero, like the
+        # Notchian client does it
+        ox, oy, oz = int(x), int(y), int(z)
 
-        self.chunks[key].change(Vector(x,y,z), type, metadata)
+        columns = {}
+        for i in xrange(0, count * 3, 3):
+            bx = ox + offsets[i]
+            by = oy + offsets[i + 1]
+            bz = oz + offsets[i + 2]
+            if 0 <= by < 256:
+                columns.setdefault((bx >> 4, 0, bz >> 4), []).append((by << 8) | ((bz & 15) << 4) | (bx & 15))
 
+        for key, indexes in columns.iteritems():
+            air = [0] * len(indexes)
+            self.apply_changes(key, indexes, air, air)